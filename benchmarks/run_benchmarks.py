@@ -0,0 +1,202 @@
+"""
+This module contains the benchmark harness of the analysis pipelines on a synthetic corpus.
+
+Each stage is timed over several runs (the first run is reported apart, as it fills the caches) and its peak
+memory is measured with tracemalloc in a separate run. The results can be saved as a baseline and later runs
+compared with it to catch regressions. The caches are written to a temporary folder, so the benchmarks
+neither use nor modify the caches of the user.
+
+Usage: python -m benchmarks.run_benchmarks [--pieces 5] [--baseline benchmarks/baseline.json] [--save-baseline]
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_TOLERANCE = 0.25
+
+
+def measure(function, repeat: int) -> dict:
+    """
+    Time a stage and measure its peak memory
+    :param function: function without argument running the stage, it can return the number of notes it processed
+    :param repeat: number of timed runs
+    :return: dict with the duration of the first run ("first_seconds"), the best duration of the runs ("seconds")
+    and the peak memory allocated during a run ("peak_bytes"), and the number of "notes" if the stage returns it
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        notes = function()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {"first_seconds": durations[0], "seconds": min(durations), "peak_bytes": peak}
+    if isinstance(notes, int):
+        result["notes"] = notes
+    return result
+
+
+def get_stages(corpus_root: str, workers: int) -> list:
+    """
+    Get the benchmarked stages of task_a and task_b on a corpus
+    The modules are imported here, after the cache folder has been set
+    :param corpus_root: root folder of the corpus
+    :param workers: number of worker processes of the stages that support them
+    :return: list of tuples (name, function without argument)
+    """
+    from task_a.corpus_manifest import get_manifest, get_performances
+    from task_a.midi_notes import read_notes
+    from task_a.performed_midi import render_folder
+    from task_a.timing_for_one_piece import get_average_timing_one_piece
+    from task_a.timing_function import timing
+    from task_b.q2 import (calculate_entropy, perform_t_test, read_musicians_musicxml_and_normalize,
+                           read_musicxml_and_normalize)
+
+    composers = sorted(os.listdir(corpus_root))
+    first_composer = os.path.join(corpus_root, composers[0])
+    first_piece = os.path.join(first_composer, sorted(os.listdir(first_composer))[0])
+    musician_paths = {composer: os.path.join(corpus_root, composer) for composer in composers}
+    music_data = {}
+    midi_paths = [performance["midi_path"] for performance in get_performances(get_manifest(corpus_root))
+                  if performance["midi_path"] is not None]
+    rendered_folder = os.path.join(os.path.dirname(os.path.abspath(corpus_root)), "rendered")
+    tempo_ratios = {}
+
+    def read_midi_notes() -> int:
+        return sum(len(read_notes(path)["onset"]) for path in midi_paths)
+
+    def render_performed_midi() -> int:
+        # The tempo ratios are computed once, only the rendering is measured
+        if not tempo_ratios:
+            tempo_ratios.update(timing(first_composer))
+        return sum(notes or 0 for _, notes, _ in render_folder(first_composer, rendered_folder, tempo_ratios,
+                                                               workers=workers))
+
+    def entropy() -> None:
+        # The music data is read once, after the reading stage has been measured with cold caches
+        if not music_data:
+            music_data.update(read_musicxml_and_normalize(first_composer, workers))
+        calculate_entropy(music_data)
+
+    def t_test() -> None:
+        musician_data = read_musicians_musicxml_and_normalize(musician_paths, workers)
+        perform_t_test({composer: {"pitches": [pitch for data in musician_data[composer].values()
+                                               for pitch in data["pitches"]]} for composer in composers})
+
+    return [
+        ("timing", lambda: timing(corpus_root)),
+        ("get_average_timing_one_piece", lambda: get_average_timing_one_piece(first_piece)),
+        ("read_musicxml_and_normalize", lambda: read_musicxml_and_normalize(first_composer, workers)),
+        ("calculate_entropy", entropy),
+        ("perform_t_test", t_test),
+        ("read_midi_notes", read_midi_notes),
+        ("render_performed_midi", render_performed_midi),
+    ]
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Find the stages that are slower or use more memory than in the baseline
+    :param results: dict with the stage as key and its measures as value (see measure)
+    :param baseline: results of a previous run
+    :param tolerance: relative increase allowed before reporting a regression
+    :return: list of messages describing the regressions
+    """
+    regressions = []
+    for stage, measures in results.items():
+        if stage not in baseline:
+            continue
+        for name in ("seconds", "peak_bytes"):
+            reference = baseline[stage][name]
+            if reference > 0 and measures[name] > reference * (1 + tolerance):
+                regressions.append(f"{stage}: {name} {measures[name]:.4g} > {reference:.4g} "
+                                   f"(+{measures[name] / reference - 1:.0%})")
+    return regressions
+
+
+def run_benchmarks(parameters: dict, repeat: int = 3, workers: int = 1, stages: list = None) -> dict:
+    """
+    Generate a synthetic corpus in a temporary folder and benchmark the stages on it
+    :param parameters: keyword arguments of synthetic_corpus.generate_corpus (without the root)
+    :param repeat: number of timed runs of each stage
+    :param workers: number of worker processes of the stages that support them
+    :param stages: names of the stages to run, all of them by default
+    :return: dict with the stage as key and its measures as value (see measure)
+    """
+    from benchmarks.synthetic_corpus import generate_corpus
+
+    previous_cache_dir = os.environ.get("DM_CACHE_DIR")
+    with tempfile.TemporaryDirectory() as folder:
+        # The caches read the folder at each call (see annotation_cache.get_cache_root)
+        os.environ["DM_CACHE_DIR"] = os.path.join(folder, "cache")
+        try:
+            corpus_root = os.path.join(folder, "corpus")
+            generate_corpus(corpus_root, **parameters)
+            results = {}
+            for name, function in get_stages(corpus_root, workers):
+                if stages is None or name in stages:
+                    results[name] = measure(function, repeat)
+            return results
+        finally:
+            if previous_cache_dir is None:
+                del os.environ["DM_CACHE_DIR"]
+            else:
+                os.environ["DM_CACHE_DIR"] = previous_cache_dir
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipelines on a synthetic corpus")
+    parser.add_argument("--composers", type=int, default=2)
+    parser.add_argument("--pieces", type=int, default=5, help="pieces per composer")
+    parser.add_argument("--performances", type=int, default=3, help="performances per piece")
+    parser.add_argument("--beats", type=int, default=400, help="beats per piece")
+    parser.add_argument("--meter-changes", type=int, default=1, help="changes of meter per piece")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--stage", action="append", help="stage to run (can be repeated), all by default")
+    parser.add_argument("--baseline", help="json file of the baseline results")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown allowed before reporting a regression")
+    arguments = parser.parse_args()
+
+    parameters = {"number_of_composers": arguments.composers, "pieces_per_composer": arguments.pieces,
+                  "performances_per_piece": arguments.performances, "beats_per_piece": arguments.beats,
+                  "meter_changes": arguments.meter_changes, "seed": arguments.seed}
+    results = run_benchmarks(parameters, arguments.repeat, arguments.workers, arguments.stage)
+    for stage, measures in results.items():
+        throughput = f"   {measures['notes'] / measures['seconds'] / 1e3:9.1f} notes/ms" if "notes" in measures else ""
+        print(f"{stage:32s} first {measures['first_seconds']:9.4f} s   best {measures['seconds']:9.4f} s   "
+              f"peak {measures['peak_bytes'] / 2 ** 20:9.2f} MiB{throughput}")
+
+    if arguments.baseline is None:
+        return 0
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as f:
+            json.dump({"parameters": parameters, "results": results}, f, indent=2)
+        return 0
+    with open(arguments.baseline) as f:
+        baseline = json.load(f)
+    if baseline["parameters"] != parameters:
+        print("Warning: the baseline was measured on a corpus with other parameters.")
+    regressions = compare_with_baseline(results, baseline["results"], arguments.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
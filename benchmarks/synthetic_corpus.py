@@ -0,0 +1,226 @@
+"""
+This module contains a generator of synthetic ASAP-like corpora used by the benchmarks.
+
+Every piece gets a score annotation file, an unperformed MIDI file and a MusicXML score that agree on
+the beats, and every performance gets an annotation file and a performed MIDI file whose beats are the
+score beats played with a random tempo curve. Everything is generated locally from a seed.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import os
+import random
+
+import numpy as np
+
+from task_a.corpus_manifest import ANNOTATIONS_SUFFIX, SCORE_ANNOTATIONS, SCORE_MIDI
+from task_a.midi_io import DEFAULT_TEMPO, write_midi
+
+METERS = ("4/4", "3/4", "2/4", "6/8", "3/8")
+KEYS = ("C", "G", "D", "F", "Bb", "Am", "Em", "Dm")
+SCORE_SECONDS_PER_QUARTER = DEFAULT_TEMPO / 1e6
+MIDI_TICKS_PER_BEAT = 480
+MUSICXML_FILE = "xml_score.musicxml"
+STEPS = (("C", 0), ("C", 1), ("D", 0), ("E", -1), ("E", 0), ("F", 0), ("F", 1), ("G", 0), ("A", -1), ("A", 0),
+         ("B", -1), ("B", 0))
+
+
+def generate_bars(rng: random.Random, number_of_beats: int, meter_changes: int) -> list:
+    """
+    Generate the bars of a piece, with a meter that changes meter_changes times at random bars
+    :param rng: random generator
+    :param number_of_beats: approximate number of beats of the piece
+    :param meter_changes: number of changes of meter
+    :return: list of the meters of the bars
+    """
+    meters = [rng.choice(METERS)]
+    for _ in range(meter_changes):
+        meters.append(rng.choice([meter for meter in METERS if meter != meters[-1]]))
+    beats_per_section = number_of_beats / len(meters)
+    bars = []
+    for meter in meters:
+        beats_per_bar = int(meter.split("/")[0])
+        bars.extend([meter] * max(1, round(beats_per_section / beats_per_bar)))
+    return bars
+
+
+def get_score_beats(bars: list, key: str) -> list:
+    """
+    Get the symbolic onsets and the labels of the beats of the bars
+    :param bars: list of the meters of the bars
+    :param key: key of the piece, written with the first meter
+    :return: list of tuples (onset in seconds, label in the annotation format)
+    """
+    beats = []
+    onset = 0.0
+    previous_meter = None
+    for meter in bars:
+        beats_per_bar, beat_unit = (int(value) for value in meter.split("/"))
+        beat_duration = SCORE_SECONDS_PER_QUARTER * 4 / beat_unit
+        for beat in range(beats_per_bar):
+            if beat == 0 and meter != previous_meter:
+                label = f"db,{meter},{key}" if previous_meter is None else f"db,{meter}"
+            else:
+                label = "db" if beat == 0 else "b"
+            beats.append((onset, label))
+            onset += beat_duration
+        previous_meter = meter
+    return beats
+
+
+def write_annotations(path: str, onsets, labels: list) -> None:
+    """
+    Write an annotation file in the ASAP format (onset, onset and label separated by tabs)
+    :param path: path of the annotation file
+    :param onsets: onsets of the beats in seconds
+    :param labels: labels of the beats
+    :return: None
+    """
+    with open(path, "w") as f:
+        f.writelines(f"{onset:.6f}\t{onset:.6f}\t{label}\n" for onset, label in zip(onsets, labels))
+
+
+def write_notes_midi(path: str, onsets, durations, pitches, velocities) -> None:
+    """
+    Write a single track MIDI file with one note per beat at the default tempo
+    :param path: path of the MIDI file
+    :param onsets: onsets of the notes in seconds
+    :param durations: durations of the notes in seconds
+    :param pitches: MIDI pitches of the notes
+    :param velocities: velocities of the notes
+    :return: None
+    """
+    ticks_per_second = MIDI_TICKS_PER_BEAT * 1e6 / DEFAULT_TEMPO
+    starts = np.round(np.asarray(onsets) * ticks_per_second).astype(np.int64)
+    ends = np.maximum(starts + 1, np.round((np.asarray(onsets) + durations) * ticks_per_second).astype(np.int64))
+    ticks = np.concatenate((starts, ends))
+    events = [bytes((0x90, pitch, velocity)) for pitch, velocity in zip(pitches, velocities)] \
+        + [bytes((0x80, pitch, 0)) for pitch in pitches]
+    # Note offs before note ons at the same tick
+    order = np.lexsort((np.concatenate((np.ones(len(starts)), np.zeros(len(ends)))), ticks))
+    write_midi({"format": 0, "ticks_per_beat": MIDI_TICKS_PER_BEAT,
+                "tracks": [{"ticks": ticks[order], "events": [events[i] for i in order]}]}, path)
+
+
+def write_musicxml(path: str, bars: list, key: str, pitches: list, rests: list) -> None:
+    """
+    Write a MusicXML score with one note (or rest) per beat
+    :param path: path of the MusicXML file
+    :param bars: list of the meters of the bars
+    :param key: key of the piece (only its mode is written)
+    :param pitches: MIDI pitch of each beat
+    :param rests: whether each beat is a rest
+    :return: None
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<score-partwise version="3.1">',
+             '<part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>',
+             '<part id="P1">']
+    beat_index = 0
+    previous_meter = None
+    for number, meter in enumerate(bars, start=1):
+        beats_per_bar, beat_unit = (int(value) for value in meter.split("/"))
+        lines.append(f'<measure number="{number}">')
+        if meter != previous_meter:
+            attributes = ['<attributes>']
+            if previous_meter is None:
+                mode = "minor" if key.endswith("m") else "major"
+                attributes.append(f'<divisions>2</divisions><key><fifths>0</fifths><mode>{mode}</mode></key>')
+            attributes.append(f'<time><beats>{beats_per_bar}</beats><beat-type>{beat_unit}</beat-type></time>')
+            if previous_meter is None:
+                attributes.append('<clef><sign>G</sign><line>2</line></clef>')
+            attributes.append('</attributes>')
+            lines.append("".join(attributes))
+        note_type = "quarter" if beat_unit == 4 else "eighth"
+        duration = 8 // beat_unit
+        for _ in range(beats_per_bar):
+            if rests[beat_index]:
+                lines.append(f'<note><rest/><duration>{duration}</duration><voice>1</voice>'
+                             f'<type>{note_type}</type></note>')
+            else:
+                step, alter = STEPS[pitches[beat_index] % 12]
+                octave = pitches[beat_index] // 12 - 1
+                alter_element = f'<alter>{alter}</alter>' if alter else ''
+                lines.append(f'<note><pitch><step>{step}</step>{alter_element}<octave>{octave}</octave></pitch>'
+                             f'<duration>{duration}</duration><voice>1</voice><type>{note_type}</type></note>')
+            beat_index += 1
+        lines.append('</measure>')
+        previous_meter = meter
+    lines.extend(['</part>', '</score-partwise>'])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def generate_piece(folder: str, rng: random.Random, number_of_performances: int, number_of_beats: int,
+                   meter_changes: int, musicxml: bool = True, midi: bool = True) -> None:
+    """
+    Write the score files and the performances of a synthetic piece
+    :param folder: folder of the piece
+    :param rng: random generator
+    :param number_of_performances: number of performances of the piece
+    :param number_of_beats: approximate number of beats of the piece
+    :param meter_changes: number of changes of meter in the piece
+    :param musicxml: whether to write the MusicXML score
+    :param midi: whether to write the unperformed and performed MIDI files
+    :return: None
+    """
+    os.makedirs(folder, exist_ok=True)
+    bars = generate_bars(rng, number_of_beats, meter_changes)
+    key = rng.choice(KEYS)
+    beats = get_score_beats(bars, key)
+    onsets = np.array([onset for onset, _ in beats])
+    labels = [label for _, label in beats]
+    write_annotations(os.path.join(folder, SCORE_ANNOTATIONS), onsets, labels)
+
+    pitches = [60]
+    for _ in range(len(beats) - 1):
+        pitches.append(min(96, max(36, pitches[-1] + rng.choice((-7, -4, -2, -1, 1, 2, 4, 7)))))
+    rests = [rng.random() < 0.05 for _ in beats]
+    durations = np.diff(onsets, append=onsets[-1] + (onsets[-1] - onsets[-2] if len(onsets) > 1 else 0.5))
+    sounded = [i for i, rest in enumerate(rests) if not rest]
+    if musicxml:
+        write_musicxml(os.path.join(folder, MUSICXML_FILE), bars, key, pitches, rests)
+    if midi:
+        write_notes_midi(os.path.join(folder, SCORE_MIDI), onsets[sounded], durations[sounded] * 0.9,
+                         [pitches[i] for i in sounded], [64] * len(sounded))
+
+    for performance in range(number_of_performances):
+        performance_id = f"Performer{performance:02d}"
+        # A smooth random tempo curve with a slowing down at the end
+        tempo = 1 + 0.15 * np.sin(np.linspace(0, rng.uniform(2, 8) * np.pi, len(beats)) + rng.uniform(0, np.pi))
+        tempo *= np.linspace(1, rng.uniform(0.6, 1), len(beats))
+        tempo *= np.exp(np.array([rng.gauss(0, 0.04) for _ in beats]))
+        performed_durations = durations / tempo
+        performed_onsets = rng.uniform(0.5, 2) + np.concatenate(([0.0], np.cumsum(performed_durations[:-1])))
+        write_annotations(os.path.join(folder, performance_id + ANNOTATIONS_SUFFIX), performed_onsets, labels)
+        if midi:
+            velocities = [min(127, max(1, round(rng.gauss(64, 12)))) for _ in sounded]
+            write_notes_midi(os.path.join(folder, performance_id + ".mid"), performed_onsets[sounded],
+                             performed_durations[sounded] * 0.9, [pitches[i] for i in sounded], velocities)
+
+
+def generate_corpus(root: str, number_of_composers: int = 2, pieces_per_composer: int = 5,
+                    performances_per_piece: int = 3, beats_per_piece: int = 400, meter_changes: int = 1,
+                    musicxml: bool = True, midi: bool = True, seed: int = 0) -> list:
+    """
+    Write a synthetic corpus with the folder layout of ASAP (composer/piece/files)
+    :param root: root folder of the corpus
+    :param number_of_composers: number of composers
+    :param pieces_per_composer: number of pieces of each composer
+    :param performances_per_piece: number of performances of each piece
+    :param beats_per_piece: approximate number of beats of each piece
+    :param meter_changes: number of changes of meter in each piece
+    :param musicxml: whether to write the MusicXML scores
+    :param midi: whether to write the MIDI files
+    :param seed: seed of the random generator, the same seed gives the same corpus
+    :return: list of the folders of the pieces
+    """
+    rng = random.Random(seed)
+    folders = []
+    for composer in range(number_of_composers):
+        for piece in range(pieces_per_composer):
+            folder = os.path.join(root, f"Composer{composer:02d}", f"Piece{piece:03d}")
+            generate_piece(folder, rng, performances_per_piece, beats_per_piece, meter_changes, musicxml, midi)
+            folders.append(folder)
+    return folders
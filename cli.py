@@ -0,0 +1,362 @@
+"""
+This module contains the command-line entry point of the analyses of task_a and task_b.
+
+The heavy dependencies (music21, scipy, matplotlib) are only imported by the commands that need them,
+so the commands on the annotation files start quickly. The results are printed as JSON.
+
+In daemon mode ("serve"), the process keeps the parsed files in memory and answers the commands sent by
+"--connect" over a local socket, so repeated queries skip reading and parsing the files again.
+
+Usage:
+    python cli.py timing ./asap-dataset/Bach [--statistics]
+    python cli.py tempo-map ./asap-dataset/Bach/Prelude/bwv_846
+    python cli.py onsets ./asap-dataset/Bach --time-signature 4/4 --time-signature 3/4
+    python cli.py pitch-stats ./asap-dataset/Bach ./asap-dataset/Chopin
+    python cli.py t-test ./asap-dataset/Bach ./asap-dataset/Chopin --correction holm
+    python cli.py serve --socket /tmp/dm.sock
+    python cli.py --connect /tmp/dm.sock timing ./asap-dataset/Bach
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+from task_a.annotation_cache import get_cache_root
+
+# Parsed files kept in memory, keyed by the kind of result, the path, its parameters and the stat of the file.
+# The least recently used results are dropped beyond MAX_MEMORY_ENTRIES (one per file, the whole ASAP dataset fits)
+MAX_MEMORY_ENTRIES = 4096
+_memory = OrderedDict()
+
+
+def get_default_socket() -> str:
+    """
+    Get the default path of the socket of the daemon, in the cache root (see annotation_cache.get_cache_root)
+    :return: path of the Unix socket
+    """
+    return os.path.join(get_cache_root(), "daemon.sock")
+
+
+def _memoized(kind: str, path: str, compute, *parameters):
+    """
+    Get a result computed from a file, from memory if the file did not change since it was computed
+    :param kind: name of the kind of result
+    :param path: path of the file
+    :param compute: function of the path and the parameters computing the result
+    :param parameters: other parameters of compute
+    :return: the result
+    """
+    stat = os.stat(path)
+    key = (kind, os.path.abspath(path), parameters)
+    entry = _memory.get(key)
+    if entry is not None and entry[0] == (stat.st_mtime_ns, stat.st_size):
+        _memory.move_to_end(key)
+        return entry[1]
+    result = compute(path, *parameters)
+    _memory[key] = ((stat.st_mtime_ns, stat.st_size), result)
+    _memory.move_to_end(key)
+    while len(_memory) > MAX_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+    return result
+
+
+def _to_json(value):
+    """
+    Convert a result to a value serializable in JSON
+    :param value: result with numpy arrays, numpy scalars or tuple keys
+    :return: value with lists, floats and string keys
+    """
+    if isinstance(value, dict):
+        return {" | ".join(map(str, key)) if isinstance(key, tuple) else str(key): _to_json(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return _to_json(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _list_musicxml_groups(paths: list) -> tuple:
+    """
+    Get the MusicXML files of each folder given on the command line
+    :param paths: paths of the folders, each one is a group named after the folder
+    :return: list of the names of the groups and list of the lists of files of the groups
+    """
+    from task_b.corpus_loader import list_musicxml_files
+
+    names = [os.path.basename(os.path.normpath(path)) for path in paths]
+    return names, [list_musicxml_files(path) for path in paths]
+
+
+def command_timing(arguments) -> dict:
+    """
+    Tempo ratio (or statistics with --statistics) per meter and beat position of the annotations of a folder
+    """
+    from task_a.corpus_manifest import get_annotation_files, get_manifest
+    from task_a.meter_aggregation import aggregate_file, merge_aggregates
+    from task_a.timing_function import get_timing_statistics_from_aggregates
+
+    files = get_annotation_files(get_manifest(arguments.folder))
+    symbolic = [file for file in files if os.path.basename(file) == "midi_score_annotations.txt"]
+    performed = [file for file in files if os.path.basename(file) != "midi_score_annotations.txt"]
+    statistics = get_timing_statistics_from_aggregates(
+        merge_aggregates([_memoized("aggregate", file, aggregate_file) for file in symbolic]),
+        merge_aggregates([_memoized("aggregate", file, aggregate_file) for file in performed]))
+    if arguments.statistics:
+        return statistics
+    return {meter: meter_statistics["tempo_ratio"] for meter, meter_statistics in statistics.items()}
+
+
+def command_tempo_map(arguments) -> dict:
+    """
+    Tempo map of every performance of a piece
+    """
+    from task_a.corpus_manifest import get_manifest, get_performances
+    from task_a.timing_for_one_piece import get_piece_tempo_map
+
+    performances = get_performances(get_manifest(arguments.folder), piece=".")
+    if not performances or performances[0]["score_annotation_path"] is None:
+        raise ValueError(f"No annotation files found in {arguments.folder}")
+    tempo_map = get_piece_tempo_map(performances[0]["score_annotation_path"],
+                                    [performance["annotation_path"] for performance in performances])
+    return {"performances": [performance["performance"] for performance in performances], **tempo_map}
+
+
+def _load_onset_histograms(path: str, resolution: int) -> dict:
+    """
+    Onset histograms of a MusicXML file (see q1.get_onset_histograms)
+    """
+    from task_b.q1 import get_onset_histograms
+    from task_b.score_cache import load_score_features
+
+    return get_onset_histograms(load_score_features(path), resolution)
+
+
+def command_onsets(arguments) -> dict:
+    """
+    Onset histograms per time signature of the MusicXML files of each folder
+    """
+    from task_b.q1 import merge_onset_histograms
+
+    result = {}
+    for name, files in zip(*_list_musicxml_groups(arguments.paths)):
+        histograms = merge_onset_histograms(
+            [_memoized("onsets", file, _load_onset_histograms, arguments.resolution) for file in files])
+        if arguments.time_signature:
+            histograms = {time_signature: histograms[time_signature] for time_signature in arguments.time_signature
+                          if time_signature in histograms}
+        result[name] = histograms
+    return {"resolution": arguments.resolution, "histograms": result}
+
+
+def _load_pitch_counts(path: str, backend: str) -> np.ndarray:
+    """
+    Pitch counts of a MusicXML file, raising if it cannot be parsed
+    """
+    from task_b.pitch_counts import count_pitches
+
+    counts, error = count_pitches(path, backend)
+    if error is not None:
+        raise ValueError(f"'{path}' could not be parsed ({error})")
+    return counts
+
+
+def _get_group_statistics(arguments) -> dict:
+    """
+    Pitch statistics of the MusicXML files of each folder (see significance.get_statistics_from_histograms)
+    """
+    from task_b.significance import NUMBER_OF_PITCHES, get_statistics_from_histograms
+
+    names, groups = _list_musicxml_groups(arguments.paths)
+    histograms = np.zeros((len(names), NUMBER_OF_PITCHES), dtype=np.int64)
+    for i, files in enumerate(groups):
+        for file in files:
+            histograms[i] += _memoized("pitches", file, _load_pitch_counts, arguments.backend)
+    return get_statistics_from_histograms(names, histograms)
+
+
+def command_pitch_stats(arguments) -> dict:
+    """
+    Number of notes, mean, variance and entropy of the pitches of the MusicXML files of each folder
+    """
+    from task_b.pitch_counts import get_entropies
+
+    statistics = _get_group_statistics(arguments)
+    entropies = get_entropies(statistics["histograms"])
+    return {name: {"n": statistics["n"][i], "mean": statistics["mean"][i], "variance": statistics["variance"][i],
+                   "entropy": entropies[i]} for i, name in enumerate(statistics["keys"])}
+
+
+def command_t_test(arguments) -> dict:
+    """
+    Welch t-tests of the pitches of all the pairs of folders
+    """
+    from task_b.significance import correct_p_values, get_pairwise_results, welch_t_tests
+
+    statistics = _get_group_statistics(arguments)
+    tests = welch_t_tests(statistics)
+    matrices = {"t-statistic": tests["t-statistic"], "p-value": tests["p-value"]}
+    if arguments.correction:
+        matrices["corrected_p-value"] = correct_p_values(tests["p-value"], arguments.correction)
+    return get_pairwise_results(statistics, matrices)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """
+    Get the parser of the command line
+    :return: argument parser with one sub parser per command
+    """
+    # No abbreviation of --connect, so that it can be removed from the command sent to the daemon
+    parser = argparse.ArgumentParser(description="Analyses of expressive timing and pitches of the ASAP dataset",
+                                     allow_abbrev=False)
+    parser.add_argument("--connect", metavar="SOCKET", help="send the command to the daemon listening on SOCKET")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    timing_parser = commands.add_parser("timing", help="tempo ratio per meter and beat position")
+    timing_parser.add_argument("folder", help="folder of the annotation files (can be in sub folders)")
+    timing_parser.add_argument("--statistics", action="store_true",
+                               help="also give the count, mean, variance and quantiles of the performed durations")
+    timing_parser.set_defaults(function=command_timing)
+
+    tempo_map_parser = commands.add_parser("tempo-map", help="tempo map of every performance of a piece")
+    tempo_map_parser.add_argument("folder", help="folder of the piece")
+    tempo_map_parser.set_defaults(function=command_tempo_map)
+
+    onsets_parser = commands.add_parser("onsets", help="onset histograms per time signature")
+    onsets_parser.add_argument("paths", nargs="+", help="folders of MusicXML files, one group per folder")
+    onsets_parser.add_argument("--time-signature", action="append", help="time signature to keep (can be repeated)")
+    onsets_parser.add_argument("--resolution", type=int, default=12, help="grid positions per quarter note")
+    onsets_parser.set_defaults(function=command_onsets)
+
+    for name, function, help_text in (("pitch-stats", command_pitch_stats, "pitch statistics of each folder"),
+                                      ("t-test", command_t_test, "Welch t-tests between the folders")):
+        pitch_parser = commands.add_parser(name, help=help_text)
+        pitch_parser.add_argument("paths", nargs="+", help="folders of MusicXML files, one group per folder")
+        pitch_parser.add_argument("--backend", choices=("music21", "stream"), default="music21",
+                                  help="extraction of the pitches (see corpus_loader.load_file)")
+        pitch_parser.set_defaults(function=function)
+        if name == "t-test":
+            pitch_parser.add_argument("--correction", choices=("bonferroni", "holm", "fdr_bh"),
+                                      help="correction of the p-values for multiple comparisons")
+
+    serve_parser = commands.add_parser("serve", help="run the daemon answering the commands over a local socket")
+    serve_parser.add_argument("--socket", help="path of the Unix socket, daemon.sock in the cache root by default")
+    return parser
+
+
+def run_command(argv: list) -> dict:
+    """
+    Run a command in the current process
+    :param argv: arguments of the command line (without the program name)
+    :return: dict with "result" (JSON serializable) or "error"
+    """
+    arguments = get_parser().parse_args(argv)
+    try:
+        return {"result": _to_json(arguments.function(arguments))}
+    except Exception as error:
+        return {"error": f"{type(error).__name__}: {error}"}
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Answer one JSON request {"argv": [...]} per line with one JSON response per line
+    """
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                argv = json.loads(line)["argv"]
+                if argv and argv[0] == "serve":
+                    raise ValueError("The daemon cannot run the serve command")
+                response = run_command(argv)
+            except SystemExit:
+                response = {"error": "Invalid command line"}
+            except Exception as error:
+                response = {"error": f"{type(error).__name__}: {error}"}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+def serve(socket_path: str) -> None:
+    """
+    Run the daemon until it is interrupted, answering the commands one at a time
+    :param socket_path: path of the Unix socket
+    :return: None
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.UnixStreamServer(socket_path, _DaemonHandler) as server:
+        print(f"Listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def send_command(socket_path: str, argv: list) -> dict:
+    """
+    Send a command to the daemon and wait for its response
+    :param socket_path: path of the Unix socket of the daemon
+    :param argv: arguments of the command line (without the program name and --connect)
+    :return: dict with "result" or "error"
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps({"argv": argv}) + "\n").encode("utf-8"))
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+def _without_connect(argv: list) -> list:
+    """
+    Remove the --connect option from the arguments of the command line
+    :param argv: arguments of the command line, with "--connect SOCKET" or "--connect=SOCKET"
+    :return: the other arguments
+    """
+    result = []
+    tokens = iter(argv)
+    for token in tokens:
+        if token == "--connect":
+            next(tokens, None)
+        elif not token.startswith("--connect="):
+            result.append(token)
+    return result
+
+
+def main(argv: list = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = get_parser()
+    arguments = parser.parse_args(argv)
+    if arguments.connect:
+        if arguments.command == "serve":
+            parser.error("serve cannot be sent to a daemon with --connect")
+        response = send_command(arguments.connect, _without_connect(argv))
+    elif arguments.command == "serve":
+        serve(arguments.socket or get_default_socket())
+        return 0
+    else:
+        response = run_command(argv)
+    if "error" in response:
+        print(response["error"], file=sys.stderr)
+        return 1
+    print(json.dumps(response["result"], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+This module contains an on-disk cache for the parsed ASAP annotation files.
+
+Each annotation file is parsed once into columnar arrays (onset, beat type, meter and key codes)
+and stored as a structured ".npy" file that is memory-mapped on load.
+The cache entry is invalidated when the path, the modification time or the size of the file changes.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from task_a.instrumentation import count, stage
+
+DEFAULT_CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "dm_assignment1")
+
+# Bump this when the parsing or the layout of the cached arrays changes
+CACHE_VERSION = 2
+
+ANNOTATION_DTYPE = np.dtype([
+    ("onset", np.float64),
+    ("beat_type", np.int16),
+    ("meter", np.int16),
+    ("key", np.int16),
+])
+
+
+def parse_annotation_file(path: str) -> dict:
+    """
+    Parse an annotation file into columnar arrays
+    The meter and key codes are -1 on the lines where the field is not given or empty (as in "db,,G")
+    :param path: path to the annotation file
+    :return: dict with the structured array of the beats and the vocabularies of the codes
+    """
+    vocabularies = {"beat_types": [], "meters": [], "keys": []}
+    indices = {name: {} for name in vocabularies}
+
+    def code(name: str, value: str) -> int:
+        if value not in indices[name]:
+            indices[name][value] = len(vocabularies[name])
+            vocabularies[name].append(value)
+        return indices[name][value]
+
+    rows = []
+    with open(path, "r") as f:
+        for line in f:
+            line_data = line.split()
+            if not line_data:
+                continue
+            beat_type_meter_key = line_data[2].split(',')
+            meter = beat_type_meter_key[1] if len(beat_type_meter_key) > 1 else ""
+            key = beat_type_meter_key[2] if len(beat_type_meter_key) > 2 else ""
+            rows.append((float(line_data[0]), code("beat_types", beat_type_meter_key[0]),
+                         code("meters", meter) if meter else -1, code("keys", key) if key else -1))
+    return {"beats": np.array(rows, dtype=ANNOTATION_DTYPE), **vocabularies}
+
+
+def get_cache_root() -> str:
+    """
+    Get the root folder of the caches, the DM_CACHE_DIR environment variable if it is set
+    The variable is read at each call, so that it can be changed after the modules are imported
+    :return: path of the folder
+    """
+    return os.environ.get("DM_CACHE_DIR", DEFAULT_CACHE_ROOT)
+
+
+def get_cache_dir() -> str:
+    """
+    Get the default directory of the annotation cache
+    :return: the "annotations" folder of the cache root (see get_cache_root)
+    """
+    return os.path.join(get_cache_root(), "annotations")
+
+
+def _cache_paths(path: str, cache_dir: str) -> tuple[str, str]:
+    """
+    Get the paths of the array and metadata files of the cache entry of an annotation file
+    :param path: path to the annotation file
+    :param cache_dir: directory of the cache
+    :return: path to the ".npy" file and path to the ".json" file
+    """
+    name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, name + ".npy"), os.path.join(cache_dir, name + ".json")
+
+
+def _signature(path: str) -> dict:
+    """
+    Get the signature used to invalidate the cache entry of a file
+    :param path: path to the file
+    :return: dict with the path, modification time and size of the file
+    """
+    stat = os.stat(path)
+    return {"version": CACHE_VERSION, "path": os.path.abspath(path), "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size}
+
+
+def _write_atomic(path: str, write) -> None:
+    """
+    Write a file through a temporary file so that readers never see a partial file
+    :param path: destination path
+    :param write: function writing to the opened binary file
+    :return: None
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def load_annotations(path: str, cache_dir: str = None, use_cache: bool = True) -> dict:
+    """
+    Load the parsed annotation file, from the cache if it is up to date
+    :param path: path to the annotation file
+    :param cache_dir: directory of the cache, get_cache_dir() by default
+    :param use_cache: if False, the file is parsed without reading or writing the cache
+    :return: dict with the structured array of the beats ("onset", "beat_type", "meter", "key")
+    and the vocabularies of the codes ("beat_types", "meters", "keys")
+    """
+    if not use_cache:
+        return parse_annotation_file(path)
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    array_path, meta_path = _cache_paths(path, cache_dir)
+    signature = _signature(path)
+    count("files")
+    count("bytes", signature["size"])
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["signature"] == signature:
+            count("cache_hits")
+            return {"beats": np.load(array_path, mmap_mode="r"), "beat_types": meta["beat_types"],
+                    "meters": meta["meters"], "keys": meta["keys"]}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    count("cache_misses")
+    with stage("annotation_parsing"):
+        annotations = parse_annotation_file(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_atomic(array_path, lambda f: np.save(f, annotations["beats"]))
+    meta = {"signature": signature, "beat_types": annotations["beat_types"], "meters": annotations["meters"],
+            "keys": annotations["keys"]}
+    _write_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    return annotations
+
+
+def forward_fill(codes: np.ndarray) -> np.ndarray:
+    """
+    Propagate the last given code to the following lines where the code is -1
+    The lines before the first given code stay -1
+    :param codes: array of codes
+    :return: array of codes
+    """
+    codes = np.asarray(codes)
+    # Index of the last line with a given code (line 0 holds -1 if no code was given yet)
+    positions = np.where(codes >= 0, np.arange(len(codes)), 0)
+    np.maximum.accumulate(positions, out=positions)
+    return codes[positions]
+
+
+def decode(codes: np.ndarray, vocabulary: list) -> list:
+    """
+    Decode an array of codes into the corresponding strings (None for -1)
+    :param codes: array of codes
+    :param vocabulary: list of the strings of the codes
+    :return: list of strings
+    """
+    return [vocabulary[code] if code >= 0 else None for code in np.asarray(codes).tolist()]
+
+
+def clear_cache(cache_dir: str = None) -> None:
+    """
+    Remove all the entries of the cache
+    :param cache_dir: directory of the cache, get_cache_dir() by default
+    :return: None
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+    for file in os.listdir(cache_dir):
+        if file.endswith((".npy", ".json")):
+            os.remove(os.path.join(cache_dir, file))
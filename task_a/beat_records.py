@@ -0,0 +1,132 @@
+"""
+This module contains a compact representation of the beats of the performances.
+
+The beats of a performance are stored in one structured array with float onsets and integer codes for the beat
+type, the meter and the key (21 bytes per beat instead of several hundred for a dict of strings), so the beats of
+the whole ASAP corpus fit in a few tens of MB. Each record keeps its own vocabularies of the strings of the codes,
+and the codes of the records are mapped to merged vocabularies when they are concatenated.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import numpy as np
+
+from task_a.annotation_cache import decode, forward_fill, load_annotations
+
+BEAT_DTYPE = np.dtype([
+    ("symbolic_onset", np.float64),
+    ("performed_onset", np.float64),
+    ("beat_type", np.int8),
+    ("meter", np.int16),
+    ("key", np.int16),
+])
+
+LABELS = {"beat_type": "beat_types", "meter": "meters", "key": "keys"}
+
+
+def intern(vocabulary: list, indices: dict, values: list) -> np.ndarray:
+    """
+    Get the codes of strings in a vocabulary, adding the new strings to it
+    :param vocabulary: list of the strings of the codes, extended in place
+    :param indices: dict with the code of each string of the vocabulary, extended in place
+    :param values: list of strings
+    :return: array of the codes of the strings
+    """
+    for value in values:
+        if value not in indices:
+            indices[value] = len(vocabulary)
+            vocabulary.append(value)
+    return np.array([indices[value] for value in values], dtype=np.int64)
+
+
+def encode_labels(annotations: dict) -> dict:
+    """
+    Get the codes of the beat type, meter and key of each beat of a parsed annotation file
+    The meter and key carry forward to the beats where they are not given, the beats before the first one stay -1
+    :param annotations: parsed annotation file (see annotation_cache.load_annotations)
+    :return: dict with "beat_type", "meter" and "key" as keys and the array of codes as value, and a copy of the
+    vocabularies of the file ("beat_types", "meters" and "keys")
+    """
+    beats = annotations["beats"]
+    result = {}
+    for label, vocabulary in LABELS.items():
+        result[label] = np.asarray(beats[label] if label == "beat_type" else forward_fill(beats[label]))
+        result[vocabulary] = list(annotations[vocabulary])
+    return result
+
+
+def create_beat_records(symbolic_onsets, performed_onsets, labels: dict) -> dict:
+    """
+    Create the records of the beats of a performance
+    There is one record per performed beat, the missing symbolic onsets are nan
+    :param symbolic_onsets: array of the symbolic onset of each beat
+    :param performed_onsets: array of the performed onset of each beat
+    :param labels: codes and vocabularies of the beats (see encode_labels), with at least as many beats as
+    performed_onsets
+    :return: dict with the structured array of the beats (see BEAT_DTYPE) and the vocabularies of the record
+    """
+    performed_onsets = np.asarray(performed_onsets, dtype=np.float64)
+    symbolic_onsets = np.asarray(symbolic_onsets, dtype=np.float64)[:len(performed_onsets)]
+    beats = np.empty(len(performed_onsets), dtype=BEAT_DTYPE)
+    beats["symbolic_onset"] = np.nan
+    beats["symbolic_onset"][:len(symbolic_onsets)] = symbolic_onsets
+    beats["performed_onset"] = performed_onsets
+    for label in LABELS:
+        beats[label] = labels[label][:len(performed_onsets)]
+    return {"beats": beats, **{vocabulary: list(labels[vocabulary]) for vocabulary in LABELS.values()}}
+
+
+def load_beat_records(symbolic_path: str, performed_path: str) -> dict:
+    """
+    Load the records of the beats of a performance from its annotation files
+    The beat type, meter and key are the ones of the performed annotation file
+    :param symbolic_path: path to the annotation file with the symbolic times
+    :param performed_path: path to the annotation file with the performed times
+    :return: dict with the structured array of the beats and its vocabularies (see create_beat_records)
+    """
+    performed = load_annotations(performed_path)
+    return create_beat_records(load_annotations(symbolic_path)["beats"]["onset"], performed["beats"]["onset"],
+                               encode_labels(performed))
+
+
+def concatenate_beat_records(records: list) -> dict:
+    """
+    Concatenate the records of several performances
+    The codes are mapped to vocabularies merged in the order of the records
+    :param records: list of beat records (see create_beat_records)
+    :return: dict with the structured array of all the beats, the merged vocabularies and the "offsets" of the
+    performances (the beats of the performance i are beats[offsets[i]:offsets[i + 1]])
+    """
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    np.cumsum([len(record["beats"]) for record in records], out=offsets[1:])
+    beats = np.concatenate([record["beats"] for record in records]) if records else np.empty(0, dtype=BEAT_DTYPE)
+    vocabularies = {vocabulary: [] for vocabulary in LABELS.values()}
+    indices = {vocabulary: {} for vocabulary in LABELS.values()}
+    for record, start, end in zip(records, offsets[:-1], offsets[1:]):
+        for label, vocabulary in LABELS.items():
+            # The codes of the record are mapped through a lookup table, -1 is kept as the last entry
+            lookup = np.append(intern(vocabularies[vocabulary], indices[vocabulary], record[vocabulary]), -1)
+            beats[label][start:end] = lookup[record["beats"][label]]
+    return {"beats": beats, **vocabularies, "offsets": offsets}
+
+
+def to_beat_dicts(records: dict) -> dict:
+    """
+    Convert beat records to the dict of dicts per beat of get_piece_symbolic_to_performed_times
+    :param records: beat records (see create_beat_records)
+    :return: dict with the beat as key and a dict of its "symbolic" and "performed" attributes as value
+    """
+    beats = records["beats"]
+    keys = decode(beats["key"], records["keys"])
+    meters = decode(beats["meter"], records["meters"])
+    beat_types = decode(beats["beat_type"], records["beat_types"])
+    symbolic_onsets = beats["symbolic_onset"].tolist()
+    performed_onsets = beats["performed_onset"].tolist()
+    return {
+        beat: {
+            "symbolic": {"onset": symbolic_onsets[beat]},
+            "performed": {"key": keys[beat], "meter": meters[beat], "onset": performed_onsets[beat],
+                          "beat_type": beat_types[beat]},
+        } for beat in range(len(beats))
+    }
@@ -0,0 +1,256 @@
+"""
+This module contains an indexed SQLite store of the beats of the corpus for ad-hoc timing queries.
+
+The ingest step loads every beat of every performance (composer, piece, performance, beat index, beat type, meter,
+key, position in the bar, symbolic and performed onset, tempo ratio) into a local database. The performances whose
+annotation files did not change since the last ingest are skipped. The filtered aggregates are then computed by
+SQLite on the indexes instead of parsing the corpus again.
+
+The position in the bar starts from 0 for the downbeat (see meter_aggregation.get_all_beat_positions) and is NULL
+for the beats outside of a bar of their meter. The tempo ratio of the last two beats of a performance is NULL
+(see timing_for_one_piece.compute_tempo_map).
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import os
+import sqlite3
+
+import numpy as np
+
+from task_a.annotation_cache import decode, forward_fill, get_cache_root, load_annotations
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.instrumentation import count, instrumented
+from task_a.meter_aggregation import get_all_beat_positions
+from task_a.timing_for_one_piece import compute_tempo_map
+
+# Bump this when the schema or the ingested values change
+STORE_VERSION = 1
+
+BEAT_COLUMNS = ("composer", "piece", "performance", "beat", "beat_type", "meter", "key", "position",
+                "symbolic_onset", "performed_onset", "tempo_ratio")
+FILTER_COLUMNS = ("composer", "piece", "performance", "beat_type", "meter", "key", "position")
+AGGREGATED_VALUES = ("tempo_ratio", "performed_onset", "symbolic_onset")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS performances (
+    annotation_path TEXT PRIMARY KEY,
+    composer TEXT NOT NULL,
+    piece TEXT NOT NULL,
+    performance TEXT NOT NULL,
+    signature TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS beats (
+    annotation_path TEXT NOT NULL,
+    composer TEXT NOT NULL,
+    piece TEXT NOT NULL,
+    performance TEXT NOT NULL,
+    beat INTEGER NOT NULL,
+    beat_type TEXT,
+    meter TEXT,
+    key TEXT,
+    position INTEGER,
+    symbolic_onset REAL,
+    performed_onset REAL NOT NULL,
+    tempo_ratio REAL
+);
+CREATE INDEX IF NOT EXISTS beats_composer_meter_position ON beats (composer, meter, position);
+CREATE INDEX IF NOT EXISTS beats_piece_performance ON beats (piece, performance);
+CREATE INDEX IF NOT EXISTS beats_annotation_path ON beats (annotation_path);
+"""
+
+
+def connect(database: str = None) -> sqlite3.Connection:
+    """
+    Open the beat store, creating it if needed (a store of another version is emptied)
+    :param database: path of the SQLite file, ":memory:" for a store in memory, beats.sqlite in the cache root by
+    default (see annotation_cache.get_cache_root)
+    :return: connection to the store
+    """
+    if database is None:
+        database = os.path.join(get_cache_root(), "beats.sqlite")
+    if database != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    if connection.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+        connection.executescript("DROP TABLE IF EXISTS beats; DROP TABLE IF EXISTS performances;")
+        connection.execute(f"PRAGMA user_version = {STORE_VERSION}")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_beat_rows(performance: dict) -> list:
+    """
+    Get the rows of the beats of a performance
+    The beat type, meter and key are the ones of the performed annotation file, the position in the bar is computed
+    from the score annotation file
+    :param performance: performance of the manifest (see corpus_manifest.get_performances_from_directories)
+    :return: list of tuples with the values of BEAT_COLUMNS
+    """
+    performed = load_annotations(performance["annotation_path"])
+    score = load_annotations(performance["score_annotation_path"])
+    beats = performed["beats"]
+    number_of_beats = len(beats)
+    symbolic_onsets = np.full(number_of_beats, np.nan)
+    given = min(number_of_beats, len(score["beats"]))
+    symbolic_onsets[:given] = score["beats"]["onset"][:given]
+    _, positions, kept = get_all_beat_positions(score)
+    all_positions = np.full(number_of_beats, -1, dtype=np.int64)
+    all_positions[:given] = np.where(kept, positions, -1)[:given]
+    tempo_ratios = np.full(number_of_beats, np.nan)
+    tempo_ratio = compute_tempo_map(symbolic_onsets, beats["onset"])["tempo_ratio"]
+    tempo_ratios[:len(tempo_ratio)] = tempo_ratio
+
+    def to_sql(values: np.ndarray) -> list:
+        # sqlite stores nan as NULL only when given None
+        return [None if value != value else value for value in values.tolist()]
+
+    return list(zip(
+        [performance["composer"]] * number_of_beats,
+        [performance["piece"]] * number_of_beats,
+        [performance["performance"]] * number_of_beats,
+        range(number_of_beats),
+        decode(beats["beat_type"], performed["beat_types"]),
+        decode(forward_fill(beats["meter"]), performed["meters"]),
+        decode(forward_fill(beats["key"]), performed["keys"]),
+        [position if position >= 0 else None for position in all_positions.tolist()],
+        to_sql(symbolic_onsets),
+        beats["onset"].tolist(),
+        to_sql(tempo_ratios),
+    ))
+
+
+def _signature(performance: dict) -> str:
+    """
+    Get the signature used to detect the changes of the annotation files of a performance
+    :param performance: performance of the manifest
+    :return: string with the modification time and size of the performed and score annotation files
+    """
+    # The files are stated again, an edit in place does not change the listing of the manifest
+    stats = [os.stat(performance["annotation_path"]), os.stat(performance["score_annotation_path"])]
+    return ":".join(f"{stat.st_mtime_ns}:{stat.st_size}" for stat in stats)
+
+
+@instrumented("beat_store.ingest")
+def ingest_corpus(root: str, database: str = None) -> int:
+    """
+    Load the beats of all the performances of a corpus into the store
+    Only the performances that are new or whose annotation files changed are loaded, and the performances of the
+    corpus that no longer exist are removed
+    :param root: path to the root folder of the corpus
+    :param database: path of the SQLite file, see connect
+    :return: number of performances loaded
+    """
+    manifest = get_manifest(root)
+    performances = [performance for performance in get_performances(manifest)
+                    if performance["score_annotation_path"] is not None]
+    with connect(database) as connection:
+        stored = {row["annotation_path"]: row["signature"] for row in
+                  connection.execute("SELECT annotation_path, signature FROM performances")}
+        paths = {os.path.abspath(performance["annotation_path"]) for performance in performances}
+        # The performances of the corpus that were removed from the folders
+        prefix = os.path.join(manifest["root"], "")
+        removed = [(path,) for path in stored if path.startswith(prefix) and path not in paths]
+        connection.executemany("DELETE FROM beats WHERE annotation_path = ?", removed)
+        connection.executemany("DELETE FROM performances WHERE annotation_path = ?", removed)
+
+        loaded = 0
+        for performance in performances:
+            path = os.path.abspath(performance["annotation_path"])
+            signature = _signature(performance)
+            if stored.get(path) == signature:
+                continue
+            rows = get_beat_rows(performance)
+            connection.execute("DELETE FROM beats WHERE annotation_path = ?", (path,))
+            connection.executemany(f"INSERT INTO beats (annotation_path, {', '.join(BEAT_COLUMNS)}) "
+                                   f"VALUES ({', '.join('?' * (len(BEAT_COLUMNS) + 1))})",
+                                   [(path, *row) for row in rows])
+            connection.execute("INSERT OR REPLACE INTO performances VALUES (?, ?, ?, ?, ?)",
+                               (path, performance["composer"], performance["piece"], performance["performance"],
+                                signature))
+            count("beats", len(rows))
+            loaded += 1
+    connection.close()
+    return loaded
+
+
+def _where(filters: dict, min_performances: int = None) -> tuple:
+    """
+    Build the WHERE clause of a query
+    :param filters: dict with a column of FILTER_COLUMNS as key and the value (or list of values) to keep as value
+    :param min_performances: keep only the pieces with at least this number of performances
+    :return: the clause (empty if there is no filter) and the list of its parameters
+    """
+    conditions = []
+    parameters = []
+    for column, value in filters.items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown filter '{column}', expected one of {FILTER_COLUMNS}")
+        if value is None:
+            continue
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+        parameters.extend(values)
+    if min_performances is not None:
+        conditions.append("piece IN (SELECT piece FROM performances GROUP BY piece HAVING COUNT(*) >= ?)")
+        parameters.append(min_performances)
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), parameters
+
+
+def query_beats(connection: sqlite3.Connection, min_performances: int = None, limit: int = None,
+                **filters) -> list:
+    """
+    Get the beats matching filters
+    Example: all the beats in a key performed by more than five pianists,
+    query_beats(connection, key="F#", min_performances=6)
+    :param connection: connection to the store (see connect)
+    :param min_performances: keep only the pieces with at least this number of performances
+    :param limit: maximum number of beats returned
+    :param filters: values (or lists of values) of the columns of FILTER_COLUMNS to keep
+    :return: list of dict with BEAT_COLUMNS as keys
+    """
+    where, parameters = _where(filters, min_performances)
+    query = f"SELECT {', '.join(BEAT_COLUMNS)} FROM beats {where} ORDER BY piece, performance, beat"
+    if limit is not None:
+        query += " LIMIT ?"
+        parameters.append(limit)
+    return [dict(row) for row in connection.execute(query, parameters)]
+
+
+def aggregate_beats(connection: sqlite3.Connection, value: str = "tempo_ratio", by: tuple = ("meter", "position"),
+                    min_performances: int = None, **filters) -> list:
+    """
+    Aggregate a value of the beats matching filters, per group
+    Example: the tempo ratio on the third beat of 3/4 in Chopin,
+    aggregate_beats(connection, composer="Chopin", meter="3/4", position=2)
+    :param connection: connection to the store (see connect)
+    :param value: aggregated column, one of AGGREGATED_VALUES
+    :param by: columns of FILTER_COLUMNS of the groups, empty for one group of all the beats
+    :param min_performances: keep only the pieces with at least this number of performances
+    :param filters: values (or lists of values) of the columns of FILTER_COLUMNS to keep
+    :return: list of dict with the columns of the group and the "count", "mean", "std" (population standard
+    deviation), "min" and "max" of the value (the NULL values are left out)
+    """
+    if value not in AGGREGATED_VALUES:
+        raise ValueError(f"Unknown value '{value}', expected one of {AGGREGATED_VALUES}")
+    unknown = [column for column in by if column not in FILTER_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns {unknown}, expected some of {FILTER_COLUMNS}")
+    where, parameters = _where(filters, min_performances)
+    where = f"{where} AND {value} IS NOT NULL" if where else f"WHERE {value} IS NOT NULL"
+    group = f"GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}" if by else ""
+    columns = "".join(f"{column}, " for column in by)
+    query = (f"SELECT {columns}COUNT(*) AS count, AVG({value}) AS mean, "
+             f"AVG({value} * {value}) AS mean_of_squares, MIN({value}) AS min, MAX({value}) AS max "
+             f"FROM beats {where} {group}")
+    result = []
+    for row in connection.execute(query, parameters):
+        row = dict(row)
+        if row["count"] == 0:
+            continue
+        mean_of_squares = row.pop("mean_of_squares")
+        row["std"] = max(mean_of_squares - row["mean"] ** 2, 0) ** 0.5
+        result.append(row)
+    return result
@@ -0,0 +1,170 @@
+"""
+This module contains the manifest of an ASAP-like corpus, built in a single scan of the folders.
+
+The manifest records the listing and the stats of every folder and is persisted to disk,
+so a rescan only lists again the folders whose modification time changed (the files of the other folders
+are only stat'ed again, since editing a file in place does not change the modification time of its folder).
+The performances (composer, piece, performance id and paths of the annotation, MIDI and MusicXML files)
+are derived from the listings.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import hashlib
+import json
+import os
+
+from task_a.annotation_cache import get_cache_root
+from task_a.instrumentation import instrumented
+
+# Bump this when the layout of the manifest changes
+MANIFEST_VERSION = 1
+
+SCORE_ANNOTATIONS = "midi_score_annotations.txt"
+SCORE_MIDI = "midi_score.mid"
+ANNOTATIONS_SUFFIX = "_annotations.txt"
+
+
+def _manifest_path(root: str, manifest_dir: str) -> str:
+    """
+    Get the path of the persisted manifest of a corpus
+    :param root: path to the root folder of the corpus
+    :param manifest_dir: directory of the manifests
+    :return: path to the json file
+    """
+    name = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()
+    return os.path.join(manifest_dir, name + ".json")
+
+
+def scan_corpus(root: str, previous: dict = None) -> dict:
+    """
+    Scan the folders of a corpus once, reusing the listing of the previous manifest for unchanged folders
+    (the stats of their files are read again)
+    :param root: path to the root folder of the corpus
+    :param previous: previous manifest of the same corpus, or None
+    :return: dict with the relative path of each folder as key and its modification time, sub folders and
+    files (with their size and modification time) as value
+    """
+    previous_directories = previous["directories"] if previous else {}
+    directories = {}
+    stack = ["."]
+    while stack:
+        relative_dir = stack.pop()
+        dir_path = os.path.normpath(os.path.join(root, relative_dir))
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        previous_directory = previous_directories.get(relative_dir)
+        if previous_directory is not None and previous_directory["mtime_ns"] == mtime_ns:
+            # Same listing, but a file edited in place does not change the modification time of its folder
+            directory = {"mtime_ns": mtime_ns, "subdirs": previous_directory["subdirs"], "files": {}}
+            for name in previous_directory["files"]:
+                stat = os.stat(os.path.join(dir_path, name))
+                directory["files"][name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        else:
+            directory = {"mtime_ns": mtime_ns, "subdirs": [], "files": {}}
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        directory["subdirs"].append(entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        directory["files"][entry.name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            directory["subdirs"].sort()
+        directories[relative_dir] = directory
+        stack.extend(os.path.normpath(os.path.join(relative_dir, subdir)) for subdir in reversed(directory["subdirs"]))
+    return directories
+
+
+def get_performances_from_directories(root: str, directories: dict) -> list:
+    """
+    Get the performances of a corpus from the listing of its folders
+    :param root: path to the root folder of the corpus
+    :param directories: listing of the folders (see scan_corpus)
+    :return: list of dict with the composer, piece, performance id, paths and stats of each performance
+    """
+    performances = []
+    for relative_dir in sorted(directories):
+        files = directories[relative_dir]["files"]
+        dir_path = os.path.normpath(os.path.join(root, relative_dir))
+        musicxml_files = sorted(file for file in files if file.endswith(".musicxml"))
+        for file in sorted(files):
+            if not file.endswith(ANNOTATIONS_SUFFIX) or file == SCORE_ANNOTATIONS:
+                continue
+            performance_id = file[:-len(ANNOTATIONS_SUFFIX)]
+            midi_file = performance_id + ".mid"
+            performances.append({
+                "composer": relative_dir.split(os.sep)[0] if relative_dir != "." else os.path.basename(dir_path),
+                "piece": relative_dir,
+                "performance": performance_id,
+                "annotation_path": os.path.join(dir_path, file),
+                "score_annotation_path":
+                    os.path.join(dir_path, SCORE_ANNOTATIONS) if SCORE_ANNOTATIONS in files else None,
+                "midi_path": os.path.join(dir_path, midi_file) if midi_file in files else None,
+                "score_midi_path": os.path.join(dir_path, SCORE_MIDI) if SCORE_MIDI in files else None,
+                "musicxml_path": os.path.join(dir_path, musicxml_files[0]) if musicxml_files else None,
+                "annotation_size": files[file]["size"],
+                "annotation_mtime_ns": files[file]["mtime_ns"],
+            })
+    return performances
+
+
+@instrumented("discovery")
+def get_manifest(root: str, manifest_dir: str = None) -> dict:
+    """
+    Get the manifest of a corpus, rescanning only the folders that changed since it was persisted
+    :param root: path to the root folder of the corpus
+    :param manifest_dir: directory of the manifests, the "manifests" folder of the cache root by default
+    (see annotation_cache.get_cache_root)
+    :return: dict with the root, the listing of the folders ("directories") and the performances
+    """
+    if manifest_dir is None:
+        manifest_dir = os.path.join(get_cache_root(), "manifests")
+    manifest_path = _manifest_path(root, manifest_dir)
+    previous = None
+    try:
+        with open(manifest_path, "r") as f:
+            previous = json.load(f)
+        if previous.get("version") != MANIFEST_VERSION:
+            previous = None
+    except (OSError, ValueError):
+        pass
+
+    directories = scan_corpus(root, previous)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "root": os.path.abspath(root),
+        "directories": directories,
+        "performances": get_performances_from_directories(root, directories),
+    }
+    if previous is None or previous["directories"] != directories:
+        os.makedirs(manifest_dir, exist_ok=True)
+        tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def get_annotation_files(manifest: dict) -> list:
+    """
+    Get the path of all the annotation files of a corpus, each file once
+    :param manifest: manifest of the corpus
+    :return: list of paths to the txt files
+    """
+    root = manifest["root"]
+    return [os.path.normpath(os.path.join(root, relative_dir, file))
+            for relative_dir in sorted(manifest["directories"])
+            for file in sorted(manifest["directories"][relative_dir]["files"]) if file.endswith("annotations.txt")]
+
+
+def get_performances(manifest: dict, composer: str = None, piece: str = None) -> list:
+    """
+    Get the performances of a corpus, optionally for a single composer or piece
+    :param manifest: manifest of the corpus
+    :param composer: name of the composer (first folder under the root)
+    :param piece: path of the piece folder relative to the root
+    :return: list of dict (see get_performances_from_directories)
+    """
+    return [performance for performance in manifest["performances"]
+            if (composer is None or performance["composer"] == composer)
+            and (piece is None or performance["piece"] == os.path.normpath(piece))]
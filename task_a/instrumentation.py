@@ -0,0 +1,239 @@
+"""
+This module contains an opt-in instrumentation layer for the entry points of task_a and task_b.
+
+When enabled, every stage records its number of calls, wall and CPU time, counters (files, bytes, notes,
+cache hits and misses...) and optionally the peak of the memory traced by tracemalloc. Stages can be nested,
+a nested stage is reported under "<outer stage>/<stage>". The top-level stages can also be profiled with
+cProfile, and the profile of the slowest one is written next to the JSON report.
+When disabled (the default), a stage is a shared no-op context manager and a counter returns immediately.
+
+Only the current process is measured: the work done in worker processes counts in the wall time of the stage
+that waits for them.
+
+The instrumentation can be enabled from the environment: DM_INSTRUMENT=<path of the report> enables it at
+import and writes the report when the interpreter exits (DM_INSTRUMENT_PROFILE=1 also profiles the stages).
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_DISABLED_STAGE = contextlib.nullcontext()
+NO_STAGE = "(no stage)"
+
+_enabled = False
+_profile = False
+_trace_memory = False
+_stack = []
+_stages = {}
+_profilers = {}
+
+
+def enable(profile: bool = False, trace_memory: bool = False) -> None:
+    """
+    Enable the instrumentation and reset the recorded stages
+    :param profile: whether to profile the top-level stages with cProfile
+    :param trace_memory: whether to record the peak memory of the stages with tracemalloc (slows down the stages)
+    :return: None
+    """
+    global _enabled, _profile, _trace_memory
+    reset()
+    _enabled = True
+    _profile = profile
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    """
+    Disable the instrumentation, the recorded stages are kept until the next enable or reset
+    :return: None
+    """
+    global _enabled
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    """
+    Check if the instrumentation is enabled
+    :return: whether the instrumentation is enabled
+    """
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Forget the recorded stages and profiles
+    :return: None
+    """
+    _stack.clear()
+    _stages.clear()
+    _profilers.clear()
+
+
+def _get_record(name: str) -> dict:
+    """
+    Get the record of a stage, creating it if needed
+    :param name: full name of the stage
+    :return: dict of the measures of the stage
+    """
+    record = _stages.get(name)
+    if record is None:
+        record = {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "counters": {}}
+        _stages[name] = record
+    return record
+
+
+@contextlib.contextmanager
+def _measure_stage(name: str):
+    """
+    Measure a stage (the instrumentation is enabled)
+    :param name: name of the stage
+    """
+    full_name = f"{_stack[-1]['name']}/{name}" if _stack else name
+    frame = {"name": full_name, "peak": 0}
+    profiler = None
+    if _profile and not _stack:
+        profiler = _profilers.setdefault(full_name, cProfile.Profile())
+    if _trace_memory:
+        # The peak of the outer stage so far is kept in its frame before the peak is reset for this stage
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            _stack[-1]["peak"] = max(_stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame["start_memory"] = current
+    _stack.append(frame)
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+        _stack.pop()
+        record = _get_record(full_name)
+        record["calls"] += 1
+        record["wall_seconds"] += wall
+        record["cpu_seconds"] += cpu
+        if _trace_memory and tracemalloc.is_tracing():
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if _stack:
+                _stack[-1]["peak"] = max(_stack[-1]["peak"], peak)
+            record["peak_memory_bytes"] = max(record.get("peak_memory_bytes", 0), peak - frame["start_memory"])
+
+
+def stage(name: str):
+    """
+    Get a context manager measuring a stage
+    :param name: name of the stage
+    :return: context manager (a shared no-op one when the instrumentation is disabled)
+    """
+    if not _enabled:
+        return _DISABLED_STAGE
+    return _measure_stage(name)
+
+
+def instrumented(name: str):
+    """
+    Decorator measuring each call of a function as a stage
+    :param name: name of the stage
+    :return: decorator
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _measure_stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, value: int = 1) -> None:
+    """
+    Add to a counter of the current stage (for example "files", "bytes", "notes", "cache_hits", "cache_misses")
+    :param name: name of the counter
+    :param value: value to add
+    :return: None
+    """
+    if not _enabled:
+        return
+    counters = _get_record(_stack[-1]["name"] if _stack else NO_STAGE)["counters"]
+    counters[name] = counters.get(name, 0) + value
+
+
+def get_hottest_stage() -> str or None:
+    """
+    Get the top-level stage with the longest total wall time
+    :return: name of the stage, None if no stage was recorded
+    """
+    top_level = {name: record for name, record in _stages.items() if "/" not in name and name != NO_STAGE}
+    if not top_level:
+        return None
+    return max(top_level, key=lambda name: top_level[name]["wall_seconds"])
+
+
+def get_report() -> dict:
+    """
+    Get the measures of the recorded stages
+    :return: dict with the "stages" (name as key and dict of measures as value), the "hottest_stage"
+    and the peak resident memory of the process ("max_rss_bytes", None if not available)
+    """
+    max_rss = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        "stages": {name: {**record, "counters": dict(record["counters"])} for name, record in _stages.items()},
+        "hottest_stage": get_hottest_stage(),
+        "max_rss_bytes": max_rss,
+    }
+
+
+def write_report(path: str, profile_path: str = None) -> dict:
+    """
+    Write the report as JSON, and the cProfile dump of the hottest stage if the stages were profiled
+    :param path: path of the JSON report
+    :param profile_path: path of the cProfile dump (readable with pstats), by default the report path with
+    the extension ".prof"
+    :return: the report
+    """
+    report = get_report()
+    hottest_stage = report["hottest_stage"]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if hottest_stage in _profilers:
+        if profile_path is None:
+            profile_path = os.path.splitext(path)[0] + ".prof"
+        _profilers[hottest_stage].dump_stats(profile_path)
+        report["profile_path"] = profile_path
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if os.environ.get("DM_INSTRUMENT"):
+    enable(profile=bool(os.environ.get("DM_INSTRUMENT_PROFILE")))
+    atexit.register(write_report, os.environ["DM_INSTRUMENT"])
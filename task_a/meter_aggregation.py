@@ -0,0 +1,224 @@
+"""
+This module contains the vectorized aggregation of the beat durations per meter and beat position.
+
+The metrical position of every beat of a file is computed with array operations (following the rules
+of get_sum_and_lengths_timing_one_bar) and the durations are reduced per (meter, beat position) with bincount.
+Each aggregate holds the count, the sum, the sum of squared deviations (merged with the parallel form of
+Welford's algorithm) and a log-spaced histogram of the durations used for approximate quantiles.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import numpy as np
+
+from task_a.annotation_cache import forward_fill, load_annotations
+from task_a.instrumentation import count
+
+# Log-spaced bins of the durations (in seconds) used for the approximate quantiles
+HISTOGRAM_BINS_PER_DECADE = 64
+HISTOGRAM_MIN_DURATION = 1e-3
+HISTOGRAM_MAX_DURATION = 1e2
+HISTOGRAM_EDGES = np.logspace(np.log10(HISTOGRAM_MIN_DURATION), np.log10(HISTOGRAM_MAX_DURATION),
+                              int(np.log10(HISTOGRAM_MAX_DURATION / HISTOGRAM_MIN_DURATION))
+                              * HISTOGRAM_BINS_PER_DECADE + 1)
+HISTOGRAM_SIZE = len(HISTOGRAM_EDGES) - 1
+
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def get_all_beat_positions(annotations: dict) -> tuple:
+    """
+    Get the meter and the position in the bar of every beat of an annotation file
+    A new meter resets the position, a downbeat ("db") sets it to 0 and a beat ("b") increments it
+    :param annotations: parsed annotation file (see annotation_cache.load_annotations)
+    :return: array of meter codes (-1 for the anacrusis), array of positions and boolean array of the beats
+    kept in the aggregation (not in the anacrusis and not outside of the meter, "bR")
+    """
+    beats = annotations["beats"]
+    beat_types = annotations["beat_types"]
+    raw_meters = np.asarray(beats["meter"])
+    beat_type_codes = np.asarray(beats["beat_type"])
+
+    def is_beat_type(name: str) -> np.ndarray:
+        return beat_type_codes == (beat_types.index(name) if name in beat_types else -2)
+
+    is_downbeat = is_beat_type("db")
+    is_beat = is_beat_type("b")
+    meters = forward_fill(raw_meters)
+    previous_meters = np.concatenate(([-1], meters[:-1]))
+    is_new_meter = (raw_meters >= 0) & (raw_meters != previous_meters)
+
+    # The position is the number of beats since the last downbeat or change of meter
+    # (a change of meter on a beat "b" counts that beat)
+    anchors = np.where(is_downbeat | is_new_meter, np.arange(len(raw_meters)), 0)
+    np.maximum.accumulate(anchors, out=anchors)
+    number_of_beats = np.cumsum(is_beat)
+    positions = number_of_beats - number_of_beats[anchors] + is_beat[anchors]
+    return meters, positions, (meters >= 0) & ~is_beat_type("bR")
+
+
+def get_beat_positions(annotations: dict) -> tuple:
+    """
+    Get the meter, the position in the bar and the duration of each beat of an annotation file
+    Beats outside of the meter ("bR"), the anacrusis and the last beat (without duration) are left out
+    :param annotations: parsed annotation file (see annotation_cache.load_annotations)
+    :return: array of meter codes, array of positions and array of durations of the kept beats
+    """
+    onsets = np.asarray(annotations["beats"]["onset"])
+    if len(onsets) < 2:
+        return np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int64), np.zeros(0)
+    meters, positions, kept = get_all_beat_positions(annotations)
+    kept = kept[:-1]
+    return meters[:-1][kept], positions[:-1][kept], np.diff(onsets)[kept]
+
+
+def get_meter_order(annotations: dict) -> list:
+    """
+    Get the meter codes of an annotation file in the order of their first appearance
+    :param annotations: parsed annotation file
+    :return: list of meter codes
+    """
+    raw_meters = np.asarray(annotations["beats"]["meter"])[:-1]
+    codes, first_indices = np.unique(raw_meters[raw_meters >= 0], return_index=True)
+    return codes[np.argsort(first_indices)].tolist()
+
+
+def aggregate_annotations(annotations: dict) -> dict:
+    """
+    Aggregate the durations of the beats of an annotation file per meter and beat position
+    :param annotations: parsed annotation file
+    :return: dict with meter as key and a dict of arrays (one value per beat position) as value:
+    "number_of_beats", "sum_durations", "m2" (sum of squared deviations from the mean) and
+    "histogram" (one row of counts per beat position, see HISTOGRAM_EDGES)
+    """
+    meters, positions, durations = get_beat_positions(annotations)
+    count("beats", len(durations))
+    meter_order = get_meter_order(annotations)
+    number_of_positions = int(positions.max()) + 1 if len(positions) else 1
+    groups = meters.astype(np.int64) * number_of_positions + positions
+    number_of_groups = len(annotations["meters"]) * number_of_positions
+
+    counts = np.bincount(groups, minlength=number_of_groups)
+    # bincount gives integers when no beat is kept, even with weights
+    sums = np.bincount(groups, weights=durations, minlength=number_of_groups).astype(np.float64)
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    m2 = np.bincount(groups, weights=(durations - means[groups]) ** 2, minlength=number_of_groups).astype(np.float64)
+    bins = np.clip(np.searchsorted(HISTOGRAM_EDGES, durations, side="right") - 1, 0, HISTOGRAM_SIZE - 1)
+    histogram = np.bincount(groups * HISTOGRAM_SIZE + bins, minlength=number_of_groups * HISTOGRAM_SIZE)
+
+    counts = counts.reshape(-1, number_of_positions)
+    sums = sums.reshape(-1, number_of_positions)
+    m2 = m2.reshape(-1, number_of_positions)
+    histogram = histogram.reshape(-1, number_of_positions, HISTOGRAM_SIZE)
+    result = {}
+    for meter in meter_order:
+        length = max(1, int(np.flatnonzero(counts[meter]).max()) + 1 if counts[meter].any() else 1)
+        result[annotations["meters"][meter]] = {
+            "number_of_beats": counts[meter, :length],
+            "sum_durations": sums[meter, :length],
+            "m2": m2[meter, :length],
+            "histogram": histogram[meter, :length],
+        }
+    return result
+
+
+def aggregate_file(path: str) -> dict:
+    """
+    Aggregate the durations of the beats of an annotation file per meter and beat position
+    :param path: path to the annotation file
+    :return: dict with meter as key (see aggregate_annotations)
+    """
+    return aggregate_annotations(load_annotations(path))
+
+
+def merge_two_aggregates(first: dict, second: dict) -> dict:
+    """
+    Merge the aggregates of the same meter and number of beat positions
+    The sums of squared deviations are combined with the parallel form of Welford's algorithm
+    :param first: aggregate of a meter
+    :param second: aggregate of the same meter
+    :return: merged aggregate
+    """
+    count = first["number_of_beats"] + second["number_of_beats"]
+    safe_count = np.maximum(count, 1)
+    first_mean = np.divide(first["sum_durations"], np.maximum(first["number_of_beats"], 1))
+    second_mean = np.divide(second["sum_durations"], np.maximum(second["number_of_beats"], 1))
+    delta = second_mean - first_mean
+    return {
+        "number_of_beats": count,
+        "sum_durations": first["sum_durations"] + second["sum_durations"],
+        "m2": first["m2"] + second["m2"]
+        + delta ** 2 * first["number_of_beats"] * second["number_of_beats"] / safe_count,
+        "histogram": first["histogram"] + second["histogram"],
+    }
+
+
+def merge_aggregates(aggregates: list) -> dict:
+    """
+    Merge the aggregates of multiple files
+    A meter with a different number of beat positions than the first one found is kept apart
+    under the key "<meter>_with_<n>_downbeat(s)", as in merge_sum_and_lengths_timings
+    :param aggregates: list of dict with meter as key (see aggregate_annotations)
+    :return: dict with meter as key
+    """
+    result = {}
+    for aggregate in aggregates:
+        for meter, meter_aggregate in aggregate.items():
+            length = len(meter_aggregate["sum_durations"])
+            meter_for_result = meter
+            if meter in result and len(result[meter]["sum_durations"]) != length:
+                meter_for_result = f"{meter}_with_{length}_downbeat{'s' if length > 1 else ''}"
+            if meter_for_result in result:
+                result[meter_for_result] = merge_two_aggregates(result[meter_for_result], meter_aggregate)
+            else:
+                result[meter_for_result] = {name: np.array(values) for name, values in meter_aggregate.items()}
+    return result
+
+
+def get_quantiles_from_histogram(histogram: np.ndarray, quantiles: tuple) -> np.ndarray:
+    """
+    Approximate quantiles from the histograms of the durations, interpolating linearly in the log domain of a bin
+    :param histogram: 2D array with one histogram per row (see HISTOGRAM_EDGES)
+    :param quantiles: quantiles to compute, between 0 and 1
+    :return: 2D array with one row per quantile and one column per histogram (nan for an empty histogram)
+    """
+    histogram = np.atleast_2d(histogram)
+    cumulative = np.cumsum(histogram, axis=1)
+    totals = cumulative[:, -1]
+    log_edges = np.log(HISTOGRAM_EDGES)
+    result = np.full((len(quantiles), len(histogram)), np.nan)
+    for i, quantile in enumerate(quantiles):
+        targets = quantile * totals
+        bins = np.minimum((cumulative < targets[:, None]).sum(axis=1), HISTOGRAM_SIZE - 1)
+        rows = np.arange(len(histogram))
+        below = np.where(bins > 0, cumulative[rows, np.maximum(bins - 1, 0)], 0)
+        in_bin = histogram[rows, bins]
+        fraction = np.divide(targets - below, in_bin, out=np.zeros(len(histogram)), where=in_bin > 0)
+        values = np.exp(log_edges[bins] + fraction * (log_edges[bins + 1] - log_edges[bins]))
+        result[i] = np.where(totals > 0, values, np.nan)
+    return result
+
+
+def get_statistics(aggregate: dict, quantiles: tuple = DEFAULT_QUANTILES) -> dict:
+    """
+    Get the statistics of the durations for each beat position of each meter
+    :param aggregate: dict with meter as key (see merge_aggregates)
+    :param quantiles: quantiles to approximate, between 0 and 1
+    :return: dict with meter as key and a dict with the "count", "mean", "variance" (unbiased)
+    and "quantiles" (dict with quantile as key) of the durations as lists (one value per beat position)
+    """
+    result = {}
+    for meter, meter_aggregate in aggregate.items():
+        counts = meter_aggregate["number_of_beats"]
+        means = np.divide(meter_aggregate["sum_durations"], counts, out=np.full(len(counts), np.nan),
+                          where=counts > 0)
+        variances = np.divide(meter_aggregate["m2"], counts - 1, out=np.full(len(counts), np.nan), where=counts > 1)
+        quantile_values = get_quantiles_from_histogram(meter_aggregate["histogram"], quantiles)
+        result[meter] = {
+            "count": counts.tolist(),
+            "mean": means.tolist(),
+            "variance": variances.tolist(),
+            "quantiles": {quantile: values.tolist() for quantile, values in zip(quantiles, quantile_values)},
+        }
+    return result
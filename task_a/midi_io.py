@@ -0,0 +1,228 @@
+"""
+This module contains a lightweight reader and writer of standard MIDI files.
+
+The events of each track are kept as raw messages (with an explicit status byte) next to an array of their
+absolute ticks, so that the timing of a whole file can be transformed with array operations
+without building a music21 object tree.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import struct
+
+import numpy as np
+
+DEFAULT_TEMPO = 500000  # microseconds per beat (120 bpm)
+SET_TEMPO = 0x51
+END_OF_TRACK = 0x2F
+
+
+def _read_variable_length(data: bytes, position: int) -> tuple[int, int]:
+    """
+    Read a variable-length quantity
+    :param data: bytes of the track
+    :param position: position of the first byte of the quantity
+    :return: the value and the position after the quantity
+    """
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, position
+
+
+# Number of data bytes of the channel messages for each status byte: program change and channel pressure have one,
+# the other channel messages two
+_CHANNEL_MESSAGE_SIZES = [(1 if status & 0xF0 in (0xC0, 0xD0) else 2) if 0x80 <= status < 0xF0 else 0
+                          for status in range(256)]
+_STATUS_BYTES = [bytes((status,)) for status in range(256)]
+
+# Largest delta time of a variable-length quantity (four bytes)
+MAX_DELTA = (1 << 28) - 1
+
+
+def _read_track(data: bytes) -> dict:
+    """
+    Read the events of a track
+    Only the delta times and the lengths of the messages (running status, variable-length quantities) are scanned
+    byte by byte, the channel messages are decoded with array operations (see decode_channel_messages)
+    :param data: bytes of the track chunk (without its header)
+    :return: dict with the absolute "ticks" (array) and the raw "events" (list of bytes) of the track
+    """
+    deltas = []
+    events = []
+    append_delta = deltas.append
+    append_event = events.append
+    sizes = _CHANNEL_MESSAGE_SIZES
+    position = 0
+    status_byte = None
+    size = 0
+    length = len(data)
+    while position < length:
+        delta = data[position]
+        if delta < 0x80:
+            position += 1
+        else:
+            delta, position = _read_variable_length(data, position)
+        append_delta(delta)
+        byte = data[position]
+        if byte < 0x80:
+            # Running status, the status byte of the previous channel message is implied
+            if status_byte is None:
+                raise ValueError("Running status without a previous status byte")
+            end = position + size
+            append_event(status_byte + data[position:end])
+        elif byte < 0xF0:
+            status_byte = _STATUS_BYTES[byte]
+            size = sizes[byte]
+            end = position + 1 + size
+            append_event(data[position:end])
+        else:
+            # Meta events have a type byte before their length, system exclusive messages do not
+            event_length, data_position = _read_variable_length(data, position + (2 if byte == 0xFF else 1))
+            end = data_position + event_length
+            append_event(data[position:end])
+        position = end
+    return {"ticks": np.cumsum(np.array(deltas, dtype=np.int64)), "events": events}
+
+
+def read_midi(path: str) -> dict:
+    """
+    Read a standard MIDI file
+    :param path: path to the MIDI file
+    :return: dict with the "format", the "ticks_per_beat" and the "tracks" (see _read_track)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"MThd":
+        raise ValueError(f"{path} is not a standard MIDI file")
+    header_length = struct.unpack(">I", data[4:8])[0]
+    midi_format, number_of_tracks, division = struct.unpack(">HHH", data[8:14])
+    if division & 0x8000:
+        raise ValueError(f"{path} uses SMPTE time division, which is not supported")
+    tracks = []
+    position = 8 + header_length
+    while position < len(data) and len(tracks) < number_of_tracks:
+        chunk_type = data[position:position + 4]
+        chunk_length = struct.unpack(">I", data[position + 4:position + 8])[0]
+        if chunk_type == b"MTrk":
+            tracks.append(_read_track(data[position + 8:position + 8 + chunk_length]))
+        position += 8 + chunk_length
+    return {"format": midi_format, "ticks_per_beat": division, "tracks": tracks}
+
+
+def _encode_track(deltas: np.ndarray, events: list) -> bytes:
+    """
+    Encode the events of a track, each one preceded by its delta time as a variable-length quantity
+    :param deltas: array of the delta times of the events in ticks
+    :param events: raw events of the track
+    :return: bytes of the track chunk (without its header)
+    """
+    if len(deltas) and (deltas.min() < 0 or deltas.max() > MAX_DELTA):
+        raise ValueError(f"Delta times must be between 0 and {MAX_DELTA} ticks")
+    event_lengths = np.fromiter(map(len, events), dtype=np.int64, count=len(events))
+    event_bytes = np.frombuffer(b"".join(events), dtype=np.uint8)
+    delta_lengths = 1 + (deltas >= 1 << 7) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    starts = np.cumsum(delta_lengths + event_lengths) - delta_lengths - event_lengths
+    body = np.empty(int((delta_lengths + event_lengths).sum()), dtype=np.uint8)
+    # The groups of 7 bits of the delta times, the most significant first, with the continuation bit on all but the last
+    for byte in range(4):
+        has_byte = delta_lengths > byte
+        shift = 7 * (delta_lengths[has_byte] - 1 - byte)
+        continuation = np.where(delta_lengths[has_byte] - 1 > byte, 0x80, 0)
+        body[starts[has_byte] + byte] = ((deltas[has_byte] >> shift) & 0x7F) | continuation
+    event_starts = starts + delta_lengths
+    body[np.repeat(event_starts - (np.cumsum(event_lengths) - event_lengths), event_lengths)
+         + np.arange(len(event_bytes))] = event_bytes
+    return body.tobytes()
+
+
+def write_midi(midi: dict, path: str) -> None:
+    """
+    Write a standard MIDI file
+    :param midi: dict with the "format", the "ticks_per_beat" and the "tracks" (ticks must be sorted)
+    :param path: path of the MIDI file
+    :return: None
+    """
+    chunks = [b"MThd", struct.pack(">IHHH", 6, midi["format"], len(midi["tracks"]), midi["ticks_per_beat"])]
+    for track in midi["tracks"]:
+        body = _encode_track(np.diff(np.asarray(track["ticks"], dtype=np.int64), prepend=0), track["events"])
+        if not track["events"] or track["events"][-1][:2] != bytes((0xFF, END_OF_TRACK)):
+            body += b"\x00\xff\x2f\x00"
+        chunks.append(b"MTrk" + struct.pack(">I", len(body)) + body)
+    with open(path, "wb") as f:
+        f.write(b"".join(chunks))
+
+
+def get_tempo_changes(midi: dict) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the tempo changes of a MIDI file (from all its tracks)
+    :param midi: dict returned by read_midi
+    :return: array of the ticks and array of the tempos (microseconds per beat) of the changes,
+    starting with the tempo at tick 0
+    """
+    changes = [(0, DEFAULT_TEMPO)]
+    for track in midi["tracks"]:
+        status, first, _ = decode_channel_messages(track["events"])
+        for i in np.flatnonzero((status == 0xFF) & (first == SET_TEMPO)).tolist():
+            changes.append((int(track["ticks"][i]), int.from_bytes(track["events"][i][-3:], "big")))
+    # Keep the last change given for each tick
+    changes.sort(key=lambda change: change[0])
+    ticks = np.array([tick for tick, _ in changes], dtype=np.int64)
+    tempos = np.array([tempo for _, tempo in changes], dtype=np.float64)
+    last_of_tick = np.append(ticks[1:] != ticks[:-1], True)
+    return ticks[last_of_tick], tempos[last_of_tick]
+
+
+def get_tempo_map(midi: dict) -> tuple:
+    """
+    Get the tempo map of a file, built once to convert all the ticks of the file to seconds
+    :param midi: dict returned by read_midi
+    :return: array of the ticks of the tempo changes, array of their times in seconds and array of the seconds per
+    tick from each change
+    """
+    change_ticks, tempos = get_tempo_changes(midi)
+    seconds_per_tick = tempos / 1e6 / midi["ticks_per_beat"]
+    change_seconds = np.concatenate(([0.0], np.cumsum(np.diff(change_ticks) * seconds_per_tick[:-1])))
+    return change_ticks, change_seconds, seconds_per_tick
+
+
+def ticks_to_seconds(ticks: np.ndarray, tempo_map: tuple) -> np.ndarray:
+    """
+    Convert absolute ticks to seconds following the tempo changes of the file
+    :param ticks: array of absolute ticks
+    :param tempo_map: tempo map of the file (see get_tempo_map)
+    :return: array of times in seconds
+    """
+    change_ticks, change_seconds, seconds_per_tick = tempo_map
+    segments = np.searchsorted(change_ticks, ticks, side="right") - 1
+    return change_seconds[segments] + (np.asarray(ticks) - change_ticks[segments]) * seconds_per_tick[segments]
+
+
+def decode_channel_messages(events: list) -> tuple:
+    """
+    Get the status and data bytes of raw events as arrays
+    :param events: raw events of a track (see _read_track)
+    :return: array of the status bytes, array of the first data bytes and array of the second data bytes
+    (0 for the events with less than two data bytes)
+    """
+    lengths = np.fromiter(map(len, events), dtype=np.int64, count=len(events))
+    buffer = np.frombuffer(b"".join(events) + b"\x00\x00", dtype=np.uint8)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(events) else np.zeros(0, dtype=np.int64)
+    status = buffer[starts]
+    first = np.where(lengths > 1, buffer[starts + 1], 0)
+    second = np.where(lengths > 2, buffer[starts + 2], 0)
+    return status, first, second
+
+
+def is_note_on(events: list) -> np.ndarray:
+    """
+    Get the note-on messages with a non zero velocity
+    :param events: raw events of a track
+    :return: boolean array
+    """
+    status, _, velocity = decode_channel_messages(events)
+    return ((status & 0xF0) == 0x90) & (velocity > 0)
@@ -0,0 +1,194 @@
+"""
+This module contains a fast reader of the notes of MIDI files and their link to the annotated beats.
+
+The channel messages of the tracks read by midi_io are decoded with array operations into the onset (seconds,
+following the tempo changes), pitch, velocity and duration of every note, without building a music21 object tree.
+A note-on is matched with the first note-off of the same channel and pitch after it, a note-on with a zero velocity
+is a note-off. The note-offs without a note-on before them are ignored.
+
+The notes are then linked to the nearest annotated beat, so that the velocity and the micro-timing (onset of the
+note minus onset of its beat) can be aggregated per meter and position in the bar across the corpus.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import numpy as np
+
+from task_a.annotation_cache import load_annotations
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.instrumentation import count, instrumented
+from task_a.meter_aggregation import get_all_beat_positions
+from task_a.midi_io import decode_channel_messages, get_tempo_map, read_midi, ticks_to_seconds
+
+NOTE_ON = 0x90
+NOTE_OFF = 0x80
+
+
+def get_notes(midi: dict) -> dict:
+    """
+    Get the notes of a MIDI file
+    A note without a note-off lasts until the last event of the file
+    :param midi: dict returned by midi_io.read_midi
+    :return: dict of arrays sorted by onset: "onset" and "duration" in seconds, "pitch", "velocity" and "channel"
+    """
+    ticks, statuses, firsts, seconds = [], [], [], []
+    for track in midi["tracks"]:
+        status, first, second = decode_channel_messages(track["events"])
+        is_note = ((status & 0xF0) == NOTE_ON) | ((status & 0xF0) == NOTE_OFF)
+        ticks.append(track["ticks"][is_note])
+        statuses.append(status[is_note])
+        firsts.append(first[is_note])
+        seconds.append(second[is_note])
+    last_tick = max((int(track["ticks"][-1]) for track in midi["tracks"] if len(track["ticks"])), default=0)
+    ticks = np.concatenate(ticks) if ticks else np.zeros(0, dtype=np.int64)
+    status = np.concatenate(statuses) if statuses else np.zeros(0, dtype=np.uint8)
+    pitch = (np.concatenate(firsts) if firsts else np.zeros(0, dtype=np.uint8)).astype(np.int64)
+    velocity = (np.concatenate(seconds) if seconds else np.zeros(0, dtype=np.uint8)).astype(np.int64)
+
+    # Events of all the tracks in time order, a note-off before a note-on at the same tick
+    is_on = ((status & 0xF0) == NOTE_ON) & (velocity > 0)
+    order = np.lexsort((is_on, ticks))
+    ticks, status, pitch, velocity, is_on = ticks[order], status[order], pitch[order], velocity[order], is_on[order]
+    channel = (status & 0x0F).astype(np.int64)
+    groups = channel * 128 + pitch
+    # Each note-on ends at the first note-off of its channel and pitch after it in the event order, so that a stray
+    # note-off (without a note-on before it) is never used
+    events = np.arange(len(ticks))
+    off_keys = groups[~is_on] * len(ticks) + events[~is_on]
+    off_order = np.argsort(off_keys)
+    off_keys = off_keys[off_order]
+    off_ticks = ticks[~is_on][off_order]
+    on_keys = groups[is_on] * len(ticks) + events[is_on]
+    matched = np.searchsorted(off_keys, on_keys)
+    has_off = matched < len(off_keys)
+    has_off[has_off] = off_keys[matched[has_off]] // len(ticks) == groups[is_on][has_off]
+    end_ticks = np.full(len(on_keys), last_tick, dtype=np.int64)
+    end_ticks[has_off] = off_ticks[matched[has_off]]
+
+    tempo_map = get_tempo_map(midi)
+    onsets = ticks_to_seconds(ticks[is_on], tempo_map)
+    ends = ticks_to_seconds(end_ticks, tempo_map)
+    count("notes", len(onsets))
+    return {
+        "onset": onsets,
+        "duration": ends - onsets,
+        "pitch": pitch[is_on],
+        "velocity": velocity[is_on],
+        "channel": channel[is_on],
+    }
+
+
+def read_notes(path: str) -> dict:
+    """
+    Read the notes of a MIDI file
+    :param path: path to the MIDI file
+    :return: dict of arrays (see get_notes)
+    """
+    return get_notes(read_midi(path))
+
+
+def link_notes_to_beats(onsets: np.ndarray, beat_onsets: np.ndarray) -> tuple:
+    """
+    Link notes to the nearest beat
+    :param onsets: array of the onsets of the notes
+    :param beat_onsets: sorted array of the onsets of the beats (in the same time as the notes)
+    :return: array of the index of the nearest beat of each note and array of the offset of each note from its beat
+    (seconds, positive when the note is after the beat)
+    """
+    onsets = np.asarray(onsets, dtype=np.float64)
+    beat_onsets = np.asarray(beat_onsets, dtype=np.float64)
+    if len(beat_onsets) == 0:
+        return np.full(len(onsets), -1, dtype=np.int64), np.full(len(onsets), np.nan)
+    after = np.minimum(np.searchsorted(beat_onsets, onsets), len(beat_onsets) - 1)
+    before = np.maximum(after - 1, 0)
+    nearest = np.where(np.abs(onsets - beat_onsets[before]) <= np.abs(onsets - beat_onsets[after]), before, after)
+    return nearest, onsets - beat_onsets[nearest]
+
+
+def get_performance_notes(performance: dict, score: bool = False) -> dict:
+    """
+    Read the notes of a performance (or of the score of its piece) and link them to the annotated beats
+    The meter and position in the bar of the beats come from the score annotation file
+    (see meter_aggregation.get_all_beat_positions)
+    :param performance: performance of the manifest (see corpus_manifest.get_performances_from_directories)
+    :param score: whether to read the unperformed MIDI file of the piece (midi_score.mid, linked to the beats of
+    midi_score_annotations.txt) instead of the performed one
+    :return: dict of arrays with the notes (see get_notes), the index of their "beat", their "offset" from the beat,
+    the "meter" code of the beat (in "meters", -1 outside of a bar of its meter) and its "position" in the bar
+    """
+    midi_path = performance["score_midi_path"] if score else performance["midi_path"]
+    annotation_path = performance["score_annotation_path"] if score else performance["annotation_path"]
+    notes = read_notes(midi_path)
+    beat_onsets = load_annotations(annotation_path)["beats"]["onset"]
+    score_annotations = load_annotations(performance["score_annotation_path"])
+    meters, positions, kept = get_all_beat_positions(score_annotations)
+    beats, offsets = link_notes_to_beats(notes["onset"], beat_onsets)
+    # The beats of the performance after the end of the score are outside of any bar
+    in_bar = (beats >= 0) & (beats < len(meters))
+    in_bar[in_bar] = kept[beats[in_bar]]
+    note_meters = np.full(len(beats), -1, dtype=np.int64)
+    note_meters[in_bar] = meters[beats[in_bar]]
+    note_positions = np.full(len(beats), -1, dtype=np.int64)
+    note_positions[in_bar] = positions[beats[in_bar]]
+    return {
+        **notes,
+        "beat": beats,
+        "offset": offsets,
+        "meter": note_meters,
+        "position": note_positions,
+        "meters": score_annotations["meters"],
+    }
+
+
+@instrumented("midi_notes.aggregate")
+def aggregate_notes_per_position(root: str, score: bool = False) -> dict:
+    """
+    Aggregate the velocity and the micro-timing of the notes of all the performances of a corpus per meter and
+    position in the bar of their nearest beat
+    :param root: path to the root folder of the corpus
+    :param score: whether to read the unperformed MIDI files of the pieces instead of the performed ones
+    (each piece is read once)
+    :return: dict with meter as key and a dict of arrays (one value per position in the bar) as value: the
+    "number_of_notes", the "mean_velocity" and the "mean_offset" (seconds) of the notes
+    """
+    totals = {}
+    read = set()
+    for performance in get_performances(get_manifest(root)):
+        midi_path = performance["score_midi_path"] if score else performance["midi_path"]
+        if midi_path is None or performance["score_annotation_path"] is None or midi_path in read:
+            continue
+        read.add(midi_path)
+        notes = get_performance_notes(performance, score)
+        in_bar = notes["meter"] >= 0
+        if not in_bar.any():
+            continue
+        number_of_positions = int(notes["position"][in_bar].max()) + 1
+        groups = notes["meter"][in_bar] * number_of_positions + notes["position"][in_bar]
+        size = len(notes["meters"]) * number_of_positions
+        counts = np.bincount(groups, minlength=size).reshape(-1, number_of_positions)
+        velocities = np.bincount(groups, weights=notes["velocity"][in_bar], minlength=size).reshape(counts.shape)
+        offsets = np.bincount(groups, weights=notes["offset"][in_bar], minlength=size).reshape(counts.shape)
+        for code, meter in enumerate(notes["meters"]):
+            if not counts[code].any():
+                continue
+            length = int(np.flatnonzero(counts[code]).max()) + 1
+            total = totals.setdefault(meter, {"number_of_notes": np.zeros(0, dtype=np.int64),
+                                              "sum_velocities": np.zeros(0), "sum_offsets": np.zeros(0)})
+            for name, values in (("number_of_notes", counts[code, :length]),
+                                 ("sum_velocities", velocities[code, :length]),
+                                 ("sum_offsets", offsets[code, :length])):
+                if len(total[name]) < length:
+                    total[name] = np.pad(total[name], (0, length - len(total[name])))
+                total[name][:length] += values
+
+    result = {}
+    for meter, total in totals.items():
+        number_of_notes = total["number_of_notes"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result[meter] = {
+                "number_of_notes": number_of_notes,
+                "mean_velocity": total["sum_velocities"] / number_of_notes,
+                "mean_offset": total["sum_offsets"] / number_of_notes,
+            }
+    return result
@@ -0,0 +1,136 @@
+"""
+This module contains the masked piece x performance x beat matrix of the performed onsets.
+
+The performed onsets of every performance are aligned to the beats of the score annotation file of their piece
+(midi_score_annotations.txt) and stored in one padded 3D array: the missing beats (shorter performances, pieces
+with fewer beats or fewer performances than the largest ones) are nan and masked out. The statistics across the
+performers of every beat are computed with array operations on the whole matrix, for one piece or the whole corpus.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import os
+import warnings
+
+import numpy as np
+
+from task_a.annotation_cache import load_annotations
+from task_a.corpus_manifest import get_performances
+from task_a.instrumentation import count, instrumented
+
+BEAT_STATISTICS = ("count", "mean", "median", "trimmed_mean", "std", "iqr")
+DEFAULT_PROPORTION_TO_CUT = 0.1
+
+
+@instrumented("onset_matrix")
+def build_onset_matrix(manifest: dict, pieces: list = None, dtype=np.float64) -> dict:
+    """
+    Build the masked matrix of the performed onsets of the pieces of a corpus
+    The performances after the last beat of the score are cut, the pieces without a score annotation file are left out
+    :param manifest: manifest of the corpus (see corpus_manifest.get_manifest)
+    :param pieces: paths of the piece folders relative to the root of the corpus, all the pieces by default
+    :param dtype: float type of the onsets (np.float32 halves the memory)
+    :return: dict with the "pieces", the "performances" (list of performance ids per piece), the "symbolic_onsets"
+    (piece x beat), the performed "onsets" (piece x performance x beat, nan where missing), the "mask" of the
+    given onsets and the "number_of_beats" of each piece
+    """
+    if pieces is not None:
+        pieces = [os.path.normpath(piece) for piece in pieces]
+    piece_performances = {}
+    for performance in get_performances(manifest):
+        if performance["score_annotation_path"] is not None and (pieces is None or performance["piece"] in pieces):
+            piece_performances.setdefault(performance["piece"], []).append(performance)
+    names = sorted(piece_performances) if pieces is None else [piece for piece in pieces if piece in piece_performances]
+
+    symbolic = [load_annotations(piece_performances[piece][0]["score_annotation_path"])["beats"]["onset"]
+                for piece in names]
+    number_of_beats = np.array([len(onsets) for onsets in symbolic], dtype=np.int64)
+    max_beats = int(number_of_beats.max()) if len(names) else 0
+    max_performances = max((len(piece_performances[piece]) for piece in names), default=0)
+
+    symbolic_onsets = np.full((len(names), max_beats), np.nan, dtype=dtype)
+    onsets = np.full((len(names), max_performances, max_beats), np.nan, dtype=dtype)
+    for i, piece in enumerate(names):
+        symbolic_onsets[i, :number_of_beats[i]] = symbolic[i]
+        for j, performance in enumerate(piece_performances[piece]):
+            performed = load_annotations(performance["annotation_path"])["beats"]["onset"][:number_of_beats[i]]
+            onsets[i, j, :len(performed)] = performed
+    mask = ~np.isnan(onsets)
+    count("beats", int(mask.sum()))
+    return {
+        "pieces": names,
+        "performances": [[performance["performance"] for performance in piece_performances[piece]]
+                         for piece in names],
+        "symbolic_onsets": symbolic_onsets,
+        "onsets": onsets,
+        "mask": mask,
+        "number_of_beats": number_of_beats,
+    }
+
+
+def trimmed_mean(values: np.ndarray, mask: np.ndarray, proportion_to_cut: float = DEFAULT_PROPORTION_TO_CUT,
+                 axis: int = 1) -> np.ndarray:
+    """
+    Compute the mean of the given values along an axis, after cutting a proportion of the smallest and the largest
+    ones (as scipy.stats.trim_mean, with the number of values cut depending on the number of given values)
+    :param values: array of values
+    :param mask: boolean array of the given values
+    :param proportion_to_cut: proportion of the values cut at each end
+    :param axis: axis of the reduction
+    :return: array of the trimmed means (nan where no value is given)
+    """
+    # The missing values are sorted last, so the kept values of every slice are a contiguous range
+    sorted_values = np.sort(np.where(mask, values, np.inf), axis=axis)
+    number_of_values = mask.sum(axis=axis, keepdims=True)
+    number_cut = np.floor(proportion_to_cut * number_of_values).astype(np.int64)
+    ranks = np.arange(values.shape[axis]).reshape([-1 if dim == axis % values.ndim else 1
+                                                   for dim in range(values.ndim)])
+    kept = (ranks >= number_cut) & (ranks < number_of_values - number_cut)
+    number_kept = kept.sum(axis=axis)
+    total = np.where(kept, sorted_values, 0).sum(axis=axis)
+    return np.divide(total, number_kept, out=np.full(total.shape, np.nan), where=number_kept > 0)
+
+
+def get_beat_statistics(matrix: dict, statistics: tuple = BEAT_STATISTICS,
+                        proportion_to_cut: float = DEFAULT_PROPORTION_TO_CUT) -> dict:
+    """
+    Compute the statistics of the performed onsets of every beat across the performances of its piece
+    :param matrix: masked onset matrix (see build_onset_matrix)
+    :param statistics: names of the statistics to compute, among BEAT_STATISTICS ("std" is the unbiased standard
+    deviation and "iqr" the interquartile range)
+    :param proportion_to_cut: proportion of the onsets cut at each end for the trimmed mean
+    :return: dict with the name of the statistic as key and a piece x beat array as value
+    (nan where the beat has no onset, or a single one for "std")
+    """
+    unknown = set(statistics) - set(BEAT_STATISTICS)
+    if unknown:
+        raise ValueError(f"Unknown statistics {sorted(unknown)}, expected some of {BEAT_STATISTICS}")
+    onsets = matrix["onsets"]
+    mask = matrix["mask"]
+    number_of_onsets = mask.sum(axis=1)
+    total = np.where(mask, onsets, 0).sum(axis=1, dtype=np.float64)
+    mean = np.divide(total, number_of_onsets, out=np.full(total.shape, np.nan), where=number_of_onsets > 0)
+
+    result = {}
+    for name in statistics:
+        if name == "count":
+            result[name] = number_of_onsets
+        elif name == "mean":
+            result[name] = mean
+        elif name == "trimmed_mean":
+            result[name] = trimmed_mean(onsets, mask, proportion_to_cut)
+        elif name == "std":
+            m2 = np.where(mask, onsets - mean[:, None, :], 0) ** 2
+            result[name] = np.sqrt(np.divide(m2.sum(axis=1), number_of_onsets - 1,
+                                             out=np.full(total.shape, np.nan), where=number_of_onsets > 1))
+        else:
+            # The slices without onsets give nan with a warning
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                if name == "median":
+                    result[name] = np.nanmedian(onsets, axis=1)
+                else:
+                    lower, upper = np.nanquantile(onsets, [0.25, 0.75], axis=1)
+                    result[name] = upper - lower
+    return result
@@ -0,0 +1,190 @@
+"""
+This module contains the batch rendering of performed MIDI files from unperformed ones,
+by applying the timing function to every event of the unperformed MIDI.
+
+The symbolic onsets of the beats (midi_score_annotations.txt) and their performed onsets (from the tempo
+ratios of timing() or from a performance) define a piecewise-linear map from symbolic to performed time,
+applied to all the events at once with np.interp.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from task_a.annotation_cache import load_annotations
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.meter_aggregation import get_all_beat_positions
+from task_a.midi_io import (DEFAULT_TEMPO, SET_TEMPO, decode_channel_messages, get_tempo_map, read_midi,
+                            ticks_to_seconds, write_midi)
+from task_a.timing_function import timing
+
+OUTPUT_TICKS_PER_BEAT = 480
+
+
+def warp_times(times: np.ndarray, symbolic_onsets: np.ndarray, performed_onsets: np.ndarray) -> np.ndarray:
+    """
+    Map symbolic times to performed times with the piecewise-linear map through the beats
+    Times outside of the annotated beats are extrapolated with the tempo of the first or last interval
+    :param times: array of symbolic times (seconds)
+    :param symbolic_onsets: array of the symbolic onsets of the beats (increasing)
+    :param performed_onsets: array of the performed onsets of the beats (increasing)
+    :return: array of performed times (seconds)
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if len(symbolic_onsets) < 2:
+        return times - symbolic_onsets[0] + performed_onsets[0] if len(symbolic_onsets) else times
+    result = np.interp(times, symbolic_onsets, performed_onsets)
+    first_slope = (performed_onsets[1] - performed_onsets[0]) / (symbolic_onsets[1] - symbolic_onsets[0])
+    last_slope = (performed_onsets[-1] - performed_onsets[-2]) / (symbolic_onsets[-1] - symbolic_onsets[-2])
+    before = times < symbolic_onsets[0]
+    after = times > symbolic_onsets[-1]
+    result[before] = performed_onsets[0] + (times[before] - symbolic_onsets[0]) * first_slope
+    result[after] = performed_onsets[-1] + (times[after] - symbolic_onsets[-1]) * last_slope
+    return result
+
+
+def get_beat_ratios(annotations: dict, ratios: dict) -> np.ndarray:
+    """
+    Get the ratio of each beat of a piece from ratios per meter and beat position
+    :param annotations: parsed symbolic annotation file (see annotation_cache.load_annotations)
+    :param ratios: dict with meter as key and the ratio for each beat position as list (like the output of timing())
+    :return: array of the ratio of each beat (1 for the beats without ratio)
+    """
+    meters, positions, kept = get_all_beat_positions(annotations)
+    result = np.ones(len(meters))
+    for meter_code, meter in enumerate(annotations["meters"]):
+        if meter not in ratios:
+            continue
+        meter_ratios = np.asarray(ratios[meter], dtype=np.float64)
+        in_meter = kept & (meters == meter_code) & (positions < len(meter_ratios))
+        result[in_meter] = meter_ratios[positions[in_meter]]
+    return result
+
+
+def get_performed_onsets_from_timing(annotations: dict, tempo_ratios: dict) -> np.ndarray:
+    """
+    Get the performed onsets of the beats of a piece by dividing each symbolic beat duration by its tempo ratio
+    :param annotations: parsed symbolic annotation file
+    :param tempo_ratios: dict with meter as key and the tempo ratio for each beat as list (output of timing())
+    :return: array of the performed onsets of the beats
+    """
+    symbolic_onsets = np.asarray(annotations["beats"]["onset"], dtype=np.float64)
+    durations = np.diff(symbolic_onsets) / get_beat_ratios(annotations, tempo_ratios)[:-1]
+    return symbolic_onsets[0] + np.concatenate(([0.0], np.cumsum(durations)))
+
+
+def render_performed_midi(midi_path: str, output_path: str, symbolic_onsets: np.ndarray,
+                          performed_onsets: np.ndarray, beat_velocity_ratios: np.ndarray = None) -> int:
+    """
+    Write the performed version of an unperformed MIDI file
+    Every event is moved with the symbolic to performed map and the file is written with a single tempo
+    :param midi_path: path to the unperformed MIDI file
+    :param output_path: path of the performed MIDI file
+    :param symbolic_onsets: array of the symbolic onsets of the beats
+    :param performed_onsets: array of the performed onsets of the beats
+    :param beat_velocity_ratios: optional array of the velocity ratio of each beat, applied to the notes starting
+    in the beat
+    :return: number of notes rendered
+    """
+    midi = read_midi(midi_path)
+    symbolic_onsets = np.asarray(symbolic_onsets, dtype=np.float64)
+    performed_onsets = np.asarray(performed_onsets, dtype=np.float64)
+    ticks_per_second = OUTPUT_TICKS_PER_BEAT * 1e6 / DEFAULT_TEMPO
+    tempo_map = get_tempo_map(midi)
+    number_of_notes = 0
+    tracks = []
+    for track in midi["tracks"]:
+        events = track["events"]
+        symbolic_times = ticks_to_seconds(track["ticks"], tempo_map)
+        ticks = np.round(warp_times(symbolic_times, symbolic_onsets, performed_onsets) * ticks_per_second)
+        ticks = np.maximum(ticks, 0).astype(np.int64)
+        # The tempo of the performed file is constant, the timing is in the ticks
+        status, first, second = decode_channel_messages(events)
+        kept = np.flatnonzero(~((status == 0xFF) & (first == SET_TEMPO)))
+        events = [events[i] for i in kept.tolist()]
+        ticks = ticks[kept]
+        symbolic_times = symbolic_times[kept]
+        status, second = status[kept], second[kept]
+        note_on = ((status & 0xF0) == 0x90) & (second > 0)
+        number_of_notes += int(note_on.sum())
+        if beat_velocity_ratios is not None and note_on.any():
+            beats = np.clip(np.searchsorted(symbolic_onsets, symbolic_times[note_on], side="right") - 1,
+                            0, len(beat_velocity_ratios) - 1)
+            velocities = second[note_on]
+            velocities = np.clip(np.round(velocities * np.asarray(beat_velocity_ratios)[beats]), 1, 127).astype(int)
+            for i, velocity in zip(np.flatnonzero(note_on).tolist(), velocities.tolist()):
+                events[i] = events[i][:2] + bytes((velocity,))
+        order = np.argsort(ticks, kind="stable")
+        tracks.append({"ticks": ticks[order], "events": [events[i] for i in order.tolist()]})
+    tempo_event = bytes((0xFF, SET_TEMPO, 3)) + DEFAULT_TEMPO.to_bytes(3, "big")
+    if tracks:
+        tracks[0] = {"ticks": np.concatenate(([0], tracks[0]["ticks"])), "events": [tempo_event] + tracks[0]["events"]}
+    write_midi({"format": midi["format"], "ticks_per_beat": OUTPUT_TICKS_PER_BEAT, "tracks": tracks}, output_path)
+    return number_of_notes
+
+
+def render_piece_with_timing(score_midi_path: str, score_annotation_path: str, output_path: str,
+                             tempo_ratios: dict, velocity_ratios: dict = None) -> int:
+    """
+    Render the performed MIDI of a piece from the tempo ratios per meter and beat position of timing()
+    :param score_midi_path: path to the unperformed MIDI file
+    :param score_annotation_path: path to the annotation file of the unperformed MIDI
+    :param output_path: path of the performed MIDI file
+    :param tempo_ratios: dict with meter as key and the tempo ratio for each beat as list
+    :param velocity_ratios: optional dict with meter as key and the velocity ratio for each beat as list
+    :return: number of notes rendered
+    """
+    annotations = load_annotations(score_annotation_path)
+    symbolic_onsets = np.asarray(annotations["beats"]["onset"], dtype=np.float64)
+    performed_onsets = get_performed_onsets_from_timing(annotations, tempo_ratios)
+    beat_velocity_ratios = get_beat_ratios(annotations, velocity_ratios) if velocity_ratios else None
+    return render_performed_midi(score_midi_path, output_path, symbolic_onsets, performed_onsets,
+                                 beat_velocity_ratios)
+
+
+def _render_piece_task(task: tuple) -> tuple:
+    """
+    Render a piece in a worker process
+    :param task: tuple of the arguments of render_piece_with_timing
+    :return: tuple (output path, number of notes or None, error or None)
+    """
+    try:
+        return task[2], render_piece_with_timing(*task), None
+    except Exception as error:
+        return task[2], None, f"{type(error).__name__}: {error}"
+
+
+def render_folder(folder_path: str, output_folder: str, tempo_ratios: dict = None, velocity_ratios: dict = None,
+                  workers: int = 1):
+    """
+    Render the performed MIDI of every piece of a folder (for example a composer) with the timing function
+    The files are written as soon as they are rendered, in the order of the pieces
+    :param folder_path: path to the folder of the pieces (can be in sub folders)
+    :param output_folder: folder of the performed MIDI files (same sub folders as folder_path)
+    :param tempo_ratios: tempo ratios per meter and beat position, by default timing(folder_path)
+    :param velocity_ratios: optional velocity ratios per meter and beat position
+    :param workers: number of worker processes
+    :return: generator of tuples (output path, number of notes or None, error or None)
+    """
+    if tempo_ratios is None:
+        tempo_ratios = timing(folder_path)
+    tasks = []
+    pieces = set()
+    for performance in get_performances(get_manifest(folder_path)):
+        if performance["piece"] in pieces or performance["score_midi_path"] is None \
+                or performance["score_annotation_path"] is None:
+            continue
+        pieces.add(performance["piece"])
+        output_path = os.path.join(output_folder, performance["piece"], "performed.mid")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tasks.append((performance["score_midi_path"], performance["score_annotation_path"], output_path,
+                      tempo_ratios, velocity_ratios))
+    if workers <= 1:
+        yield from map(_render_piece_task, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_render_piece_task, tasks)
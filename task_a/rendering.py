@@ -0,0 +1,160 @@
+"""
+This module contains the rendering layer shared by the plots of Task A and Task B.
+
+Long curves are downsampled with shape-preserving methods before being drawn, the figures can be written to files
+instead of being shown (headless mode), and batches of figures can be rendered in parallel worker processes.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+DEFAULT_MAX_POINTS = 2000
+DECIMATION_METHODS = ("min_max", "lttb")
+
+
+def decimate_min_max(x, y, max_points: int = DEFAULT_MAX_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Downsample a curve by keeping the minimum and the maximum of each of max_points / 2 buckets of points
+    The peaks of the curve are kept, so the envelope of the drawn line does not change
+    :param x: array of the x values (sorted)
+    :param y: array of the y values
+    :param max_points: maximum number of points kept
+    :return: the kept x values and y values
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= max_points:
+        return x, y
+    number_of_buckets = max(1, max_points // 2 - 1)
+    buckets = np.arange(len(y)) * number_of_buckets // len(y)
+    # Sort by bucket then by value: the first and last point of each bucket are its minimum and maximum
+    order = np.lexsort((y, buckets))
+    starts = np.searchsorted(buckets[order], np.arange(number_of_buckets))
+    ends = np.append(starts[1:], len(y)) - 1
+    kept = np.unique(np.concatenate(([0, len(y) - 1], order[starts], order[ends])))
+    return x[kept], y[kept]
+
+
+def decimate_lttb(x, y, max_points: int = DEFAULT_MAX_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Downsample a curve with the Largest-Triangle-Three-Buckets algorithm
+    The first and last points are kept and, in each bucket, the point forming the largest triangle with the point
+    kept in the previous bucket and the average of the next bucket
+    :param x: array of the x values (sorted)
+    :param y: array of the y values
+    :param max_points: maximum number of points kept (at least 3)
+    :return: the kept x values and y values
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= max_points or max_points < 3:
+        return x, y
+    edges = np.linspace(1, len(y) - 1, max_points - 1).astype(np.int64)
+    kept = np.zeros(max_points, dtype=np.int64)
+    kept[-1] = len(y) - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else len(y)
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return x[kept], y[kept]
+
+
+def decimate(x, y, max_points: int = DEFAULT_MAX_POINTS, method: str = "min_max") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Downsample a curve for drawing
+    :param x: array of the x values (sorted)
+    :param y: array of the y values
+    :param max_points: maximum number of points kept, None to keep all the points
+    :param method: "min_max" (keeps the envelope) or "lttb" (keeps the visual shape)
+    :return: the kept x values and y values
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Unknown decimation method '{method}', expected one of {DECIMATION_METHODS}")
+    if max_points is None:
+        return np.asarray(x), np.asarray(y)
+    if method == "lttb":
+        return decimate_lttb(x, y, max_points)
+    return decimate_min_max(x, y, max_points)
+
+
+def show_or_save(output_path: str = None, figures: list = None) -> None:
+    """
+    Show the current figures, or write them to files and close them in headless mode
+    :param output_path: path of the image file (its extension gives the format), None to show the figures
+    :param figures: figures to write, by default the current figure; the figures after the first one
+    are written to "<output_path without extension>_<index><extension>"
+    :return: None
+    """
+    if output_path is None:
+        plt.show()
+        return
+    if figures is None:
+        figures = [plt.gcf()]
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    root, extension = os.path.splitext(output_path)
+    for i, figure in enumerate(figures):
+        figure.savefig(output_path if i == 0 else f"{root}_{i}{extension}", bbox_inches="tight")
+        plt.close(figure)
+
+
+def _use_headless_backend() -> None:
+    """
+    Use the non-interactive backend of matplotlib in a worker process
+    :return: None
+    """
+    plt.switch_backend("Agg")
+
+
+def _render_job(job: tuple) -> tuple:
+    """
+    Render a figure to a file
+    :param job: tuple (plot function, args, kwargs), the kwargs containing the "output_path"
+    :return: tuple (output path, error or None)
+    """
+    function, args, kwargs = job
+    try:
+        function(*args, **kwargs)
+        return kwargs["output_path"], None
+    except Exception as error:
+        return kwargs["output_path"], f"{type(error).__name__}: {error}"
+
+
+def _render_job_in_worker(job: tuple) -> tuple:
+    """
+    Render a figure to a file in a worker process, closing all the figures left open by a failed job
+    :param job: tuple (plot function, args, kwargs), see _render_job
+    :return: tuple (output path, error or None)
+    """
+    try:
+        return _render_job(job)
+    finally:
+        plt.close("all")
+
+
+def render_figures(jobs: list, workers: int = 1):
+    """
+    Render a batch of figures to files, optionally in parallel worker processes
+    :param jobs: list of tuples (plot function, args, kwargs), the plot function accepting an output_path
+    keyword argument (given in kwargs); the functions and their arguments must be picklable
+    :param workers: number of worker processes, 1 renders in the current process
+    :return: generator of tuples (output path, error or None), in the order of the jobs
+    """
+    if workers <= 1:
+        yield from map(_render_job, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_use_headless_backend) as executor:
+        yield from executor.map(_render_job_in_worker, jobs)
@@ -6,32 +6,52 @@ This module contains functions used to plot the results for Task A.
 """
 
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sns
 
+from task_a.instrumentation import instrumented
+from task_a.rendering import DEFAULT_MAX_POINTS, decimate, show_or_save
 
-def plot_timing_for_one_piece(tempo_map: dict):
+
+@instrumented("plotting")
+def plot_timing_for_one_piece(tempo_map: dict, output_path: str = None, max_points: int = DEFAULT_MAX_POINTS):
     """
     Plot the tempo curve from the dict of tempo ratios (for one piece) with each beat as x-axis
-    :param tempo_map: dict
+    :param tempo_map: dict of tempo ratios per beat, or the output of compute_tempo_map
+    (one curve per performance if the tempo ratios are a 2D array)
+    :param output_path: path of the image file to write, None to show the figure
+    :param max_points: maximum number of points drawn per curve (min/max decimation), None to draw all of them
     :return: None
     """
     fig, ax = plt.subplots()
-    ax.plot(list(tempo_map.keys()), list(tempo_map.values()))
+    if "tempo_ratio" in tempo_map:
+        tempo_ratios = np.atleast_2d(tempo_map["tempo_ratio"])
+        for tempo_ratio in tempo_ratios:
+            ax.plot(*decimate(np.arange(len(tempo_ratio)), tempo_ratio, max_points))
+    else:
+        ax.plot(*decimate(list(tempo_map.keys()), list(tempo_map.values()), max_points))
     ax.set(xlabel='Beats', ylabel='Tempo Ratio',
            title='Tempo curve')
     plt.grid(True)
-    plt.show()
+    show_or_save(output_path, [fig])
 
 
-def plot_timing(tempo_map: dict):
+@instrumented("plotting")
+def plot_timing(tempo_map: dict, output_path: str = None, confidence_intervals: dict = None):
     """
     Plot the Tempo curve for each meter in the tempo_map
     :param tempo_map: a dict with the meter as key and a list of ratio as value for one bar
+    :param output_path: path of the image file to write, None to show the figure
+    :param confidence_intervals: a dict with the meter as key and a dict with the "lower" and "upper" bounds of the
+    ratios as value (see timing_bootstrap.bootstrap_tempo_ratios), drawn as bands around the curves
     :return: None
     """
     longest_meter = max(tempo_map, key=lambda x: len(tempo_map[x]))
     for meter in tempo_map:
         sns.lineplot(x=list(range(len(tempo_map[meter]))), y=tempo_map[meter], label=meter, marker='o')
+        if confidence_intervals is not None and meter in confidence_intervals:
+            plt.fill_between(range(len(tempo_map[meter])), confidence_intervals[meter]["lower"],
+                             confidence_intervals[meter]["upper"], alpha=0.2)
     plt.xlabel('Beats')
     plt.ylabel('Tempo Ratio')
     plt.title('Tempo curve')
@@ -39,4 +59,4 @@ def plot_timing(tempo_map: dict):
     plt.grid(True)
     # Put legend outside the plot
     plt.legend(title='Meter', bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.show()
+    show_or_save(output_path)
@@ -0,0 +1,137 @@
+"""
+This module contains the bootstrap confidence intervals of the tempo ratios of timing() for each beat of a meter.
+
+The unit of resampling is the performance, not the beat: the beats of a performance are not independent, so
+resampling them would give intervals much too narrow. The sum and the number of the durations of each beat position
+are computed once per performance, then every replicate draws the number of times each performance is resampled
+(multinomial) and the resampled sums are a matrix product of these weights with the per-performance sums.
+The symbolic average durations are the ones of timing(), they do not depend on the performers.
+
+Each meter has its own random stream spawned from the seed, so the replicates are the same whatever the number of
+worker processes and the order in which the meters are computed.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from task_a.instrumentation import instrumented
+from task_a.meter_aggregation import aggregate_file, merge_aggregates
+from task_a.timing_function import get_annotations_files_from_folder
+
+DEFAULT_REPLICATES = 10000
+DEFAULT_CONFIDENCE = 0.95
+# Number of replicates whose weights are in memory at once
+REPLICATES_CHUNK = 1000
+
+
+def get_performance_sums(folder_path: str) -> dict:
+    """
+    Get the sum and the number of the durations of each beat position of each meter, for each performance
+    The meters are named as in timing() (see meter_aggregation.merge_aggregates)
+    :param folder_path: path to the folder containing all the annotations files (can be in sub folders)
+    :return: dict with meter as key and a dict as value with the "symbolic_mean" duration of each beat position
+    and the "sums" and "counts" of the performed durations (one row per performance with the meter, one column per
+    beat position)
+    """
+    annotations_files = get_annotations_files_from_folder(folder_path)
+    symbolic_aggregate = merge_aggregates(
+        [aggregate_file(file) for file in annotations_files if "midi_score_annotations.txt" in file])
+    lengths = {}
+    rows = {}
+    for file in annotations_files:
+        if "midi_score_annotations.txt" in file:
+            continue
+        for meter, meter_aggregate in aggregate_file(file).items():
+            length = len(meter_aggregate["sum_durations"])
+            meter_for_result = meter
+            if lengths.setdefault(meter, length) != length:
+                meter_for_result = f"{meter}_with_{length}_downbeat{'s' if length > 1 else ''}"
+            rows.setdefault(meter_for_result, []).append(meter_aggregate)
+
+    result = {}
+    for meter, meter_rows in rows.items():
+        if meter not in symbolic_aggregate:
+            continue
+        symbolic = symbolic_aggregate[meter]
+        if len(symbolic["sum_durations"]) != len(meter_rows[0]["sum_durations"]):
+            continue
+        result[meter] = {
+            "symbolic_mean": np.divide(symbolic["sum_durations"], symbolic["number_of_beats"],
+                                       out=np.full(len(symbolic["sum_durations"]), np.nan),
+                                       where=symbolic["number_of_beats"] > 0),
+            "sums": np.stack([row["sum_durations"] for row in meter_rows]).astype(np.float64),
+            "counts": np.stack([row["number_of_beats"] for row in meter_rows]).astype(np.float64),
+        }
+    return result
+
+
+def bootstrap_meter(performance_sums: dict, number_of_replicates: int = DEFAULT_REPLICATES,
+                    confidence: float = DEFAULT_CONFIDENCE, seed=None) -> dict:
+    """
+    Compute the bootstrap confidence intervals of the tempo ratios of one meter, resampling the performances
+    :param performance_sums: dict with the "symbolic_mean", "sums" and "counts" of a meter (see get_performance_sums)
+    :param number_of_replicates: number of bootstrap replicates
+    :param confidence: level of the percentile intervals
+    :param seed: seed or np.random.SeedSequence of the random stream
+    :return: dict with the "tempo_ratio" (as in timing()), the "lower" and "upper" bounds of its interval and its
+    bootstrap standard error "std" for each beat position as lists
+    """
+    rng = np.random.default_rng(seed)
+    symbolic_mean = performance_sums["symbolic_mean"]
+    sums = performance_sums["sums"]
+    counts = performance_sums["counts"]
+    number_of_performances = len(sums)
+    probabilities = np.full(number_of_performances, 1 / number_of_performances)
+    ratios = np.empty((number_of_replicates, len(symbolic_mean)))
+    for start in range(0, number_of_replicates, REPLICATES_CHUNK):
+        size = min(REPLICATES_CHUNK, number_of_replicates - start)
+        weights = rng.multinomial(number_of_performances, probabilities, size=size).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios[start:start + size] = symbolic_mean * (weights @ counts) / (weights @ sums)
+
+    alpha = (1 - confidence) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tempo_ratio = symbolic_mean * counts.sum(axis=0) / sums.sum(axis=0)
+    # A replicate without any beat at a position gives nan, it is left out
+    ratios[~np.isfinite(ratios)] = np.nan
+    lower, upper = np.nanquantile(ratios, [alpha, 1 - alpha], axis=0)
+    return {
+        "tempo_ratio": tempo_ratio.tolist(),
+        "lower": lower.tolist(),
+        "upper": upper.tolist(),
+        "std": np.nanstd(ratios, axis=0, ddof=1).tolist(),
+    }
+
+
+def _bootstrap_meter_arguments(arguments: tuple) -> dict:
+    """
+    Call bootstrap_meter with a tuple of arguments (for the worker processes)
+    """
+    return bootstrap_meter(*arguments)
+
+
+@instrumented("timing_bootstrap")
+def bootstrap_tempo_ratios(folder_path: str, number_of_replicates: int = DEFAULT_REPLICATES,
+                           confidence: float = DEFAULT_CONFIDENCE, seed: int = None, workers: int = 1) -> dict:
+    """
+    Compute the bootstrap confidence intervals of the tempo ratios of timing() for each beat of a meter
+    :param folder_path: path to the folder containing all the annotations files (can be in sub folders)
+    :param number_of_replicates: number of bootstrap replicates
+    :param confidence: level of the percentile intervals
+    :param seed: seed of the random streams
+    :param workers: number of worker processes, each computing whole meters (1 computes them in the current process)
+    :return: dict with meter as key and a dict as value (see bootstrap_meter)
+    """
+    performance_sums = get_performance_sums(folder_path)
+    meters = list(performance_sums)
+    arguments = [(performance_sums[meter], number_of_replicates, confidence, seed_sequence)
+                 for meter, seed_sequence in zip(meters, np.random.SeedSequence(seed).spawn(len(meters)))]
+    if workers <= 1 or len(meters) <= 1:
+        results = map(_bootstrap_meter_arguments, arguments)
+        return dict(zip(meters, results))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(meters, executor.map(_bootstrap_meter_arguments, arguments)))
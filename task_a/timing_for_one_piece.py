@@ -5,7 +5,13 @@ This module contains functions to get the timing attributes for a single piece.
 @Date: 2024-03-26
 """
 
-import os
+import numpy as np
+
+from task_a.annotation_cache import load_annotations
+from task_a.beat_records import create_beat_records, encode_labels, load_beat_records, to_beat_dicts
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.instrumentation import instrumented
+from task_a.performance_matrix import build_onset_matrix, get_beat_statistics
 
 
 def get_performed_attributes(performed_path: str) -> dict:
@@ -14,30 +20,10 @@ def get_performed_attributes(performed_path: str) -> dict:
     :param performed_path: path to the annotation file with the performed times
     :return: dict of the performed attributes for each beat
     """
-    result_performed = {}
-    with open(performed_path, "r") as f:
-        performed_data = f.readlines()
-        current_key = None
-        current_meter = None
-        current_beat = 0
-        for line in performed_data:
-            line_data = line.split()
-            beat_key_meter = line_data[2].split(',')
-            beat_type = beat_key_meter[0]
-            if len(beat_key_meter) == 3:
-                current_meter = beat_key_meter[1]
-                current_key = beat_key_meter[2]
-            elif len(beat_key_meter) == 2:
-                current_meter = beat_key_meter[1]
-
-            result_performed[current_beat] = {
-                "key": current_key,
-                "meter": current_meter,
-                "onset": line_data[0],
-                "beat_type": beat_type
-            }
-            current_beat += 1
-    return result_performed
+    annotations = load_annotations(performed_path)
+    onsets = annotations["beats"]["onset"]
+    records = to_beat_dicts(create_beat_records(onsets, onsets, encode_labels(annotations)))
+    return {beat: record["performed"] for beat, record in records.items()}
 
 
 def get_symbolic_attributes(symbolic_path: str) -> dict:
@@ -46,17 +32,8 @@ def get_symbolic_attributes(symbolic_path: str) -> dict:
     :param symbolic_path: path to the annotation file with the symbolic times
     :return: dict of the symbolic attributes for each beat
     """
-    result_symbolic = {}
-    with open(symbolic_path, "r") as f:
-        unperformed_data = f.readlines()
-        current_beat = 0
-        for line in unperformed_data:
-            line_data = line.split()
-            result_symbolic[current_beat] = {
-                "onset": line_data[0],
-            }
-            current_beat += 1
-    return result_symbolic
+    onsets = load_annotations(symbolic_path)["beats"]["onset"].tolist()
+    return {current_beat: {"onset": onset} for current_beat, onset in enumerate(onsets)}
 
 
 def get_piece_symbolic_to_performed_times(symbolic_path: str, performed_path: str) -> dict:
@@ -64,79 +41,88 @@ def get_piece_symbolic_to_performed_times(symbolic_path: str, performed_path: st
     Get the symbolic and performed times for a piece
     :param symbolic_path:  path to the annotation file with the symbolic times
     :param performed_path: path to the annotation file with the performed times
-    :return: a dict containing the symbolic and performed times for each beat, with their meter, key and beat type
+    :return: beat records with the symbolic and performed onset, meter, key and beat type of each beat
+    (see beat_records.create_beat_records, beat_records.to_beat_dicts gives the former dict per beat)
     """
-    result_performed = get_performed_attributes(performed_path)
-    result_symbolic = get_symbolic_attributes(symbolic_path)
-    result = {}
-    for key in result_performed:
-        result[key] = {
-            "symbolic": result_symbolic[key],
-            "performed": result_performed[key]
-        }
-    return result
+    return load_beat_records(symbolic_path, performed_path)
+
+
+def compute_tempo_map(symbolic_onsets, performed_onsets) -> dict:
+    """
+    Compute the tempo map of one or several performances of a piece in one vectorized pass
+    The last inter-onset interval is left out, as in get_tempo_map
+    :param symbolic_onsets: array of the symbolic onset of each beat
+    :param performed_onsets: array of the performed onset of each beat, or 2D array with one performance per row
+    :return: dict of arrays with the tempo ratio, the local performed tempo (beats per minute) and the
+    deviation of the performed inter-onset interval from the symbolic one (seconds) for each beat
+    """
+    performed_onsets = np.asarray(performed_onsets, dtype=np.float64)
+    number_of_beats = performed_onsets.shape[-1]
+    symbolic_onsets = np.asarray(symbolic_onsets, dtype=np.float64)[:number_of_beats]
+    duration_performed = np.diff(performed_onsets, axis=-1)[..., :max(number_of_beats - 2, 0)]
+    duration_symbolic = np.diff(symbolic_onsets)[:max(number_of_beats - 2, 0)]
+    tempo_performed = 1 / duration_performed
+    tempo_symbolic = 1 / duration_symbolic
+    return {
+        "tempo_ratio": tempo_performed / tempo_symbolic,
+        "local_tempo": 60 * tempo_performed,
+        "ioi_deviation": duration_performed - duration_symbolic,
+    }
+
+
+@instrumented("get_piece_tempo_map")
+def get_piece_tempo_map(symbolic_path: str, performed_paths: list) -> dict:
+    """
+    Compute the tempo map of the performances of a piece directly from the annotation files
+    :param symbolic_path: path to the annotation file with the symbolic times
+    :param performed_paths: paths to the annotation files with the performed times (all with the same number of beats)
+    :return: dict of 2D arrays with one performance per row (see compute_tempo_map)
+    """
+    symbolic_onsets = load_annotations(symbolic_path)["beats"]["onset"]
+    performed_onsets = np.stack([load_annotations(path)["beats"]["onset"] for path in performed_paths])
+    return compute_tempo_map(symbolic_onsets, performed_onsets)
 
 
 def get_tempo_map(symbolic_to_performed_times: dict) -> dict:
     """
     Get the tempo map from the symbolic to the performed times
     Compute the tempo ratio for each beat
-    :param symbolic_to_performed_times:
+    :param symbolic_to_performed_times: beat records (see get_piece_symbolic_to_performed_times)
+    or dict of the symbolic and performed attributes per beat
     :return: dict
     """
-    result = {}
-    for i in range(len(symbolic_to_performed_times) - 2):
-        onset = symbolic_to_performed_times[i]["performed"]["onset"]
-        next_onset = symbolic_to_performed_times[i + 1]["performed"]["onset"]
-        duration_performed = float(next_onset) - float(onset)
-        onset_symbolic = symbolic_to_performed_times[i]["symbolic"]["onset"]
-        next_onset_symbolic = symbolic_to_performed_times[i + 1]["symbolic"]["onset"]
-        duration_symbolic = float(next_onset_symbolic) - float(onset_symbolic)
-        tempo_performed = 1 / duration_performed
-        tempo_symbolic = 1 / duration_symbolic
-        result[i] = tempo_performed / tempo_symbolic
-    return result
+    if "beats" in symbolic_to_performed_times:
+        beats = symbolic_to_performed_times["beats"]
+        symbolic_onsets, performed_onsets = beats["symbolic_onset"], beats["performed_onset"]
+    else:
+        beats = range(len(symbolic_to_performed_times))
+        symbolic_onsets = [float(symbolic_to_performed_times[i]["symbolic"]["onset"]) for i in beats]
+        performed_onsets = [float(symbolic_to_performed_times[i]["performed"]["onset"]) for i in beats]
+    return dict(enumerate(compute_tempo_map(symbolic_onsets, performed_onsets)["tempo_ratio"].tolist()))
 
 
+@instrumented("get_average_timing_one_piece")
 def get_average_timing_one_piece(folder_path: str) -> dict or None:
     """
     Get the attributes for each beat for a piece where the piece can have
     multiple performances
+    The beat type, meter and key of the average performance are the ones of the score annotation file
     :param folder_path: the path to the piece folder
-    :return: dict
+    :return: beat records (see get_piece_symbolic_to_performed_times), with the average performed onsets
+    if the piece has multiple performances
     """
-    files = [file for file in os.listdir(folder_path) if file.endswith("annotations.txt")]
-    files.remove("midi_score_annotations.txt")
-    if len(files) == 0:
+    manifest = get_manifest(folder_path)
+    performances = get_performances(manifest, piece=".")
+    if len(performances) == 0 or performances[0]["score_annotation_path"] is None:
         print("No annotation files found")
         return
-    if len(files) == 1:
-        return get_piece_symbolic_to_performed_times(folder_path + "/midi_score_annotations.txt",
-                                                     folder_path + "/" + files[0])
+    if len(performances) == 1:
+        return get_piece_symbolic_to_performed_times(performances[0]["score_annotation_path"],
+                                                     performances[0]["annotation_path"])
 
     # Case multiple files :
-    # Get the symbolic times only once
-    symbolic_times = get_symbolic_attributes(folder_path + "/midi_score_annotations.txt")
-    performed_list = []
-    for file in files:
-        performed_list.append(get_performed_attributes(folder_path + "/" + file))
-
-    # Average the onsets for each beat for performed times
-    avg_performed = {}
-    for i in range(len(symbolic_times)):
-        onset_sum = 0
-        for performed in performed_list:
-            if i not in performed:
-                continue
-            onset_sum += float(performed[i]["onset"])
-        avg_performed[i] = onset_sum / len(performed_list)
-
-    result = {}
-    for key in symbolic_times:
-        result[key] = {
-            "symbolic": symbolic_times[key],
-            "performed": {
-                "onset": avg_performed[key]
-            }
-        }
-    return result
+    # Average the onsets of each beat over the performances that have the beat
+    matrix = build_onset_matrix(manifest, ["."])
+    symbolic = load_annotations(performances[0]["score_annotation_path"])
+    return create_beat_records(symbolic["beats"]["onset"], get_beat_statistics(matrix, ("mean",))["mean"][0],
+                               encode_labels(symbolic))
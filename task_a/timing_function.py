@@ -5,7 +5,14 @@ by averaging the timing attributes for each beat of a meter.
 @Author: Joris Monnet
 @Date: 2024-03-26
 """
-import os
+import warnings
+
+import numpy as np
+
+from task_a.corpus_manifest import get_annotation_files, get_manifest
+from task_a.instrumentation import count, instrumented, stage
+from task_a.meter_aggregation import (DEFAULT_QUANTILES, aggregate_file, get_quantiles_from_histogram, get_statistics,
+                                     merge_aggregates)
 
 
 def merge_sum_and_lengths_timings(sum_and_lengths: list[dict]) -> dict:
@@ -26,10 +33,11 @@ def merge_sum_and_lengths_timings(sum_and_lengths: list[dict]) -> dict:
             if len(result[meter]["sum_durations"]) != len(sum_and_lengths_file[meter]["sum_durations"]):
                 meter_for_result = (f"{meter}_with_{str(len(sum_and_lengths_file[meter]['sum_durations']))}_downbeat"
                                     f"{'s' if len(sum_and_lengths_file[meter]['sum_durations']) > 1 else ''}")
-                result[meter_for_result] = {
-                    "sum_durations": [0 for _ in range(len(sum_and_lengths_file[meter]["sum_durations"]))],
-                    "number_of_beats": [0 for _ in range(len(sum_and_lengths_file[meter]["sum_durations"]))],
-                }
+                if meter_for_result not in result:
+                    result[meter_for_result] = {
+                        "sum_durations": [0 for _ in range(len(sum_and_lengths_file[meter]["sum_durations"]))],
+                        "number_of_beats": [0 for _ in range(len(sum_and_lengths_file[meter]["sum_durations"]))],
+                    }
             for i in range(len(sum_and_lengths_file[meter]["sum_durations"])):
                 result[meter_for_result]["sum_durations"][i] += sum_and_lengths_file[meter]["sum_durations"][i]
                 result[meter_for_result]["number_of_beats"][i] += sum_and_lengths_file[meter]["number_of_beats"][i]
@@ -42,40 +50,9 @@ def get_sum_and_lengths_timing_one_bar(path: str) -> dict:
     :param path: to the annotation file
     :return: dict with meter as key and the sum of the durations and the number of beats for each beat as list
     """
-    result = {}
-    with open(path, "r") as f:
-        symbolic_data = f.readlines()
-        current_beat = 0
-        current_meter = None
-        for i in range(len(symbolic_data) - 1):
-            line_data = symbolic_data[i].split()
-            next_line_data = symbolic_data[i + 1].split()
-            beat_type_meter_key = line_data[2].split(',')
-            meter = beat_type_meter_key[1] if len(beat_type_meter_key) > 1 else ""
-            if meter != current_meter and meter != "":
-                current_meter = meter
-                if current_meter not in result:
-                    result[current_meter] = {
-                        "sum_durations": [0],
-                        "number_of_beats": [0],
-                    }
-                current_beat = 0
-            elif current_meter is None:
-                # Anacrusis
-                continue
-            if beat_type_meter_key[0] == "db":
-                current_beat = 0  # Downbeat
-            elif beat_type_meter_key[0] == "b":
-                current_beat += 1  # other beats
-            elif beat_type_meter_key[0] == "bR":  # Remove beats with type bR (beats that are not in the meter)
-                continue
-            new_onset = float(next_line_data[0]) - float(line_data[0])
-            if len(result[current_meter]["sum_durations"]) <= current_beat:
-                result[current_meter]["sum_durations"].append(0)
-                result[current_meter]["number_of_beats"].append(0)
-            result[current_meter]["sum_durations"][current_beat] += new_onset
-            result[current_meter]["number_of_beats"][current_beat] += 1
-    return result
+    return {meter: {"sum_durations": meter_aggregate["sum_durations"].tolist(),
+                    "number_of_beats": meter_aggregate["number_of_beats"].tolist()}
+            for meter, meter_aggregate in aggregate_file(path).items()}
 
 
 def get_average_from_sum_and_lengths(sum_and_lengths: dict) -> dict:
@@ -88,6 +65,7 @@ def get_average_from_sum_and_lengths(sum_and_lengths: dict) -> dict:
                     for i in range(len(sum_and_lengths[meter]["sum_durations"]))] for meter in sum_and_lengths}
 
 
+@instrumented("get_average_symbolic_and_performed_times")
 def get_average_symbolic_and_performed_times(folder_path: str) -> tuple[dict, dict]:
     """
     Get the average symbolic and performed times for each beat of a meter
@@ -113,27 +91,75 @@ def get_annotations_files_from_folder(folder_path: str) -> list:
     :param folder_path: path to the folder
     :return: list of paths to the txt files
     """
-    txt_files = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith("annotations.txt"):
-                txt_files.append(os.path.join(root, file))
-        for directory in dirs:
-            txt_files.extend(get_annotations_files_from_folder(os.path.join(root, directory)))
-    return txt_files
+    return get_annotation_files(get_manifest(folder_path))
+
+
+@instrumented("timing")
+def get_timing_statistics(folder_path: str, quantiles: tuple = DEFAULT_QUANTILES) -> dict:
+    """
+    Get the tempo ratio and the spread of the performed durations for each beat of a meter,
+    reading each annotation file once
+    :param folder_path: path to the folder containing all the annotations files (can be in sub folders)
+    :param quantiles: quantiles of the performed durations to approximate, between 0 and 1
+    :return: dict with meter as key and a dict as value with the "tempo_ratio", the "count", "mean",
+    "variance" and "quantiles" of the performed durations, and the "tempo_ratio_quantiles"
+    (symbolic average duration divided by the performed duration quantiles) for each beat as lists
+    """
+    annotations_files = get_annotations_files_from_folder(folder_path)
+    with stage("aggregation"):
+        symbolic_aggregate = merge_aggregates(
+            [aggregate_file(file) for file in annotations_files if "midi_score_annotations.txt" in file])
+        performed_aggregate = merge_aggregates(
+            [aggregate_file(file) for file in annotations_files if "midi_score_annotations.txt" not in file])
+    with stage("statistics"):
+        return get_timing_statistics_from_aggregates(symbolic_aggregate, performed_aggregate, quantiles)
+
+
+def get_timing_statistics_from_aggregates(symbolic_aggregate: dict, performed_aggregate: dict,
+                                          quantiles: tuple = DEFAULT_QUANTILES) -> dict:
+    """
+    Get the tempo ratio and the spread of the performed durations for each beat of a meter from merged aggregates
+    A meter that is not in the performed aggregate, or whose number of beat positions differs between the symbolic and
+    performed aggregates, has no tempo ratio: it is left out with a warning and counted as "skipped_meters"
+    :param symbolic_aggregate: merged aggregate of the symbolic annotation files (see meter_aggregation)
+    :param performed_aggregate: merged aggregate of the performed annotation files
+    :param quantiles: quantiles of the performed durations to approximate, between 0 and 1
+    :return: dict with meter as key (see get_timing_statistics)
+    """
+    symbolic_statistics = get_statistics(symbolic_aggregate, quantiles)
+    performed_statistics = get_statistics(performed_aggregate, quantiles)
+
+    result = {}
+    for meter in symbolic_statistics:
+        symbolic_mean = np.array(symbolic_statistics[meter]["mean"])
+        performed = performed_statistics.get(meter)
+        if performed is None or len(symbolic_mean) != len(performed["mean"]):
+            count("skipped_meters")
+            warnings.warn(f"Meter '{meter}' left out: {len(symbolic_mean)} symbolic beat positions and "
+                          f"{len(performed['mean']) if performed else 'no'} performed beat positions")
+            continue
+        result[meter] = {
+            "tempo_ratio": (symbolic_mean / np.array(performed["mean"])).tolist(),
+            **performed,
+            # A longer duration means a slower tempo so the quantiles of the ratio are reversed
+            "tempo_ratio_quantiles": {
+                quantile: (symbolic_mean / values).tolist() for quantile, values in
+                zip(quantiles, get_quantiles_from_histogram(performed_aggregate[meter]["histogram"],
+                                                            [1 - quantile for quantile in quantiles]))
+            },
+        }
+    return result
 
 
 def timing(folder_path: str) -> dict:
     """
     Get the tempo ratio between symbolic and performed times for each beat of a meter
+    The meters whose symbolic and performed bars have different numbers of beats are left out with a warning
+    (see get_timing_statistics_from_aggregates)
     :param folder_path: path to the folder containing all the annotations files (can be in sub folders)
     :return: dict with meter as key and the tempo ratio for each beat as list
     """
-    perf_average, symbolic_average = get_average_symbolic_and_performed_times(folder_path)
-    return {
-        meter: [perf_average[meter][i] / symbolic_average[meter][i] for i in range(len(perf_average[meter]))]
-        for meter in perf_average
-    }
+    return {meter: statistics["tempo_ratio"] for meter, statistics in get_timing_statistics(folder_path).items()}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+"""
+This module contains the batched least-squares fitting of parametric timing models to every performance at once.
+
+The modelled value of each beat is its log tempo ratio (see timing_for_one_piece.compute_tempo_map) relative to the
+mean of its performance. The model of a beat is a linear combination of:
+- an offset per position in the bar (the positions after MAX_POSITIONS share the last offset),
+- a polynomial "phrase arc" of the position in the phrase (groups of phrase_bars bars, a pickup is just before
+  the first phrase),
+- a polynomial "final ritardando" of the position in the last ritardando_fraction of the performance.
+
+The design matrices of all the performances are stacked in one array and reduced to the normal equations of each
+performance with array operations, then all the systems are solved in one batched call. The normal equations are sufficient
+statistics: the models of any group of performances (a composer, all the composers but one...) are fitted by adding
+them, which gives the cross-composer generalization error without going through the beats again.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import numpy as np
+
+from task_a.annotation_cache import load_annotations
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.instrumentation import count, instrumented
+from task_a.meter_aggregation import get_all_beat_positions
+from task_a.timing_for_one_piece import compute_tempo_map
+
+MAX_POSITIONS = 12
+DEFAULT_PHRASE_BARS = 4
+DEFAULT_ARC_DEGREE = 2
+DEFAULT_RITARDANDO_FRACTION = 0.1
+DEFAULT_RITARDANDO_DEGREE = 2
+DEFAULT_RIDGE = 1e-6
+# Number of beats whose outer products are in memory at once
+NORMAL_EQUATIONS_CHUNK = 2 ** 12
+
+
+def get_feature_names(arc_degree: int = DEFAULT_ARC_DEGREE, ritardando_degree: int = DEFAULT_RITARDANDO_DEGREE) -> list:
+    """
+    Get the names of the columns of the design matrix
+    :param arc_degree: degree of the phrase arc polynomial
+    :param ritardando_degree: degree of the final ritardando polynomial
+    :return: list of names
+    """
+    return ([f"position_{position}" for position in range(MAX_POSITIONS)]
+            + [f"arc_{degree}" for degree in range(1, arc_degree + 1)]
+            + [f"ritardando_{degree}" for degree in range(1, ritardando_degree + 1)])
+
+
+def get_design_matrix(score_annotations: dict, number_of_beats: int, phrase_bars: int = DEFAULT_PHRASE_BARS,
+                      arc_degree: int = DEFAULT_ARC_DEGREE, ritardando_fraction: float = DEFAULT_RITARDANDO_FRACTION,
+                      ritardando_degree: int = DEFAULT_RITARDANDO_DEGREE) -> tuple:
+    """
+    Get the design matrix of the first beats of a performance
+    :param score_annotations: parsed score annotation file of the piece (see annotation_cache.load_annotations)
+    :param number_of_beats: number of beats of the performance to model (at most the number of beats of the score)
+    :param phrase_bars: number of bars of a phrase
+    :param arc_degree: degree of the phrase arc polynomial
+    :param ritardando_fraction: fraction of the performance at its end where the ritardando applies
+    :param ritardando_degree: degree of the final ritardando polynomial
+    :return: design matrix (one row per beat, see get_feature_names) and boolean array of the beats in a bar
+    of their meter
+    """
+    meters, positions, kept = get_all_beat_positions(score_annotations)
+    positions, kept = positions[:number_of_beats], kept[:number_of_beats]
+    # A bar starts at every position 0, the beats before the first bar (pickup) are in the bar -1
+    bars = np.cumsum(kept & (positions == 0)) - 1
+    in_bar = bars >= 0
+    bar_lengths = np.bincount(bars[kept & in_bar], minlength=max(int(bars.max()) + 1, 1) if len(bars) else 1)
+    # The pickup is the end of a bar as long as the first one, just before the first phrase (negative positions)
+    bar_length = np.maximum(bar_lengths[np.maximum(bars, 0)], 1)
+    phrase = (np.where(in_bar, bars % phrase_bars, -1) + positions / bar_length) / phrase_bars
+    time = np.arange(number_of_beats) / max(number_of_beats - 1, 1)
+    ritardando = np.clip((time - (1 - ritardando_fraction)) / ritardando_fraction, 0, 1)
+
+    design = np.zeros((number_of_beats, MAX_POSITIONS + arc_degree + ritardando_degree))
+    design[np.arange(number_of_beats), np.minimum(positions, MAX_POSITIONS - 1)] = 1
+    for degree in range(1, arc_degree + 1):
+        design[:, MAX_POSITIONS + degree - 1] = phrase ** degree
+    for degree in range(1, ritardando_degree + 1):
+        design[:, MAX_POSITIONS + arc_degree + degree - 1] = ritardando ** degree
+    return design, kept
+
+
+@instrumented("timing_models.dataset")
+def build_timing_dataset(root: str, phrase_bars: int = DEFAULT_PHRASE_BARS, arc_degree: int = DEFAULT_ARC_DEGREE,
+                         ritardando_fraction: float = DEFAULT_RITARDANDO_FRACTION,
+                         ritardando_degree: int = DEFAULT_RITARDANDO_DEGREE) -> dict:
+    """
+    Stack the design matrices and the modelled values of all the performances of a corpus
+    Only the beats in a bar of their meter with a positive tempo ratio are kept
+    :param root: path to the root folder of the corpus
+    :param phrase_bars: number of bars of a phrase
+    :param arc_degree: degree of the phrase arc polynomial
+    :param ritardando_fraction: fraction of the performance at its end where the ritardando applies
+    :param ritardando_degree: degree of the final ritardando polynomial
+    :return: dict with the stacked design matrix "x", the modelled values "y", the index of the performance of each
+    beat ("performance_index"), the "performances" (dict with composer, piece and performance), the
+    "composers" and the "feature_names"
+    """
+    designs, values, indices, performances = [], [], [], []
+    score_annotations = {}
+    for performance in get_performances(get_manifest(root)):
+        score_path = performance["score_annotation_path"]
+        if score_path is None:
+            continue
+        if score_path not in score_annotations:
+            score_annotations[score_path] = load_annotations(score_path)
+        score = score_annotations[score_path]
+        performed_onsets = load_annotations(performance["annotation_path"])["beats"]["onset"]
+        tempo_ratio = compute_tempo_map(score["beats"]["onset"], performed_onsets)["tempo_ratio"]
+        design, kept = get_design_matrix(score, len(tempo_ratio), phrase_bars, arc_degree, ritardando_fraction,
+                                         ritardando_degree)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_ratio = np.log(tempo_ratio)
+        kept &= np.isfinite(log_ratio)
+        if not kept.any():
+            continue
+        designs.append(design[kept])
+        values.append(log_ratio[kept] - log_ratio[kept].mean())
+        indices.append(np.full(kept.sum(), len(performances)))
+        performances.append({name: performance[name] for name in ("composer", "piece", "performance")})
+    count("beats", sum(len(value) for value in values))
+
+    number_of_features = MAX_POSITIONS + arc_degree + ritardando_degree
+    return {
+        "x": np.concatenate(designs) if designs else np.zeros((0, number_of_features)),
+        "y": np.concatenate(values) if values else np.zeros(0),
+        "performance_index": np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+        "performances": performances,
+        "composers": sorted({performance["composer"] for performance in performances}),
+        "feature_names": get_feature_names(arc_degree, ritardando_degree),
+    }
+
+
+def get_normal_equations(dataset: dict) -> dict:
+    """
+    Reduce the stacked design matrix to the normal equations of every performance
+    :param dataset: stacked dataset (see build_timing_dataset)
+    :return: dict with "xtx" (performance x feature x feature), "xty" (performance x feature), "yty" and the
+    "number_of_beats" of every performance
+    """
+    x, y, index = dataset["x"], dataset["y"], dataset["performance_index"]
+    number_of_performances = len(dataset["performances"])
+    number_of_features = x.shape[1]
+    xtx = np.zeros((number_of_performances, number_of_features, number_of_features))
+    # The outer products of the rows are summed per performance, one chunk of beats at a time
+    for start in range(0, len(index), NORMAL_EQUATIONS_CHUNK):
+        chunk = slice(start, start + NORMAL_EQUATIONS_CHUNK)
+        chunk_index = index[chunk]
+        performances = np.unique(chunk_index)
+        # Matrix product with the indicator of the performance of each beat (a BLAS call instead of a reduction)
+        indicator = (performances[:, None] == chunk_index[None, :]).astype(x.dtype)
+        outer = np.einsum("ni,nj->nij", x[chunk], x[chunk]).reshape(len(chunk_index), -1)
+        xtx[performances] += (indicator @ outer).reshape(-1, number_of_features, number_of_features)
+    xty = np.stack([np.bincount(index, weights=x[:, i] * y, minlength=number_of_performances)
+                    for i in range(number_of_features)], axis=1)
+    return {
+        "xtx": xtx,
+        "xty": xty,
+        "yty": np.bincount(index, weights=y * y, minlength=number_of_performances),
+        "number_of_beats": np.bincount(index, minlength=number_of_performances),
+    }
+
+
+def solve_normal_equations(xtx: np.ndarray, xty: np.ndarray, ridge: float = DEFAULT_RIDGE) -> np.ndarray:
+    """
+    Solve a batch of least-squares problems from their normal equations
+    A small ridge keeps the systems solvable when a feature is missing (for example a position absent from a piece)
+    :param xtx: array of the matrices X^T X (... x feature x feature)
+    :param xty: array of the vectors X^T y (... x feature)
+    :param ridge: regularization added to the diagonal
+    :return: array of the coefficients (... x feature)
+    """
+    regularized = xtx + ridge * np.eye(xtx.shape[-1])
+    return np.linalg.solve(regularized, xty[..., None])[..., 0]
+
+
+def get_fit_quality(coefficients: np.ndarray, xtx: np.ndarray, xty: np.ndarray, yty: np.ndarray,
+                    number_of_beats: np.ndarray) -> dict:
+    """
+    Compute the quality of fits from the normal equations of the data they are evaluated on
+    The modelled values are centered per performance, so the total sum of squares is y^T y
+    :param coefficients: array of the coefficients (... x feature)
+    :param xtx: array of the matrices X^T X of the evaluation data
+    :param xty: array of the vectors X^T y of the evaluation data
+    :param yty: array of the sums of squares of the evaluation data
+    :param number_of_beats: array of the number of beats of the evaluation data
+    :return: dict with the root mean squared error "rmse" and the coefficient of determination "r2"
+    """
+    # ||y - X b||^2 = y^T y - 2 b^T X^T y + b^T X^T X b
+    residual = (yty - 2 * np.einsum("...i,...i->...", coefficients, xty)
+                + np.einsum("...i,...ij,...j->...", coefficients, xtx, coefficients))
+    residual = np.maximum(residual, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rmse = np.sqrt(residual / number_of_beats)
+        r2 = 1 - residual / yty
+    return {"rmse": rmse, "r2": r2}
+
+
+@instrumented("timing_models.fit")
+def fit_timing_models(dataset: dict, ridge: float = DEFAULT_RIDGE) -> dict:
+    """
+    Fit the timing model of every performance in one batched solve
+    :param dataset: stacked dataset (see build_timing_dataset)
+    :param ridge: regularization added to the diagonal of the normal equations
+    :return: dict with the "coefficients" (performance x feature), the "rmse" and "r2" of every performance and
+    the "normal_equations" (see get_normal_equations)
+    """
+    equations = get_normal_equations(dataset)
+    coefficients = solve_normal_equations(equations["xtx"], equations["xty"], ridge)
+    return {"coefficients": coefficients, **get_fit_quality(coefficients, **equations), "normal_equations": equations}
+
+
+def get_cross_composer_errors(dataset: dict, normal_equations: dict = None, ridge: float = DEFAULT_RIDGE) -> dict:
+    """
+    Estimate how well a timing model generalizes across styles: for every composer, a model is fitted on the
+    performances of all the other composers and evaluated on the performances of the composer
+    :param dataset: stacked dataset (see build_timing_dataset)
+    :param normal_equations: normal equations of the performances, computed from the dataset by default
+    :param ridge: regularization added to the diagonal of the normal equations
+    :return: dict with the composer as key and a dict with the "rmse" and "r2" of the model of the other composers
+    ("held_out") and of the model fitted on the composer itself ("in_sample") as value
+    """
+    if normal_equations is None:
+        normal_equations = get_normal_equations(dataset)
+    composers = dataset["composers"]
+    composer_index = np.array([composers.index(performance["composer"]) for performance in dataset["performances"]],
+                              dtype=np.int64)
+    # Normal equations of every composer, summed over its performances
+    per_composer = {name: np.stack([values[composer_index == i].sum(axis=0) for i in range(len(composers))])
+                    for name, values in normal_equations.items()}
+    totals = {name: values.sum(axis=0) for name, values in per_composer.items()}
+    in_sample = solve_normal_equations(per_composer["xtx"], per_composer["xty"], ridge)
+    held_out = solve_normal_equations(totals["xtx"] - per_composer["xtx"], totals["xty"] - per_composer["xty"], ridge)
+    in_sample_quality = get_fit_quality(in_sample, **per_composer)
+    held_out_quality = get_fit_quality(held_out, **per_composer)
+    return {
+        composer: {
+            "held_out": {name: float(values[i]) for name, values in held_out_quality.items()},
+            "in_sample": {name: float(values[i]) for name, values in in_sample_quality.items()},
+        } for i, composer in enumerate(composers)
+    }
@@ -0,0 +1,148 @@
+"""
+This module contains the mergeable partial accumulators of the timing function,
+used to shard the corpus across processes or machines sharing a filesystem.
+
+A partial holds, for the symbolic and the performed annotation files of a shard, the aggregate of every
+(meter, number of beat positions) with the index of the first file where it was found.
+Partials are merged in any order and the reduced partial gives the same tempo ratios as timing()
+(up to floating point rounding of the sums), since the naming of the meters only depends on the file indices.
+
+@Author: Joris Monnet
+@Date: 2024-03-26
+"""
+
+import json
+
+import numpy as np
+
+from task_a.meter_aggregation import DEFAULT_QUANTILES, aggregate_file, merge_two_aggregates
+from task_a.timing_function import get_annotations_files_from_folder, get_timing_statistics_from_aggregates
+
+PARTIAL_VERSION = 1
+AGGREGATE_FIELDS = ("number_of_beats", "sum_durations", "m2", "histogram")
+
+
+def get_shard_files(folder_path: str, shard_index: int, number_of_shards: int) -> list:
+    """
+    Get the annotation files of one shard of the corpus, as a contiguous block of the sorted files
+    :param folder_path: path to the folder containing all the annotations files (can be in sub folders)
+    :param shard_index: index of the shard, from 0 to number_of_shards - 1
+    :param number_of_shards: total number of shards
+    :return: list of tuples (index of the file in the corpus, path to the file)
+    """
+    files = get_annotations_files_from_folder(folder_path)
+    bounds = np.linspace(0, len(files), number_of_shards + 1).astype(int)
+    return [(index, files[index]) for index in range(bounds[shard_index], bounds[shard_index + 1])]
+
+
+def compute_partial(indexed_files: list) -> dict:
+    """
+    Compute the partial accumulator of annotation files
+    :param indexed_files: list of tuples (index of the file in the corpus, path to the file)
+    :return: dict with "symbolic" and "performed" as keys and a dict as value with (meter, number of beat positions)
+    as key and the aggregate with its "first" (file index, rank of the meter in the file) as value
+    """
+    partial = {"symbolic": {}, "performed": {}}
+    for file_index, file in indexed_files:
+        kind = "symbolic" if "midi_score_annotations.txt" in file else "performed"
+        for rank, (meter, meter_aggregate) in enumerate(aggregate_file(file).items()):
+            add_to_partial(partial[kind], (meter, len(meter_aggregate["sum_durations"])), (file_index, rank),
+                           meter_aggregate)
+    return partial
+
+
+def add_to_partial(entries: dict, key: tuple, first: tuple, meter_aggregate: dict) -> None:
+    """
+    Add an aggregate to the entries of a partial
+    :param entries: entries of the symbolic or performed files of a partial
+    :param key: (meter, number of beat positions)
+    :param first: (file index, rank of the meter in the file) where the aggregate was first found
+    :param meter_aggregate: aggregate of the meter
+    :return: None
+    """
+    if key in entries:
+        entry = entries[key]
+        entries[key] = {"first": min(entry["first"], first),
+                        **merge_two_aggregates(entry, meter_aggregate)}
+    else:
+        entries[key] = {"first": first, **{field: np.array(meter_aggregate[field]) for field in AGGREGATE_FIELDS}}
+
+
+def reduce_partials(partials: list) -> dict:
+    """
+    Combine partial accumulators, for example of several shards or of a previous run and new files
+    :param partials: list of partials
+    :return: partial
+    """
+    result = {"symbolic": {}, "performed": {}}
+    for partial in partials:
+        for kind in result:
+            for key, entry in partial[kind].items():
+                add_to_partial(result[kind], key, tuple(entry["first"]), entry)
+    return result
+
+
+def partial_to_aggregate(entries: dict) -> dict:
+    """
+    Convert the entries of a partial into a merged aggregate with the meter names of merge_aggregates
+    :param entries: entries of the symbolic or performed files of a partial
+    :return: dict with meter as key (see meter_aggregation.merge_aggregates)
+    """
+    result = {}
+    main_lengths = {}
+    for (meter, length), entry in sorted(entries.items(), key=lambda item: tuple(item[1]["first"])):
+        main_lengths.setdefault(meter, length)
+        meter_for_result = meter
+        if main_lengths[meter] != length:
+            meter_for_result = f"{meter}_with_{length}_downbeat{'s' if length > 1 else ''}"
+        result[meter_for_result] = {field: entry[field] for field in AGGREGATE_FIELDS}
+    return result
+
+
+def timing_from_partial(partial: dict, quantiles: tuple = DEFAULT_QUANTILES) -> dict:
+    """
+    Get the timing statistics from a reduced partial
+    :param partial: partial of the whole corpus
+    :param quantiles: quantiles of the performed durations to approximate, between 0 and 1
+    :return: dict with meter as key (see timing_function.get_timing_statistics)
+    """
+    return get_timing_statistics_from_aggregates(partial_to_aggregate(partial["symbolic"]),
+                                                 partial_to_aggregate(partial["performed"]), quantiles)
+
+
+def save_partial(partial: dict, path: str) -> None:
+    """
+    Save a partial to a compressed ".npz" file
+    :param partial: partial
+    :param path: path of the file
+    :return: None
+    """
+    header = {"version": PARTIAL_VERSION, "entries": []}
+    arrays = {}
+    for kind in ("symbolic", "performed"):
+        for (meter, length), entry in partial[kind].items():
+            index = len(header["entries"])
+            header["entries"].append({"kind": kind, "meter": meter, "length": length, "first": list(entry["first"])})
+            for field in AGGREGATE_FIELDS:
+                arrays[f"{index}_{field}"] = entry[field]
+    with open(path, "wb") as f:
+        np.savez_compressed(f, header=np.array(json.dumps(header)), **arrays)
+
+
+def load_partial(path: str) -> dict:
+    """
+    Load a partial saved with save_partial
+    :param path: path of the file
+    :return: partial
+    """
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data["header"]))
+        if header["version"] != PARTIAL_VERSION:
+            raise ValueError(f"Unsupported partial version {header['version']} in {path}")
+        partial = {"symbolic": {}, "performed": {}}
+        for index, entry in enumerate(header["entries"]):
+            partial[entry["kind"]][(entry["meter"], entry["length"])] = {
+                "first": tuple(entry["first"]),
+                **{field: data[f"{index}_{field}"] for field in AGGREGATE_FIELDS},
+            }
+    return partial
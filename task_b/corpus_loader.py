@@ -0,0 +1,94 @@
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from task_b.musicxml_stream import extract_pitches_and_times
+from task_b.score_cache import load_score_features
+
+BACKENDS = ('music21', 'stream')
+# Bound of the results of map_musicxml_files computed ahead of the consumer
+PENDING_CHUNKS_PER_WORKER = 2
+MAX_CHUNKSIZE = 8
+
+
+def list_musicxml_files(path: str) -> list:
+    """
+    List the MusicXML files in a directory and its subdirectories, in the order of os.walk.
+    :param path: the path of the directory.
+    :return: A list of paths to the MusicXML files.
+    """
+    return [os.path.join(dir_path, filename)
+            for dir_path, _, filenames in os.walk(path)
+            for filename in filenames if filename.endswith('.musicxml')]
+
+
+def load_file(file_path: str, backend: str = 'music21') -> tuple:
+    """
+    Load the features of a MusicXML file without raising on a parsing failure.
+    :param file_path: the path of the MusicXML file.
+    :param backend: 'music21' for all the (cached) score features, or 'stream' for only the pitches and times
+    read directly from the XML (see musicxml_stream).
+    :return: A tuple (features, error) where exactly one of the two is None.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    try:
+        if backend == 'stream':
+            return extract_pitches_and_times(file_path), None
+        return load_score_features(file_path), None
+    except Exception as error:
+        return None, f"{type(error).__name__}: {error}"
+
+
+def _apply_to_chunk(function, file_paths: list) -> list:
+    """
+    Apply a function to the files of a chunk (for the worker processes).
+    :param function: A picklable function of a file path.
+    :param file_paths: A list of paths to MusicXML files.
+    :return: The list of the results of the function.
+    """
+    return [function(file_path) for file_path in file_paths]
+
+
+def map_musicxml_files(function, file_paths: list, workers: int = 1, chunksize: int = None):
+    """
+    Apply a function to many MusicXML files, optionally in parallel worker processes.
+    The results are yielded in the order of file_paths as soon as they are ready, so that only the reduced results
+    of the files have to be kept. At most PENDING_CHUNKS_PER_WORKER chunks per worker are submitted ahead of the
+    result being yielded, so the results waiting for a slow consumer are bounded whatever the number of files.
+    :param function: A picklable function of a file path (for example load_file).
+    :param file_paths: A list of paths to MusicXML files.
+    :param workers: The number of worker processes, 1 runs the function in the current process.
+    :param chunksize: The number of files sent to a worker at once, by default about four chunks per worker
+    and at most MAX_CHUNKSIZE files.
+    :return: A generator of the results of the function.
+    """
+    if workers <= 1 or len(file_paths) <= 1:
+        yield from map(function, file_paths)
+        return
+    if chunksize is None:
+        chunksize = max(1, min(math.ceil(len(file_paths) / (workers * 4)), MAX_CHUNKSIZE))
+    chunks = (file_paths[start:start + chunksize] for start in range(0, len(file_paths), chunksize))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_apply_to_chunk, function, chunk))
+            if len(pending) >= workers * PENDING_CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def load_musicxml_files(file_paths: list, workers: int = 1, chunksize: int = None, backend: str = 'music21') -> list:
+    """
+    Load the features of many MusicXML files, optionally in parallel worker processes.
+    The results are in the order of file_paths whatever the number of workers.
+    :param file_paths: A list of paths to MusicXML files.
+    :param workers: The number of worker processes, 1 loads the files in the current process.
+    :param chunksize: The number of files sent to a worker at once, by default about four chunks per worker.
+    :param backend: The extraction backend, see load_file.
+    :return: A list of tuples (features, error), see load_file.
+    """
+    return list(map_musicxml_files(partial(load_file, backend=backend), file_paths, workers, chunksize))
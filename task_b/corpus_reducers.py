@@ -0,0 +1,195 @@
+import os
+from functools import partial
+
+import numpy as np
+
+from task_a.instrumentation import count, instrumented
+from task_b.constants import all_musician_paths, era_musician_paths
+from task_b.corpus_loader import list_musicxml_files, load_file, map_musicxml_files
+from task_b.pitch_contours import DEFAULT_CONTOUR_RESOLUTION, add_to_contour, create_contour, merge_contours
+from task_b.pitch_counts import get_entropies
+from task_b.significance import NUMBER_OF_PITCHES, get_statistics_from_histograms
+
+# One row per work, the name of the work is kept apart (see reduce_corpus)
+WORK_SUMMARY_DTYPE = np.dtype([
+    ('composer', np.int32),
+    ('number_of_notes', np.int64),
+    ('mean', np.float64),
+    ('std', np.float64),
+    ('lowest', np.float64),
+    ('highest', np.float64),
+    ('entropy', np.float64),
+    ('duration', np.float64),
+])
+
+
+def iterate_works(musician_paths: dict = None, workers: int = 1, backend: str = 'music21'):
+    """
+    Read the MusicXML files of several musicians one work at a time, with the times normalized as in
+    q2.read_musicxml_and_normalize. Only the features of the work being yielded and of the few files parsed ahead by
+    the workers are kept (see corpus_loader.map_musicxml_files), all the files are distributed to the same pool.
+    Files that fail to parse or contain no notes are reported and skipped.
+    :param musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths,
+    all_musician_paths by default.
+    :param workers: The number of worker processes used to parse the files, 1 parses them in the current process.
+    :param backend: The extraction backend, see corpus_loader.load_file.
+    :return: A generator of tuples (musician, relative path, pitches, normalized times, duration) where the pitches
+    and times are arrays and the duration is the time of the last note before the normalization.
+    """
+    if musician_paths is None:
+        musician_paths = all_musician_paths
+    file_paths = []
+    file_musicians = []
+    for musician, path in musician_paths.items():
+        files = list_musicxml_files(path)
+        file_paths.extend(files)
+        file_musicians.extend([musician] * len(files))
+
+    results = map_musicxml_files(partial(load_file, backend=backend), file_paths, workers)
+    for file_path, musician, (features, error) in zip(file_paths, file_musicians, results):
+        relative_path = os.path.relpath(file_path, musician_paths[musician])
+        if error is not None:
+            print(f"Warning: '{relative_path}' could not be parsed ({error}).")
+            continue
+        times = np.asarray(features['times'], dtype=np.float64)
+        total_time = times.max() if len(times) else 0
+        if total_time <= 0:
+            print(f"Warning: '{relative_path}' contains no notes.")
+            continue
+        pitches = np.asarray(features['pitches'])
+        count("notes", len(pitches))
+        yield musician, relative_path, pitches, times / total_time, float(total_time)
+
+
+def create_reducer(resolution: int = DEFAULT_CONTOUR_RESOLUTION, dtype=np.float64) -> dict:
+    """
+    Create an empty reducer of the pitches of a group of works (composer or era).
+    :param resolution: The number of points of the grid of the contour between 0 and 1.
+    :param dtype: The float type of the running contour, see pitch_contours.create_contour.
+    :return: A dictionary with the "number_of_works", the pitch "histogram", the number "n", "mean" and sum of squared
+    deviations "m2" of the pitches, and the running "contour" of the works.
+    """
+    return {
+        'number_of_works': 0,
+        'histogram': np.zeros(NUMBER_OF_PITCHES, dtype=np.int64),
+        'n': 0,
+        'mean': 0.0,
+        'm2': 0.0,
+        'contour': create_contour(resolution, dtype),
+    }
+
+
+def _merge_moments(first: tuple, second: tuple) -> tuple:
+    """
+    Merge the number, mean and sum of squared deviations of two sets of values (parallel form of Welford's algorithm).
+    """
+    n = first[0] + second[0]
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = second[1] - first[1]
+    return n, first[1] + delta * second[0] / n, first[2] + second[2] + delta ** 2 * first[0] * second[0] / n
+
+
+def add_work(reducer: dict, pitches: np.ndarray, times: np.ndarray) -> None:
+    """
+    Fold the notes of a work into a reducer, in place.
+    :param reducer: The reducer, see create_reducer.
+    :param pitches: The pitches of the notes of the work.
+    :param times: The normalized times of the notes of the work.
+    :return: None
+    """
+    pitches = np.asarray(pitches)
+    histogram = np.bincount(np.round(pitches).astype(np.int64), minlength=NUMBER_OF_PITCHES)
+    reducer['histogram'] += histogram[:NUMBER_OF_PITCHES]
+    mean = pitches.mean()
+    moments = (len(pitches), float(mean), float(((pitches - mean) ** 2).sum()))
+    reducer['n'], reducer['mean'], reducer['m2'] = _merge_moments((reducer['n'], reducer['mean'], reducer['m2']),
+                                                                  moments)
+    add_to_contour(reducer['contour'], times, pitches)
+    reducer['number_of_works'] += 1
+
+
+def merge_reducers(first: dict, second: dict) -> dict:
+    """
+    Merge two reducers with the same contour grid, for example the reducers of the composers of an era.
+    :param first: A reducer, see create_reducer.
+    :param second: A reducer with the same contour grid.
+    :return: The merged reducer.
+    """
+    n, mean, m2 = _merge_moments((first['n'], first['mean'], first['m2']),
+                                 (second['n'], second['mean'], second['m2']))
+    return {
+        'number_of_works': first['number_of_works'] + second['number_of_works'],
+        'histogram': first['histogram'] + second['histogram'],
+        'n': n,
+        'mean': mean,
+        'm2': m2,
+        'contour': merge_contours(first['contour'], second['contour']),
+    }
+
+
+def get_reducer_statistics(reducers: dict) -> dict:
+    """
+    Get the sufficient statistics of the pitches of the groups of some reducers, to use with the tests of significance.
+    :param reducers: A dictionary whose keys are the names of the groups and whose values are their reducers.
+    :return: A dictionary of statistics, see significance.get_group_statistics.
+    """
+    keys = list(reducers)
+    histograms = np.array([reducers[key]['histogram'] for key in keys], dtype=np.int64).reshape(-1, NUMBER_OF_PITCHES)
+    return get_statistics_from_histograms(keys, histograms)
+
+
+@instrumented("corpus_reducers.reduce")
+def reduce_corpus(musician_paths: dict = None, musician_eras: dict = None, workers: int = 1,
+                  backend: str = 'music21', resolution: int = DEFAULT_CONTOUR_RESOLUTION, dtype=np.float64) -> dict:
+    """
+    Reduce the MusicXML files of the corpus per composer and per era, streaming the works so that the memory is
+    bounded by the largest score and the size of the reducers (see iterate_works).
+    The reducer of an era is the merge of the reducers of its composers.
+    :param musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths,
+    all_musician_paths by default.
+    :param musician_eras: A dictionary whose keys are periods and whose values are lists of musician names,
+    era_musician_paths by default.
+    :param workers: The number of worker processes used to parse the files.
+    :param backend: The extraction backend, see corpus_loader.load_file.
+    :param resolution: The number of points of the grid of the contours between 0 and 1.
+    :param dtype: The float type of the running contours.
+    :return: A dictionary with the reducers of the "composers" and of the "eras" (see create_reducer, only the eras
+    with at least one composer of musician_paths), the "works" (composer and relative path of each work) and their
+    "summaries" (structured array of WORK_SUMMARY_DTYPE in the same order, with the index of the composer in
+    musician_paths).
+    """
+    if musician_paths is None:
+        musician_paths = all_musician_paths
+    if musician_eras is None:
+        musician_eras = era_musician_paths
+    composers = list(musician_paths)
+    composer_indexes = {composer: index for index, composer in enumerate(composers)}
+    composer_reducers = {composer: create_reducer(resolution, dtype) for composer in composers}
+
+    works = []
+    summaries = []
+    for composer, relative_path, pitches, times, duration in iterate_works(musician_paths, workers, backend):
+        reducer = composer_reducers[composer]
+        add_work(reducer, pitches, times)
+        histogram = np.bincount(np.round(pitches).astype(np.int64), minlength=NUMBER_OF_PITCHES)[:NUMBER_OF_PITCHES]
+        works.append(os.path.join(composer, relative_path))
+        summaries.append((composer_indexes[composer], len(pitches), pitches.mean(), pitches.std(), pitches.min(),
+                          pitches.max(), get_entropies(histogram[None, :])[0], duration))
+
+    era_reducers = {}
+    for era, musicians in musician_eras.items():
+        members = [composer_reducers[musician] for musician in musicians if musician in composer_reducers]
+        if not members:
+            continue
+        era_reducer = create_reducer(resolution, dtype)
+        for member in members:
+            era_reducer = merge_reducers(era_reducer, member)
+        era_reducers[era] = era_reducer
+
+    return {
+        'composers': composer_reducers,
+        'eras': era_reducers,
+        'works': works,
+        'summaries': np.array(summaries, dtype=WORK_SUMMARY_DTYPE),
+    }
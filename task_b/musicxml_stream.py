@@ -0,0 +1,200 @@
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from task_a.instrumentation import count
+
+STEP_TO_SEMITONE = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+# music21 applies the displayed accidental when the pitch has no <alter>
+ACCIDENTAL_TO_ALTER = {'sharp': 1, 'flat': -1, 'natural': 0, 'double-sharp': 2, 'sharp-sharp': 2, 'flat-flat': -2,
+                       'double-flat': -2, 'quarter-sharp': 0.5, 'quarter-flat': -0.5, 'three-quarters-sharp': 1.5,
+                       'three-quarters-flat': -1.5}
+# MIDI pitch of C4, which music21 gives to a note without a <pitch>
+DEFAULT_PITCH = 60
+# Length of a bar in quarter lengths before the first time signature, as in music21
+DEFAULT_BAR_LENGTH = 4.0
+# Direction types that music21 inserts as elements of the measure
+INSERTED_DIRECTION_TYPES = ('dynamics', 'words', 'rehearsal', 'metronome', 'segno', 'coda')
+
+
+def _text(element, path: str, default=None):
+    """
+    Get the stripped text of a sub element.
+    :param element: The parent element.
+    :param path: The path of the sub element.
+    :param default: The value returned if the sub element is missing or empty.
+    :return: The text of the sub element or the default value.
+    """
+    child = element.find(path)
+    if child is None or child.text is None or not child.text.strip():
+        return default
+    return child.text.strip()
+
+
+def _is_multiple(value: float, unit: float) -> bool:
+    """
+    Check whether a value is a multiple of a unit, up to the tolerance of music21.
+    """
+    return abs(value / unit - round(value / unit)) * unit < 1e-6
+
+
+def _get_measure_shift(length: float, bar_length: float, has_events: bool) -> float:
+    """
+    Get the offset between a measure and the next one, with the rules of the MusicXML parser of music21
+    (MeasureParser.adjustTimeAttributesFromMeasure): the length of the content of the measure, except for a measure
+    overfull by a small irregular amount or an empty measure, which take the length of the time signature.
+    :param length: The length of the content of the measure in quarter lengths.
+    :param bar_length: The length of a bar of the current time signature in quarter lengths.
+    :param has_events: Whether the measure contains any note or rest.
+    :return: The offset of the next measure from this one in quarter lengths.
+    """
+    difference = length - bar_length
+    if difference > 1e-9 and not (difference > 0.5 or _is_multiple(difference, 0.0625)
+                                  or _is_multiple(difference, 1 / 12)):
+        return bar_length
+    if length == 0 and not has_events:
+        return bar_length
+    return length
+
+
+def _get_bar_length(time) -> float:
+    """
+    Get the length of a bar of a time signature.
+    :param time: The <time> element.
+    :return: The length in quarter lengths, None for a time signature without beats (senza misura).
+    """
+    beats = _text(time, 'beats')
+    beat_type = _text(time, 'beat-type')
+    if beats is None or beat_type is None:
+        return None
+    # Composite time signatures such as 3+2/8
+    return sum(float(beat) for beat in beats.split('+')) * 4 / float(beat_type)
+
+
+def _is_inserted_direction(direction) -> bool:
+    """
+    Check whether music21 inserts an element in the measure for a direction (the other directions, such as wedges or
+    pedals, become spanners).
+    :param direction: The <direction> element.
+    :return: True if the direction gives a dynamic, an expression, a metronome mark or a rehearsal mark.
+    """
+    return (any(child.tag in INSERTED_DIRECTION_TYPES for direction_type in direction.findall('direction-type')
+                for child in direction_type)
+            or any('tempo' in sound.attrib for sound in direction.findall('sound')))
+
+
+def _read_measure(measure, divisions: float, bar_length: float, measure_offset: float, notes: list) -> tuple:
+    """
+    Read the single pitched notes of every voice of a measure, as music21 exposes them through
+    `measure.recurse().notes` (chords, rests and unpitched notes are left out). The position in the measure follows
+    the durations of the notes and rests, <backup> and <forward>.
+    :param measure: The <measure> element.
+    :param divisions: The number of divisions per quarter note at the start of the measure.
+    :param bar_length: The length of a bar of the time signature at the start of the measure in quarter lengths.
+    :param measure_offset: The offset of the measure from the start of the part in quarter lengths.
+    :param notes: The list of (onset in quarter lengths, MIDI pitch) of the part, extended in place.
+    :return: A tuple with the number of divisions per quarter note and the length of a bar of the time signature at
+    the end of the measure, and the offset of the next measure from this one (see _get_measure_shift).
+    """
+    elements = list(measure)
+    position = 0.0
+    length = 0.0
+    has_events = False
+    for i, element in enumerate(elements):
+        if element.tag == 'attributes':
+            divisions = float(_text(element, 'divisions', divisions))
+            time = element.find('time')
+            if time is not None:
+                bar_length = _get_bar_length(time) or bar_length
+            continue
+        if element.tag in ('backup', 'forward'):
+            duration = float(_text(element, 'duration', 0)) / divisions
+            position += -duration if element.tag == 'backup' else duration
+            length = max(length, position)
+            continue
+        if element.tag == 'harmony' or (element.tag == 'direction' and _is_inserted_direction(element)):
+            # These elements have no duration but their <offset> can place them after the notes
+            length = max(length, position + float(_text(element, 'offset', 0)) / divisions)
+            continue
+        if element.tag != 'note':
+            continue
+        has_events = True
+        in_chord = element.find('chord') is not None
+        if in_chord:
+            # The other notes of a chord start with its first note, which already moved the position
+            continue
+        onset = position
+        if element.find('grace') is None:
+            position += float(_text(element, 'duration', 0)) / divisions
+            length = max(length, position)
+        next_in_chord = i + 1 < len(elements) and elements[i + 1].tag == 'note' \
+            and elements[i + 1].find('chord') is not None
+        if next_in_chord or element.find('rest') is not None or element.find('unpitched') is not None:
+            continue
+        pitch = element.find('pitch')
+        if pitch is None:
+            # A note without any pitch (for example a tablature note) gets the default pitch of music21
+            midi = DEFAULT_PITCH
+        else:
+            alter = _text(pitch, 'alter')
+            if alter is None:
+                alter = ACCIDENTAL_TO_ALTER.get(_text(element, 'accidental'), 0)
+            midi = (int(_text(pitch, 'octave')) + 1) * 12 + STEP_TO_SEMITONE[_text(pitch, 'step')] + float(alter)
+        notes.append((measure_offset + onset, int(round(midi))))
+    return divisions, bar_length, _get_measure_shift(length, bar_length, has_events)
+
+
+def extract_pitches_and_times(file_path: str) -> dict:
+    """
+    Extract the MIDI pitches and onsets of a MusicXML file without music21, following the rules of music21 for the
+    voices (<backup> and <forward>) and the offsets of the measures, so that the result is that of
+    score_cache.extract_score_features on the scores checked by tests/test_musicxml_stream.py.
+    The file is parsed incrementally and every measure is discarded once read.
+    :param file_path: The path of the MusicXML file.
+    :return: A dictionary with the "pitches" and "times" arrays, see score_cache.extract_score_features.
+    """
+    notes = []
+    divisions = 1.0
+    bar_length = DEFAULT_BAR_LENGTH
+    measure_offset = 0.0
+    context = ET.iterparse(file_path, events=('start', 'end'))
+    for event, element in context:
+        if event == 'start':
+            if element.tag == 'part':
+                divisions = 1.0
+                bar_length = DEFAULT_BAR_LENGTH
+                measure_offset = 0.0
+            continue
+        if element.tag == 'measure':
+            divisions, bar_length, shift = _read_measure(element, divisions, bar_length, measure_offset, notes)
+            measure_offset += shift
+            element.clear()
+        elif element.tag == 'part':
+            element.clear()
+
+    count("files")
+    count("bytes", os.path.getsize(file_path))
+    times = np.array([onset for onset, _ in notes], dtype=np.float64)
+    pitches = np.array([pitch for _, pitch in notes], dtype=np.int16)
+    order = np.lexsort((pitches, times))
+    return {'pitches': pitches[order], 'times': times[order]}
+
+
+def validate_against_music21(path: str) -> list:
+    """
+    Compare the streaming extraction with the music21 extraction for all the MusicXML files of a directory.
+    :param path: the path of the directory.
+    :return: A list of the relative paths of the files whose pitches or times differ.
+    """
+    from task_b.corpus_loader import list_musicxml_files
+    from task_b.score_cache import load_score_features
+
+    mismatches = []
+    for file_path in list_musicxml_files(path):
+        expected = load_score_features(file_path)
+        result = extract_pitches_and_times(file_path)
+        if not (np.array_equal(expected['pitches'], result['pitches'])
+                and np.allclose(expected['times'], result['times'])):
+            mismatches.append(os.path.relpath(file_path, path))
+    return mismatches
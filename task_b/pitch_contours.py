@@ -0,0 +1,116 @@
+from functools import partial
+
+import numpy as np
+
+from task_b.corpus_loader import list_musicxml_files, load_file, map_musicxml_files
+
+DEFAULT_CONTOUR_RESOLUTION = 1000
+
+
+def create_contour(resolution: int = DEFAULT_CONTOUR_RESOLUTION, dtype=np.float64) -> dict:
+    """
+    Create an empty running average pitch contour on a fixed grid of normalized times.
+    :param resolution: The number of points of the grid between 0 and 1.
+    :param dtype: The float type of the running mean and sum of squared deviations (np.float32 halves the memory).
+    :return: A dictionary with the "times" of the grid, the number of works "count", and the running "mean" and
+    "m2" (sum of squared deviations from the mean) of the pitches at each time of the grid.
+    """
+    return {
+        'times': np.linspace(0, 1, resolution),
+        'count': 0,
+        'mean': np.zeros(resolution, dtype=dtype),
+        'm2': np.zeros(resolution, dtype=dtype),
+    }
+
+
+def add_to_contour(contour: dict, times, pitches) -> None:
+    """
+    Add the pitch contour of a work to a running contour (Welford's algorithm), in place.
+    :param contour: The running contour, see create_contour.
+    :param times: The normalized times of the notes of the work.
+    :param pitches: The pitches of the notes of the work.
+    :return: None
+    """
+    values = np.interp(contour['times'], times, pitches).astype(contour['mean'].dtype)
+    contour['count'] += 1
+    delta = values - contour['mean']
+    contour['mean'] += delta / contour['count']
+    contour['m2'] += delta * (values - contour['mean'])
+
+
+def merge_contours(first: dict, second: dict) -> dict:
+    """
+    Merge two running contours on the same grid (parallel form of Welford's algorithm).
+    :param first: A running contour, see create_contour.
+    :param second: A running contour with the same grid.
+    :return: The merged running contour.
+    """
+    count = first['count'] + second['count']
+    if count == 0:
+        return {name: np.copy(value) if isinstance(value, np.ndarray) else value for name, value in first.items()}
+    delta = second['mean'] - first['mean']
+    return {
+        'times': first['times'],
+        'count': count,
+        'mean': first['mean'] + delta * (second['count'] / count),
+        'm2': first['m2'] + second['m2'] + delta ** 2 * (first['count'] * second['count'] / count),
+    }
+
+
+def get_contour_statistics(contour: dict, confidence: float = 0.95) -> dict:
+    """
+    Get the average pitch contour and its confidence band from a running contour.
+    :param contour: The running contour, see create_contour.
+    :param confidence: The level of the confidence band of the mean (Student's t distribution).
+    :return: A dictionary with the "times" of the grid, the "mean" and standard deviation "std" of the pitches
+    at each time, and the "lower" and "upper" bounds of the confidence band (nan with less than two works).
+    """
+    from scipy.stats import t as student_t
+
+    count = contour['count']
+    mean = contour['mean'].astype(np.float64)
+    if count < 2:
+        std = np.full(len(mean), np.nan)
+    else:
+        std = np.sqrt(np.maximum(contour['m2'].astype(np.float64), 0) / (count - 1))
+    margin = student_t.ppf((1 + confidence) / 2, count - 1) * std / np.sqrt(count) if count >= 2 else std
+    return {'times': contour['times'], 'mean': mean, 'std': std, 'lower': mean - margin, 'upper': mean + margin}
+
+
+def get_contour(music_data: dict, resolution: int = DEFAULT_CONTOUR_RESOLUTION, dtype=np.float64) -> dict:
+    """
+    Compute the running pitch contour of the works of a music data dictionary, one work at a time.
+    :param music_data: A dictionary containing normalized time and pitch data for each piece.
+    :param resolution: The number of points of the grid between 0 and 1.
+    :param dtype: The float type of the running statistics.
+    :return: The running contour, see create_contour.
+    """
+    contour = create_contour(resolution, dtype)
+    for data in music_data.values():
+        add_to_contour(contour, data['times'], data['pitches'])
+    return contour
+
+
+def get_contour_from_files(path: str, resolution: int = DEFAULT_CONTOUR_RESOLUTION, dtype=np.float64,
+                           workers: int = 1, backend: str = 'music21') -> dict:
+    """
+    Compute the running pitch contour of all the MusicXML files of a directory, streaming the files so that only
+    the running statistics are kept in memory. The times are normalized as in read_musicxml_and_normalize.
+    Files that fail to parse or contain no notes are skipped.
+    :param path: the path of the directory.
+    :param resolution: The number of points of the grid between 0 and 1.
+    :param dtype: The float type of the running statistics.
+    :param workers: The number of worker processes used to parse the files.
+    :param backend: The extraction backend, see corpus_loader.load_file.
+    :return: The running contour, see create_contour.
+    """
+    contour = create_contour(resolution, dtype)
+    for features, error in map_musicxml_files(partial(load_file, backend=backend), list_musicxml_files(path),
+                                              workers):
+        if error is not None or len(features['times']) == 0:
+            continue
+        times = features['times']
+        total_time = times.max()
+        if total_time > 0:
+            add_to_contour(contour, times / total_time, features['pitches'])
+    return contour
@@ -0,0 +1,142 @@
+import os
+from functools import partial
+
+import numpy as np
+
+from task_b.constants import all_musician_paths, era_musician_paths
+from task_b.corpus_loader import list_musicxml_files, load_file, map_musicxml_files
+from task_b.significance import (NUMBER_OF_PITCHES, get_pairwise_results, get_statistics_from_histograms,
+                                 welch_t_tests)
+
+
+def count_pitches(file_path: str, backend: str = 'music21') -> tuple:
+    """
+    Count the pitches of a MusicXML file.
+    :param file_path: the path of the MusicXML file.
+    :param backend: The extraction backend, see corpus_loader.load_file.
+    :return: A tuple (counts, error) where counts is the array of the number of notes of each MIDI pitch
+    and exactly one of the two is None.
+    """
+    features, error = load_file(file_path, backend)
+    if error is not None:
+        return None, error
+    counts = np.bincount(features['pitches'].astype(np.int64), minlength=NUMBER_OF_PITCHES)
+    return counts[:NUMBER_OF_PITCHES].astype(np.int32), None
+
+
+def build_pitch_count_matrix(musician_paths: dict = None, musician_eras: dict = None, workers: int = 1,
+                             backend: str = 'music21') -> dict:
+    """
+    Build the works x pitches matrix of the number of notes of the corpus, with the composer and era of each work.
+    Only the counts of a work are kept once it is read, so the memory scales with the number of works.
+    Files that fail to parse or contain no notes are reported and skipped.
+    :param musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths,
+    all_musician_paths by default.
+    :param musician_eras: A dictionary whose keys are periods and whose values are lists of musician names,
+    era_musician_paths by default.
+    :param workers: The number of worker processes used to parse the files.
+    :param backend: The extraction backend, see corpus_loader.load_file.
+    :return: A dictionary with the int32 "counts" matrix (one row per work, one column per MIDI pitch), the relative
+    path of each work ("works"), the "composers" and "eras" names, and the index of the composer and of the era
+    (-1 if none) of each work ("work_composer", "work_era").
+    """
+    if musician_paths is None:
+        musician_paths = all_musician_paths
+    if musician_eras is None:
+        musician_eras = era_musician_paths
+    composers = list(musician_paths)
+    eras = list(musician_eras)
+    composer_eras = {musician: eras.index(era) for era, musicians in musician_eras.items() for musician in musicians}
+
+    file_paths = []
+    file_composers = []
+    for composer_index, composer in enumerate(composers):
+        files = list_musicxml_files(musician_paths[composer])
+        file_paths.extend(files)
+        file_composers.extend([composer_index] * len(files))
+
+    rows = []
+    works = []
+    work_composer = []
+    results = map_musicxml_files(partial(count_pitches, backend=backend), file_paths, workers)
+    for file_path, composer_index, (counts, error) in zip(file_paths, file_composers, results):
+        relative_path = os.path.relpath(file_path, musician_paths[composers[composer_index]])
+        if error is not None:
+            print(f"Warning: '{relative_path}' could not be parsed ({error}).")
+            continue
+        if not counts.any():
+            print(f"Warning: '{relative_path}' contains no notes.")
+            continue
+        rows.append(counts)
+        works.append(os.path.join(composers[composer_index], relative_path))
+        work_composer.append(composer_index)
+
+    work_composer = np.array(work_composer, dtype=np.int32)
+    return {
+        'counts': np.array(rows, dtype=np.int32).reshape(-1, NUMBER_OF_PITCHES),
+        'works': works,
+        'composers': composers,
+        'eras': eras,
+        'work_composer': work_composer,
+        'work_era': np.array([composer_eras.get(composer, -1) for composer in composers],
+                             dtype=np.int32)[work_composer] if len(work_composer) else work_composer,
+    }
+
+
+def get_group_counts(matrix: dict, by: str = 'era') -> tuple:
+    """
+    Sum the pitch counts of the works per composer or per era.
+    :param matrix: The pitch count matrix, see build_pitch_count_matrix.
+    :param by: 'composer' or 'era'.
+    :return: A tuple (names, counts) with the names of the groups and the int64 matrix of their pitch counts.
+    """
+    if by not in ('composer', 'era'):
+        raise ValueError(f"Unknown grouping '{by}', expected 'composer' or 'era'")
+    names = matrix[f'{by}s']
+    groups = matrix[f'work_{by}']
+    kept = groups >= 0
+    counts = np.zeros((len(names), NUMBER_OF_PITCHES), dtype=np.int64)
+    np.add.at(counts, groups[kept], matrix['counts'][kept])
+    return names, counts
+
+
+def get_entropies(counts: np.ndarray) -> np.ndarray:
+    """
+    Compute the entropy (in bits) of the pitch distribution of every row of a count matrix.
+    :param counts: A 2D array of pitch counts, one row per work or group.
+    :return: The array of the entropies (nan for an empty row).
+    """
+    from scipy.stats import entropy
+
+    counts = np.atleast_2d(counts)
+    totals = counts.sum(axis=1)
+    result = np.full(len(counts), np.nan)
+    result[totals > 0] = entropy(counts[totals > 0], base=2, axis=1)
+    return result
+
+
+def get_cdf(counts: np.ndarray) -> tuple:
+    """
+    Compute the cumulative distribution of the pitches of the rows of a count matrix taken together.
+    :param counts: A 1D array of pitch counts or a 2D array with one row per work or group.
+    :return: A tuple (pitches, cdf) from the lowest to the highest pitch present.
+    """
+    total = np.asarray(counts).reshape(-1, NUMBER_OF_PITCHES).sum(axis=0)
+    present = np.flatnonzero(total)
+    if len(present) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    pitches = np.arange(present[0], present[-1] + 1)
+    return pitches, np.cumsum(total[pitches]) / total.sum()
+
+
+def compare_groups(matrix: dict, by: str = 'era') -> dict:
+    """
+    Perform the Welch t-tests of the pitches of all the pairs of composers or eras from the count matrix.
+    :param matrix: The pitch count matrix, see build_pitch_count_matrix.
+    :param by: 'composer' or 'era'.
+    :return: A dictionary with the t-test results of each pair of groups, as perform_t_test.
+    """
+    names, counts = get_group_counts(matrix, by)
+    statistics = get_statistics_from_histograms(names, counts)
+    tests = welch_t_tests(statistics)
+    return get_pairwise_results(statistics, {'t-statistic': tests['t-statistic'], 'p-value': tests['p-value']})
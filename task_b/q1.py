@@ -1,7 +1,16 @@
-import music21
+import os
+
+import numpy as np
 import pandas as pd
 from music21.stream import Score
 
+from task_a.instrumentation import instrumented
+from task_b.corpus_loader import list_musicxml_files, load_musicxml_files
+from task_b.score_cache import extract_score_features, load_score_features
+
+# Number of positions of the onset grid per quarter note (multiple of 3 and 4 for triplets and sixteenths)
+ONSET_GRID_RESOLUTION = 12
+
 
 def parse_score_to_dataframe(score: Score) -> pd.DataFrame:
     """
@@ -9,31 +18,38 @@ def parse_score_to_dataframe(score: Score) -> pd.DataFrame:
     :param score: music21 score object
     :return: pandas dataframe
     """
-    rhythm_data_list = []
-    for part_index, part in enumerate(score.parts):
-        clefs = part.getElementsByClass('Clef')
-        clef_name = clefs[0].sign if clefs else f"Part_{part_index + 1}_NoClef"
-
-        for measure in part.getElementsByClass('Measure'):
-            time_signature_str = measure.timeSignature.ratioString if measure.timeSignature else "NoTimeSignature"
-
-            for event in measure.notesAndRests:
-                label = "sounded" if isinstance(event, music21.note.Note) else "unsounded"
-                tie_info = f"tie_{event.tie.type}" if event.tie else "no_tie"
-                # Compute onset
-                global_onset = (measure.number - 1) * measure.barDuration.quarterLength + event.offset
-                rhythm_data_list.append({
-                    'staff': clef_name,
-                    'measure_number': measure.number,
-                    'time_signature': time_signature_str,
-                    'event_type': label,
-                    'onset_in_measure': event.offset,
-                    'onset_in_score': global_onset,
-                    'duration': event.duration.quarterLength,
-                    'tie_info': tie_info
-                })
-
-    return pd.DataFrame(rhythm_data_list)
+    return features_to_dataframe(extract_score_features(score))
+
+
+@instrumented("q1.parse_file_to_dataframe")
+def parse_file_to_dataframe(file_path: str) -> pd.DataFrame:
+    """
+    Parse a MusicXML file into a pandas dataframe, using the cached features of the score if possible
+    :param file_path: path of the MusicXML file
+    :return: pandas dataframe
+    """
+    return features_to_dataframe(load_score_features(file_path))
+
+
+def features_to_dataframe(features: dict) -> pd.DataFrame:
+    """
+    Build the dataframe of notes and rests from the features of a score
+    :param features: features of the score (see score_cache.extract_score_features)
+    :return: pandas dataframe
+    """
+    measure_numbers = features['event_measure_number']
+    onsets_in_measure = features['event_onset_in_measure']
+    return pd.DataFrame({
+        'staff': features['clefs'][features['event_part']],
+        'measure_number': measure_numbers,
+        'time_signature': features['time_signatures'][features['event_time_signature']],
+        'event_type': np.where(features['event_sounded'], "sounded", "unsounded"),
+        'onset_in_measure': onsets_in_measure,
+        # Compute onset from the offset of the measure, which follows the changes of meter and the pickup measures
+        'onset_in_score': features['event_measure_offset'] + onsets_in_measure,
+        'duration': features['event_duration'],
+        'tie_info': features['tie_infos'][features['event_tie_info']],
+    })
 
 
 def extract_onset_in_measure(rhythm_data_list: pd.DataFrame) -> pd.DataFrame:
@@ -44,3 +60,75 @@ def extract_onset_in_measure(rhythm_data_list: pd.DataFrame) -> pd.DataFrame:
     """
     return rhythm_data_list[(rhythm_data_list['event_type'] == "sounded") &
                             (rhythm_data_list['tie_info'] != "tie_stop")]['onset_in_measure']
+
+
+def get_onset_histograms(features: dict, resolution: int = ONSET_GRID_RESOLUTION) -> dict:
+    """
+    Count the onsets of a score on a grid of positions in the measure, per time signature
+    Only the onsets kept by extract_onset_in_measure are counted (sounded and not the end of a tie)
+    :param features: features of the score (see score_cache.extract_score_features)
+    :param resolution: number of grid positions per quarter note
+    :return: dict with time signature as key and the array of counts per grid position as value
+    """
+    tie_stop = np.flatnonzero(features['tie_infos'] == "tie_stop")
+    kept = features['event_sounded'] & ~np.isin(features['event_tie_info'], tie_stop)
+    if not kept.any():
+        return {}
+    positions = np.round(features['event_onset_in_measure'][kept] * resolution).astype(np.int64)
+    time_signatures = features['event_time_signature'][kept].astype(np.int64)
+    length = int(positions.max()) + 1
+    counts = np.bincount(time_signatures * length + positions,
+                         minlength=len(features['time_signatures']) * length).reshape(-1, length)
+    return {str(time_signature): counts[code] for code, time_signature in enumerate(features['time_signatures'])
+            if counts[code].any()}
+
+
+def merge_onset_histograms(histograms: list) -> dict:
+    """
+    Add the onset histograms of several scores (or corpora)
+    :param histograms: list of dict with time signature as key (see get_onset_histograms)
+    :return: dict with time signature as key and the array of counts per grid position as value
+    """
+    result = {}
+    for histogram in histograms:
+        for time_signature, counts in histogram.items():
+            total = result.get(time_signature, np.zeros(0, dtype=np.int64))
+            if len(total) < len(counts):
+                total = np.pad(total, (0, len(counts) - len(total)))
+            total[:len(counts)] += counts
+            result[time_signature] = total
+    return result
+
+
+@instrumented("q1.onset_histograms")
+def get_corpus_onset_histograms(musician_paths: dict, time_signatures: list = None,
+                                resolution: int = ONSET_GRID_RESOLUTION, workers: int = 1) -> dict:
+    """
+    Count the onsets of all the scores of several musicians per time signature, in one pass over the corpus
+    The scores are read through the score cache, so music21 only parses the scores that are not cached yet
+    :param musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths.
+    :param time_signatures: the time signatures to keep (for example ["4/4", "3/4"]), all of them by default
+    :param resolution: number of grid positions per quarter note
+    :param workers: The number of worker processes used to parse the files.
+    :return: A dictionary whose keys are musician names and whose values are dict with time signature as key
+    and the array of counts per grid position as value (merge_onset_histograms merges the musicians of an era)
+    """
+    file_paths = {musician: list_musicxml_files(path) for musician, path in musician_paths.items()}
+    results = iter(load_musicxml_files([file_path for files in file_paths.values() for file_path in files], workers))
+
+    musician_histograms = {}
+    for musician, files in file_paths.items():
+        histograms = []
+        for file_path in files:
+            features, error = next(results)
+            if error is not None:
+                relative_path = os.path.relpath(file_path, musician_paths[musician])
+                print(f"Warning: '{relative_path}' could not be parsed ({error}).")
+                continue
+            histograms.append(get_onset_histograms(features, resolution))
+        histogram = merge_onset_histograms(histograms)
+        if time_signatures is not None:
+            histogram = {time_signature: histogram[time_signature] for time_signature in time_signatures
+                         if time_signature in histogram}
+        musician_histograms[musician] = histogram
+    return musician_histograms
@@ -2,15 +2,25 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from task_a.annotation_cache import ANNOTATION_DTYPE
+from task_a.instrumentation import instrumented
+from task_a.rendering import DEFAULT_MAX_POINTS, decimate, show_or_save
+from task_b.timing_deviations import (NUMBER_OF_PARTS, compute_deviations, get_most_common_meter,
+                                      group_by_position)
 
+
+@instrumented("q1b.get_rawdata")
 def get_rawdata(path: str) -> pd.DataFrame:
     """
     Read the data from the path and return it as a DataFrame.
     :param path: str
-    :return: pd.DataFrame
+    :return: pd.DataFrame with the "start" and "end" times, the beat type "b" and the "meter" (NaN on the lines
+    where it is not given)
     """
     scores = pd.read_table(path, sep='\t', names=["start", "end", "b"])
-    scores["b"] = scores["b"].apply(lambda x: x.split(",")[0])
+    labels = scores["b"].str.split(",", expand=True)
+    scores["b"] = labels[0]
+    scores["meter"] = labels[1] if 1 in labels else np.nan
     return scores
 
 
@@ -20,64 +30,116 @@ def get_duration(score: pd.DataFrame) -> list:
     :param score:
     :return:
     """
-    return [score["start"][i + 1] - score["start"][i] for i in range(len(score) - 1)]
+    return np.diff(score["start"].to_numpy()).tolist()
 
 
-def violin_plot_each_part(scores: pd.DataFrame, original_scores: pd.DataFrame, artist: str) -> None:
+def dataframe_to_annotations(scores: pd.DataFrame) -> dict:
     """
-    Plot the distribution of sound duration for each part.
-    :param scores: pd.DataFrame
-    :param original_scores: pd.DataFrame
+    Convert the DataFrame of an annotation file to the parsed annotations of annotation_cache.load_annotations.
+    :param scores: pd.DataFrame (see get_rawdata)
+    :return: dict with the structured array of the beats and the vocabularies of the codes
+    """
+    beat_types, beat_type_vocabulary = pd.factorize(scores["b"])
+    meters, meter_vocabulary = pd.factorize(scores["meter"] if "meter" in scores else pd.Series(np.nan, scores.index))
+    beats = np.zeros(len(scores), dtype=ANNOTATION_DTYPE)
+    beats["onset"] = scores["start"].to_numpy()
+    beats["beat_type"] = beat_types
+    beats["meter"] = meters
+    beats["key"] = -1
+    return {"beats": beats, "beat_types": list(beat_type_vocabulary), "meters": list(meter_vocabulary), "keys": []}
+
+
+def get_deviations(scores: pd.DataFrame, original_scores: pd.DataFrame) -> dict:
+    """
+    Compute the timing deviations of a performance from its score (see timing_deviations.compute_deviations).
+    :param scores: pd.DataFrame of the performed annotations
+    :param original_scores: pd.DataFrame of the score annotations
+    :return: dict of arrays with one value per beat and the list of the "meters"
+    """
+    annotations = dataframe_to_annotations(original_scores)
+    return {**compute_deviations(annotations, scores["start"].to_numpy()), "meters": annotations["meters"]}
+
+
+@instrumented("plotting")
+def violin_plot_deviations(deviations: dict, artist: str, meter: str = None, output_path: str = None) -> None:
+    """
+    Plot the distribution of the timing deviations for each position in the bar, over the whole performances and
+    for each part of them.
+    :param deviations: The deviations of one or several performances (see timing_deviations.get_composer_deviations)
     :param artist: str
+    :param meter: The meter of the bars, the most common one by default
+    :param output_path: path of the image file to write (the figure of the parts gets the suffix "_1"),
+    None to show the figures
     :return: None
     """
-    list_original = get_duration(original_scores)
-    list_db_b_b_ = get_duration(scores)
-    list_db_b_b = []
-    for i in range(0, len(list_db_b_b_), 3):
-        try:
-            tmp_list = [list_db_b_b_[i] - list_original[i], list_db_b_b_[i + 1] - list_original[i + 1],
-                        list_db_b_b_[i + 2] - list_original[i + 2]]
-            list_db_b_b.append(tmp_list)
-        except IndexError:
-            pass
-    x, y, z = zip(*list_db_b_b)
-    list_labels = ["db", "2b", "3b"]
-    dividing_point = [0, len(z) // 4, len(z) // 4 * 2, len(z) // 4 * 3, len(z)]
-    fig, ax = plt.subplots()
+    if meter is None:
+        meter = get_most_common_meter(deviations)
+    list_labels, groups = group_by_position(deviations, meter)
+    whole_fig, ax = plt.subplots()
     ax.set_ylim([-0.5, 0.5])
     ax.set_title(f"Distribution of sound duration by {artist}")
     ax.set_ylabel("shorter        -        original        -        longer")
     ax.set_xticks(np.arange(1, len(list_labels) + 1), labels=list_labels)
-    ax.violinplot([list(x), list(y), list(z)])
-    fig, ax = plt.subplots(1, len(dividing_point) - 1, figsize=(20, 5))
-    for i in range(len(dividing_point) - 1):
-        list_all = [list(x)[dividing_point[i]:dividing_point[i + 1]],
-                    list(y)[dividing_point[i]:dividing_point[i + 1]],
-                    list(z)[dividing_point[i]:dividing_point[i + 1]]]
+    # The axis stays empty when no beat of the meter is kept
+    if groups:
+        ax.violinplot(groups)
+    fig, ax = plt.subplots(1, NUMBER_OF_PARTS, figsize=(20, 5))
+    for i in range(NUMBER_OF_PARTS):
+        part_labels, part_groups = group_by_position(deviations, meter, part=i)
         ax[i].set_ylim([-0.5, 0.5])
-        ax[i].violinplot(list_all)
-        ax[i].set_xticks(np.arange(1, len(list_labels) + 1))
-        ax[i].set_xticklabels(list_labels)
-        ax[i].set_title(f"distribution in {i + 1} / 4 part by {artist}")
+        if part_groups:
+            ax[i].violinplot(part_groups)
+        ax[i].set_xticks(np.arange(1, len(part_labels) + 1))
+        ax[i].set_xticklabels(part_labels)
+        ax[i].set_title(f"distribution in {i + 1} / {NUMBER_OF_PARTS} part by {artist}")
         ax[i].set_ylabel("shorter        -        original        -        longer")
 
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path, [whole_fig, fig])
 
 
-def plot_third_part(scores: pd.DataFrame, original: pd.DataFrame) -> None:
+def violin_plot_each_part(scores: pd.DataFrame, original_scores: pd.DataFrame, artist: str,
+                          output_path: str = None) -> None:
     """
-    Plot the duration of the third part.
+    Plot the distribution of sound duration for each part.
     :param scores: pd.DataFrame
-    :param original: pd.DataFrame
+    :param original_scores: pd.DataFrame
+    :param artist: str
+    :param output_path: path of the image file to write (the figure of the parts gets the suffix "_1"),
+    None to show the figures
+    :return: None
+    """
+    violin_plot_deviations(get_deviations(scores, original_scores), artist, output_path=output_path)
+
+
+@instrumented("plotting")
+def plot_part_deviations(deviations: dict, part: int = 2, output_path: str = None,
+                         max_points: int = DEFAULT_MAX_POINTS) -> None:
+    """
+    Plot the timing deviations of one part of the performances against the elapsed time, one curve per performance.
+    :param deviations: The deviations of one or several performances (see timing_deviations.get_composer_deviations)
+    :param part: The index of the part, from 0
+    :param output_path: path of the image file to write, None to show the figure
+    :param max_points: maximum number of points drawn per curve (min/max decimation), None to draw all of them
     :return: None
     """
-    list_db_b_b_ = get_duration(scores)
-    list_original = get_duration(original)
-    list_db_b_b = [list_db_b_b_[i] - list_original[i] for i in range(len(list_db_b_b_))]
-    part_length = len(list_db_b_b) // 4
-    plt.plot(list(scores["start"][part_length * 2:part_length * 3]), list_db_b_b[part_length * 2:part_length * 3])
+    offsets = deviations.get("offsets", [0, len(deviations["deviation"])])
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        selected = np.flatnonzero(deviations["part"][start:end] == part) + start
+        plt.plot(*decimate(deviations["onset"][selected], deviations["deviation"][selected], max_points))
     plt.xlabel("Elapsed time")
     plt.ylabel("Duration compared to original scores")
-    plt.show()
+    show_or_save(output_path)
+
+
+def plot_third_part(scores: pd.DataFrame, original: pd.DataFrame, output_path: str = None,
+                    max_points: int = DEFAULT_MAX_POINTS) -> None:
+    """
+    Plot the duration of the third part.
+    :param scores: pd.DataFrame
+    :param original: pd.DataFrame
+    :param output_path: path of the image file to write, None to show the figure
+    :param max_points: maximum number of points drawn (min/max decimation), None to draw all of them
+    :return: None
+    """
+    plot_part_deviations(get_deviations(scores, original), 2, output_path, max_points)
@@ -2,153 +2,172 @@ import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-from music21 import converter
-from scipy.stats import entropy
-from scipy.stats import ttest_ind
 
+from task_a.instrumentation import count, instrumented
+from task_a.rendering import DEFAULT_MAX_POINTS, decimate, render_figures, show_or_save
+from task_b.corpus_loader import list_musicxml_files, load_musicxml_files
+from task_b.corpus_reducers import iterate_works
+from task_b.pitch_contours import DEFAULT_CONTOUR_RESOLUTION, get_contour, get_contour_statistics
+from task_b.pitch_counts import get_cdf, get_entropies
+from task_b.significance import get_group_statistics, get_pairwise_results, welch_t_tests
 
-def read_musicxml_and_normalize(path: str) -> dict:
+# Above this number of pieces, plot_pitch_contours does not draw the legend
+MAX_LEGEND_ENTRIES = 30
+
+
+def read_musicxml_and_normalize(path: str, workers: int = 1, backend: str = 'music21') -> dict:
     """
     Reads a MusicXML file and returns normalized time and pitch data.
     :param path: the path or directory of the MusicXML file.
+    :param workers: The number of worker processes used to parse the files, 1 parses them in the current process.
+    :param backend: 'music21' to parse the scores with music21 (cached), or 'stream' to read the pitches and times
+    directly from the XML, which gives the same data much faster.
     :return: A dictionary containing music data, with keys being relative paths to files and
     values being dictionaries containing normalized time and pitch.
     """
-    music_data = {}
-    for dir_path, _, filenames in os.walk(path):
-        for filename in filenames:
-            if filename.endswith('.musicxml'):
-                file_path = os.path.join(dir_path, filename)
-                relative_path = os.path.relpath(file_path, path)
-
-                score = converter.parse(file_path)
-
-                pitches = []
-                times = []
-                current_time = 0.0
+    return read_musicians_musicxml_and_normalize({None: path}, workers, backend)[None]
 
-                for part in score.parts:
-                    for measure in part.getElementsByClass('Measure'):
-                        for note in measure.notes:
-                            if note.isNote:
-                                pitches.append(note.pitch.midi)
-                                times.append(current_time)
-                                current_time += note.duration.quarterLength
 
-                total_time = max(times) if times else 1
-                if total_time > 0:
-                    normalized_times = [t / total_time for t in times]
-                    music_data[relative_path] = {"pitches": pitches, "times": normalized_times}
-                else:
-                    print(f"Warning: '{relative_path}' contains no notes.")
-    return music_data
-
-
-def plot_pitch_contours(music_data: dict, title: str = "Normalized Time Pitch Contour") -> None:
+@instrumented("q2.read")
+def read_musicians_musicxml_and_normalize(musician_paths: dict, workers: int = 1, backend: str = 'music21') -> dict:
+    """
+    Reads the MusicXML files of several musicians, distributing all the files to the same pool of workers.
+    Files that fail to parse are reported and skipped.
+    :param musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths.
+    :param workers: The number of worker processes used to parse the files, 1 parses them in the current process.
+    :param backend: The extraction backend, see read_musicxml_and_normalize.
+    :return: A dictionary whose keys are musician names and whose values are the corresponding
+    dictionary of music data (see read_musicxml_and_normalize).
+    """
+    file_paths = {musician: list_musicxml_files(path) for musician, path in musician_paths.items()}
+    results = iter(load_musicxml_files([file_path for files in file_paths.values() for file_path in files], workers,
+                                       backend=backend))
+
+    musician_data = {}
+    for musician, files in file_paths.items():
+        music_data = {}
+        for file_path in files:
+            features, error = next(results)
+            relative_path = os.path.relpath(file_path, musician_paths[musician])
+            if error is not None:
+                print(f"Warning: '{relative_path}' could not be parsed ({error}).")
+                continue
+
+            pitches = features['pitches'].tolist()
+            count("notes", len(pitches))
+            times = features['times'].tolist()
+
+            total_time = max(times) if times else 1
+            if total_time > 0:
+                normalized_times = [t / total_time for t in times]
+                music_data[relative_path] = {"pitches": pitches, "times": normalized_times}
+            else:
+                print(f"Warning: '{relative_path}' contains no notes.")
+        musician_data[musician] = music_data
+    return musician_data
+
+
+@instrumented("plotting")
+def plot_pitch_contours(music_data: dict, title: str = "Normalized Time Pitch Contour", output_path: str = None,
+                        max_points: int = DEFAULT_MAX_POINTS, max_legend_entries: int = MAX_LEGEND_ENTRIES) -> None:
     """
     Plots the pitch contour of given musical data.
     :param music_data: A dictionary containing the music data to plot.
     :param title: The title of the plot.
+    :param output_path: The path of the image file to write, None to show the plot.
+    :param max_points: The maximum number of points drawn per piece (min/max decimation), None to draw every note.
+    :param max_legend_entries: The legend is only drawn up to this number of pieces.
     :return: None
     """
     plt.figure(figsize=(30, 10))
 
     for key, data in music_data.items():
-        plt.plot(data["times"], data["pitches"], linestyle='-', label=key)
+        plt.plot(*decimate(data["times"], data["pitches"], max_points), linestyle='-', label=key)
 
     plt.title(title)
     plt.xlabel('Normalized Time')
     plt.ylabel('Pitch (MIDI Note Number)')
-    plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
+    if len(music_data) <= max_legend_entries:
+        plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
 
 
-def plot_average_pitch_contours(music_data: dict, title: str = "Normalized Average Time Pitch Contour"):
+@instrumented("plotting")
+def plot_average_pitch_contours(music_data: dict, title: str = "Normalized Average Time Pitch Contour",
+                                resolution: int = DEFAULT_CONTOUR_RESOLUTION, confidence: float = None,
+                                output_path: str = None):
     """
     Plots the average pitch profile of given music data.
     :param music_data: A dictionary containing normalized time and pitch data for each piece.
     :param title: The title of the plot.
+    :param resolution: The number of points of the common normalized timeline.
+    :param confidence: If given, the level of the confidence band of the average drawn around it.
+    :param output_path: The path of the image file to write, None to show the plot.
     """
-    # Combine pitch data for all tracks into one list
-    all_pitches = [data['pitches'] for data in music_data.values()]
-    all_times = [data['times'] for data in music_data.values()]
-
-    # Align all time and pitch data to the same timeline
-    # Here you need to create a timeline that is common to all tracks
-    # Assume that all tracks are already processed with the same normalized time length
-    max_time_points = max(len(times) for times in all_times)
-    common_time_line = np.linspace(0, 1, max_time_points)
-
-    pitch_values_at_common_times = np.zeros((len(all_pitches), max_time_points))
-
-    # Interpolate
-    for i, (times, pitches) in enumerate(zip(all_times, all_pitches)):
-        pitch_values_at_common_times[i] = np.interp(common_time_line, times, pitches)
-
-    # Calculate the average pitch at each time point on a universal timeline
-    average_pitches = np.mean(pitch_values_at_common_times, axis=0)
+    # Average the works one at a time on a common timeline of fixed resolution
+    statistics = get_contour_statistics(get_contour(music_data, resolution), confidence or 0.95)
 
     plt.figure(figsize=(12, 6))
-    plt.plot(common_time_line, average_pitches, label="Average Pitch Contour")
+    plt.plot(statistics['times'], statistics['mean'], label="Average Pitch Contour")
+    if confidence is not None:
+        plt.fill_between(statistics['times'], statistics['lower'], statistics['upper'], alpha=0.3,
+                         label=f"{confidence:.0%} Confidence Band")
     plt.title(title)
     plt.xlabel('Normalized Time')
     plt.ylabel('Pitch (MIDI Note Number)')
     plt.legend()
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
 
 
-def plot_cdf(music_data: dict, title: str = "CDF of Pitch Frequencies") -> None:
+@instrumented("plotting")
+def plot_cdf(music_data: dict, title: str = "CDF of Pitch Frequencies", output_path: str = None) -> None:
     """
     Plot the pitch's CDF。
 
     :param music_data: A dictionary containing normalized time and pitch data for each piece.
     :param title: The title of the plot.
+    :param output_path: The path of the image file to write, None to show the plot.
     :return: None
     """
-    # Summarize the pitches of all works into a list
-    all_pitches = [pitch for data in music_data.values() for pitch in data['pitches']]
-
-    # calculate the pdf
-    values, base = np.histogram(all_pitches, bins=range(min(all_pitches), max(all_pitches) + 1), density=True)
-    cumulative = np.cumsum(values)
+    # Summarize the pitches of all works into their pitch counts
+    pitches, cumulative = get_cdf(get_group_statistics(music_data)['histograms'])
 
     plt.figure(figsize=(10, 7))
-    plt.plot(base[:-1], cumulative, c='blue')
+    plt.plot(pitches, cumulative, c='blue')
     plt.title(title)
     plt.xlabel('Pitch (MIDI Note Number)')
     plt.ylabel('CDF')
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
 
 
-def plot_all_average_pitch_contours(musician_data: dict, title: str = "Normalized Average Time Pitch Contour"):
+@instrumented("plotting")
+def plot_all_average_pitch_contours(musician_data: dict, title: str = "Normalized Average Time Pitch Contour",
+                                    resolution: int = DEFAULT_CONTOUR_RESOLUTION, confidence: float = None,
+                                    output_path: str = None):
     """
     Plot the average pitch profile of multiple musicians.
     :param musician_data: A dictionary whose keys are musician names and whose values are the corresponding
     dictionary of music data.
     :param title: The title of the chart.
+    :param resolution: The number of points of the common normalized timeline.
+    :param confidence: If given, the level of the confidence bands drawn around the averages.
+    :param output_path: The path of the image file to write, None to show the plot.
     :return: None
     """
     plt.figure(figsize=(12, 6))
 
     for musician, music_data in musician_data.items():
-        all_pitches = [data['pitches'] for data in music_data.values()]
-        all_times = [data['times'] for data in music_data.values()]
-        max_time_points = max(len(times) for times in all_times)
-        common_time_line = np.linspace(0, 1, max_time_points)
-        pitch_values_at_common_times = np.zeros((len(all_pitches), max_time_points))
-
-        for i, (times, pitches) in enumerate(zip(all_times, all_pitches)):
-            pitch_values_at_common_times[i] = np.interp(common_time_line, times, pitches)
-
-        average_pitches = np.mean(pitch_values_at_common_times, axis=0)
-
-        plt.plot(common_time_line, average_pitches, label=f"{musician} Average Pitch Contour")
+        statistics = get_contour_statistics(get_contour(music_data, resolution), confidence or 0.95)
+        line, = plt.plot(statistics['times'], statistics['mean'], label=f"{musician} Average Pitch Contour")
+        if confidence is not None:
+            plt.fill_between(statistics['times'], statistics['lower'], statistics['upper'], color=line.get_color(),
+                             alpha=0.2)
 
     plt.title(title)
     plt.xlabel('Normalized Time')
@@ -156,78 +175,100 @@ def plot_all_average_pitch_contours(musician_data: dict, title: str = "Normalize
     plt.legend()
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
 
 
-def plot_musician_contours_for_era(musician_paths, era_title: str) -> None:
+def plot_musician_contours_for_era(musician_paths, era_title: str, workers: int = 1, backend: str = 'music21',
+                                   output_path: str = None) -> None:
     """
     Plot the average pitch profile of multiple musicians for a given era.
     :param musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths.
     :param era_title: The title of the era.
+    :param workers: The number of worker processes used to parse the files.
+    :param backend: The extraction backend, see read_musicxml_and_normalize.
+    :param output_path: The path of the image file to write, None to show the plot.
     :return: None
     """
-    musician_data = {musician: read_musicxml_and_normalize(path) for musician, path in musician_paths.items()}
-    plot_all_average_pitch_contours(musician_data, f"Normalized Time Pitch Contour for {era_title} Musicians")
+    musician_data = read_musicians_musicxml_and_normalize(musician_paths, workers, backend)
+    plot_all_average_pitch_contours(musician_data, f"Normalized Time Pitch Contour for {era_title} Musicians",
+                                    output_path=output_path)
+
+
+def render_era_contours(all_musician_paths: dict, era_musician_paths: dict, output_folder: str, workers: int = 1,
+                        backend: str = 'music21', extension: str = 'png'):
+    """
+    Write the average pitch contour figure of every era to a file, one era per worker process.
+    :param all_musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths.
+    :param era_musician_paths: A dictionary whose keys are periods and whose values are lists of musician names.
+    :param output_folder: The folder of the image files, named after the eras.
+    :param workers: The number of worker processes.
+    :param backend: The extraction backend, see read_musicxml_and_normalize.
+    :param extension: The image format of the files.
+    :return: A generator of tuples (output path, error or None), see rendering.render_figures.
+    """
+    jobs = [(plot_musician_contours_for_era,
+             ({musician: all_musician_paths[musician] for musician in musicians if musician in all_musician_paths},
+              era),
+             {'backend': backend, 'output_path': os.path.join(output_folder, f"{era}.{extension}")})
+            for era, musicians in era_musician_paths.items()]
+    return render_figures(jobs, workers)
 
 
+@instrumented("q2.entropy")
 def calculate_entropy(music_data: dict) -> tuple:
     """
     Calculate the entropy of pitch distributions for each work or composer.
     :param music_data: A dictionary with keys representing different works or composers and values containing lists of pitches.
     :return: A tuple containing entropy values for each work or composer and average entropy.
     """
-    entropy_results = {}
-    entropy_values = []
-    for key, data in music_data.items():
-        pitch_counts = np.bincount(data['pitches'])
-        entropy_results[key] = entropy(pitch_counts, base=2)
-        entropy_values.append(entropy_results[key])
+    entropy_values = get_entropies(get_group_statistics(music_data)['histograms']).tolist()
     # average entropy for all works
     average_entropy = np.mean(entropy_values) if entropy_values else None
 
     return entropy_values, average_entropy
 
 
-def merge_music_data_by_era(all_musician_paths: dict, era_musician_paths: dict) -> dict:
+def merge_music_data_by_era(all_musician_paths: dict, era_musician_paths: dict, workers: int = 1,
+                            backend: str = 'music21') -> dict:
     """
     Merge the musical data of musicians in the same period.
+    The works are streamed (see corpus_reducers.iterate_works), but the merged lists still hold all the notes of the
+    corpus: corpus_reducers.reduce_corpus computes the histograms, moments and contours of the eras in bounded memory.
     :param all_musician_paths: A dictionary whose keys are musician names and whose values are the corresponding paths.
     :param era_musician_paths: A dictionary whose keys are periods and whose values are lists of musician names.
+    :param workers: The number of worker processes used to parse the files.
+    :param backend: The extraction backend, see read_musicxml_and_normalize.
     :return: A dictionary containing merged musical data for each period.
     """
-    # Create a new dict to conserve merged musical data
-    merged_music_data_by_era = {}
-    # Traversal every period
+    # Read the musicians of all the periods at once so that the workers share the whole corpus, one work at a time
+    musician_eras = {}
     for era, musicians in era_musician_paths.items():
-        # Create a list to conserve the pitch data for all musicians in this period
-        merged_pitches = []
-        merged_times = []
-
         for musician in musicians:
             if musician in all_musician_paths:
-                path = all_musician_paths[musician]
-                music_data = read_musicxml_and_normalize(path)
-                for work, data in music_data.items():
-                    merged_pitches.extend(data['pitches'])
-                    merged_times.extend(data['times'])
-
-        merged_music_data_by_era[era] = {'pitches': merged_pitches, 'times': merged_times}
+                musician_eras.setdefault(musician, []).append(era)
+    # Create a new dict to conserve merged musical data
+    merged_music_data_by_era = {era: {'pitches': [], 'times': []} for era in era_musician_paths}
+    for musician, _, pitches, times, _ in iterate_works(
+            {musician: all_musician_paths[musician] for musician in musician_eras}, workers, backend):
+        pitches = pitches.tolist()
+        times = times.tolist()
+        for era in musician_eras[musician]:
+            merged_music_data_by_era[era]['pitches'].extend(pitches)
+            merged_music_data_by_era[era]['times'].extend(times)
 
     return merged_music_data_by_era
 
 
+@instrumented("q2.t_test")
 def perform_t_test(music_data: dict) -> dict:
     """
     Perform t-tests to assess the significance of differences in pitch distributions between different works
-    or composers.
+    or composers. The Welch t-tests of all the pairs are computed at once from the pitch histograms of the groups
+    (see significance.welch_t_tests).
     :param music_data: A dictionary with keys representing different works or
     composers and values containing lists of pitches.
     :return: A dictionary with the t-test results, including t-values and p-values.
     """
-    results = {}
-    keys = list(music_data.keys())
-    for i in range(len(keys)):
-        for j in range(i + 1, len(keys)):
-            t_stat, p_val = ttest_ind(music_data[keys[i]]['pitches'], music_data[keys[j]]['pitches'], equal_var=False)
-            results[(keys[i], keys[j])] = {'t-statistic': t_stat, 'p-value': p_val}
-    return results
+    statistics = get_group_statistics(music_data)
+    tests = welch_t_tests(statistics)
+    return get_pairwise_results(statistics, {'t-statistic': tests['t-statistic'], 'p-value': tests['p-value']})
@@ -0,0 +1,179 @@
+import hashlib
+import os
+
+import numpy as np
+
+from task_a.annotation_cache import get_cache_root
+from task_a.instrumentation import count, stage
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump this when the extracted features change, so that the old cache entries are not used anymore
+FEATURES_VERSION = 4
+
+
+def extract_score_features(score) -> dict:
+    """
+    Extract the features used by the analyses of task_b from a music21 score.
+    :param score: music21 score object
+    :return: A dictionary of arrays: the pitches and onsets of the single notes (not in chords) of every voice of every
+    part, in quarter lengths from the start of the score and sorted by onset then pitch ("pitches", "times"),
+    the table of notes and rests per measure ("event_*" columns) and the vocabularies of the coded columns.
+    """
+    import music21
+
+    pitches = []
+    times = []
+    for part in score.parts:
+        for measure in part.getElementsByClass('Measure'):
+            measure_offset = float(measure.offset)
+            # The notes of all the voices, a measure with several voices keeps them in Voice objects
+            for note in measure.recurse().notes:
+                if note.isNote:
+                    pitches.append(note.pitch.midi)
+                    times.append(measure_offset + float(note.getOffsetInHierarchy(measure)))
+    pitches = np.array(pitches, dtype=np.int16)
+    times = np.array(times, dtype=np.float64)
+    order = np.lexsort((pitches, times))
+
+    clefs = []
+    time_signatures = {}
+    ties = {}
+    events = {'part': [], 'measure_number': [], 'time_signature': [], 'sounded': [], 'tie_info': [],
+              'onset_in_measure': [], 'measure_offset': [], 'bar_duration': [], 'duration': []}
+    for part_index, part in enumerate(score.parts):
+        part_clefs = part.getElementsByClass('Clef')
+        clefs.append(part_clefs[0].sign if part_clefs else f"Part_{part_index + 1}_NoClef")
+
+        # music21 sets the time signature only on the measure where it is written, it holds until the next one
+        time_signature_str = "NoTimeSignature"
+        for measure in part.getElementsByClass('Measure'):
+            if measure.timeSignature:
+                time_signature_str = measure.timeSignature.ratioString
+            time_signature_code = time_signatures.setdefault(time_signature_str, len(time_signatures))
+            bar_duration = float(measure.barDuration.quarterLength)
+            measure_offset = float(measure.offset)
+
+            for event in measure.notesAndRests:
+                tie_info = f"tie_{event.tie.type}" if event.tie else "no_tie"
+                events['part'].append(part_index)
+                events['measure_number'].append(measure.number)
+                events['time_signature'].append(time_signature_code)
+                events['sounded'].append(isinstance(event, music21.note.Note))
+                events['tie_info'].append(ties.setdefault(tie_info, len(ties)))
+                events['onset_in_measure'].append(float(event.offset))
+                events['measure_offset'].append(measure_offset)
+                events['bar_duration'].append(bar_duration)
+                events['duration'].append(float(event.duration.quarterLength))
+
+    return {
+        'pitches': pitches[order],
+        'times': times[order],
+        'event_part': np.array(events['part'], dtype=np.int16),
+        'event_measure_number': np.array(events['measure_number'], dtype=np.int32),
+        'event_time_signature': np.array(events['time_signature'], dtype=np.int16),
+        'event_sounded': np.array(events['sounded'], dtype=bool),
+        'event_tie_info': np.array(events['tie_info'], dtype=np.int8),
+        'event_onset_in_measure': np.array(events['onset_in_measure'], dtype=np.float64),
+        'event_measure_offset': np.array(events['measure_offset'], dtype=np.float64),
+        'event_bar_duration': np.array(events['bar_duration'], dtype=np.float64),
+        'event_duration': np.array(events['duration'], dtype=np.float64),
+        'clefs': np.array(clefs, dtype=str),
+        'time_signatures': np.array(list(time_signatures), dtype=str),
+        'tie_infos': np.array(list(ties), dtype=str),
+    }
+
+
+def get_cache_dir() -> str:
+    """
+    Get the default directory of the score cache.
+    :return: The "scores" folder of the cache root, read at each call (see annotation_cache.get_cache_root).
+    """
+    return os.path.join(get_cache_root(), "scores")
+
+
+def get_content_hash(file_path: str) -> str:
+    """
+    Hash the content of a file together with the version of the extracted features.
+    :param file_path: The path of the file.
+    :return: The hexadecimal digest used as cache key.
+    """
+    digest = hashlib.sha256(f"features-v{FEATURES_VERSION}".encode("utf-8"))
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def evict(cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    """
+    Remove the least recently used cache entries until the cache is smaller than max_bytes.
+    :param cache_dir: The directory of the cache, get_cache_dir() by default.
+    :param max_bytes: The maximum total size of the cache in bytes.
+    :return: None
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.npz'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def load_score_features(file_path: str, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                        use_cache: bool = True) -> dict:
+    """
+    Get the features of a MusicXML file, parsing it with music21 only if its content is not in the cache.
+    :param file_path: The path of the MusicXML file.
+    :param cache_dir: The directory of the cache, get_cache_dir() by default.
+    :param max_bytes: The maximum total size of the cache in bytes.
+    :param use_cache: If False, the score is always parsed and the cache is not written.
+    :return: A dictionary of arrays, see extract_score_features.
+    """
+    from music21 import converter
+
+    count("files")
+    count("bytes", os.path.getsize(file_path))
+    if not use_cache:
+        with stage("music21_parsing"):
+            return extract_score_features(converter.parse(file_path))
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    cache_path = os.path.join(cache_dir, get_content_hash(file_path) + '.npz')
+    try:
+        with np.load(cache_path, allow_pickle=False) as cached:
+            features = dict(cached)
+    except (OSError, ValueError):
+        features = None
+    if features is not None:
+        # Mark the entry as recently used for the eviction
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        count("cache_hits")
+        return features
+
+    count("cache_misses")
+    with stage("music21_parsing"):
+        features = extract_score_features(converter.parse(file_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **features)
+    os.replace(tmp_path, cache_path)
+    evict(cache_dir, max_bytes)
+    return features
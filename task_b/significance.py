@@ -0,0 +1,194 @@
+import numpy as np
+
+# MIDI pitches are integers in [0, 128), so a pitch histogram holds all the information of a pitch list
+NUMBER_OF_PITCHES = 128
+PITCHES = np.arange(NUMBER_OF_PITCHES, dtype=np.float64)
+CORRECTION_METHODS = ('bonferroni', 'holm', 'fdr_bh')
+
+
+def get_group_statistics(music_data: dict) -> dict:
+    """
+    Compute the sufficient statistics of the pitches of every group (work, composer or era) in one pass.
+    :param music_data: A dictionary with keys representing different works or composers and values containing
+    lists of pitches.
+    :return: A dictionary with the "keys" of the groups and, in the same order, the pitch "histograms"
+    (one row per group), the number of pitches "n", the "mean" and the unbiased "variance" of the pitches.
+    """
+    keys = list(music_data.keys())
+    histograms = np.zeros((len(keys), NUMBER_OF_PITCHES), dtype=np.int64)
+    for i, key in enumerate(keys):
+        pitches = np.asarray(music_data[key]['pitches'], dtype=np.int64)
+        histograms[i] = np.bincount(pitches, minlength=NUMBER_OF_PITCHES)[:NUMBER_OF_PITCHES]
+    return get_statistics_from_histograms(keys, histograms)
+
+
+def get_statistics_from_histograms(keys: list, histograms: np.ndarray) -> dict:
+    """
+    Compute the number, mean and variance of the pitches of every group from their pitch histograms.
+    :param keys: The keys of the groups.
+    :param histograms: A 2D array with the pitch histogram of each group as row.
+    :return: A dictionary of statistics, see get_group_statistics.
+    """
+    histograms = np.asarray(histograms, dtype=np.int64)
+    n = histograms.sum(axis=1)
+    mean = np.divide(histograms @ PITCHES, n, out=np.full(len(n), np.nan), where=n > 0)
+    # Two-pass variance around the mean of each group
+    squared_deviations = (PITCHES[None, :] - np.nan_to_num(mean)[:, None]) ** 2
+    m2 = (histograms * squared_deviations).sum(axis=1)
+    variance = np.divide(m2, n - 1, out=np.full(len(n), np.nan), where=n > 1)
+    return {'keys': keys, 'histograms': histograms, 'n': n, 'mean': mean, 'variance': variance}
+
+
+def welch_t_tests(statistics: dict) -> dict:
+    """
+    Perform the Welch t-tests of all the pairs of groups at once from their sufficient statistics.
+    The results are the same as scipy.stats.ttest_ind(equal_var=False) on the raw pitch lists.
+    :param statistics: The statistics of the groups, see get_group_statistics.
+    :return: A dictionary of square matrices indexed like statistics["keys"]: "t-statistic" (group of the row minus
+    group of the column), "degrees_of_freedom" and two-sided "p-value" (nan on the diagonal).
+    """
+    from scipy.stats import t as student_t
+
+    n = statistics['n'].astype(np.float64)
+    squared_errors = np.divide(statistics['variance'], n, out=np.full(len(n), np.nan), where=n > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled_errors = squared_errors[:, None] + squared_errors[None, :]
+        t_statistic = (statistics['mean'][:, None] - statistics['mean'][None, :]) / np.sqrt(pooled_errors)
+        degrees_of_freedom = pooled_errors ** 2 / (squared_errors[:, None] ** 2 / (n[:, None] - 1)
+                                                   + squared_errors[None, :] ** 2 / (n[None, :] - 1))
+        p_value = 2 * student_t.sf(np.abs(t_statistic), degrees_of_freedom)
+    np.fill_diagonal(t_statistic, np.nan)
+    np.fill_diagonal(p_value, np.nan)
+    return {'t-statistic': t_statistic, 'degrees_of_freedom': degrees_of_freedom, 'p-value': p_value}
+
+
+def bootstrap_tests(statistics: dict, number_of_resamples: int = 1000, confidence: float = 0.95,
+                    seed: int = None) -> dict:
+    """
+    Perform bootstrap tests of the difference of mean pitch of all the pairs of groups.
+    Every group is resampled once (a multinomial draw from its histogram), then all the pairs are compared
+    with array operations on the resampled means.
+    :param statistics: The statistics of the groups, see get_group_statistics.
+    :param number_of_resamples: The number of bootstrap resamples of each group.
+    :param confidence: The level of the confidence intervals of the differences.
+    :param seed: The seed of the random generator.
+    :return: A dictionary of square matrices indexed like statistics["keys"]: the observed "difference" of means
+    (row minus column), the "lower" and "upper" bounds of its confidence interval and the two-sided "p-value"
+    of the null hypothesis of equal means (nan on the diagonal).
+    """
+    rng = np.random.default_rng(seed)
+    n = statistics['n']
+    probabilities = statistics['histograms'] / np.maximum(n, 1)[:, None]
+    resampled_means = np.full((len(n), number_of_resamples), np.nan)
+    for i in np.flatnonzero(n > 0):
+        resampled = rng.multinomial(n[i], probabilities[i], size=number_of_resamples)
+        resampled_means[i] = resampled @ PITCHES / n[i]
+
+    difference = statistics['mean'][:, None] - statistics['mean'][None, :]
+    p_value = np.empty_like(difference)
+    lower = np.empty_like(difference)
+    upper = np.empty_like(difference)
+    alpha = (1 - confidence) / 2
+    # One row of groups at a time to keep the memory linear in the number of groups
+    for i in range(len(n)):
+        resampled_differences = resampled_means[i][None, :] - resampled_means
+        centered = resampled_differences - difference[i][:, None]
+        p_value[i] = (np.abs(centered) >= np.abs(difference[i])[:, None]).mean(axis=1)
+        lower[i], upper[i] = np.quantile(resampled_differences, [alpha, 1 - alpha], axis=1)
+    invalid = np.isnan(difference)
+    p_value[invalid] = np.nan
+    np.fill_diagonal(p_value, np.nan)
+    return {'difference': difference, 'lower': lower, 'upper': upper, 'p-value': p_value}
+
+
+def permutation_test(statistics: dict, first: int, second: int, number_of_permutations: int = 1000,
+                     seed: int = None) -> float:
+    """
+    Perform a permutation test of the difference of mean pitch of two groups.
+    A permutation of the pooled pitches only matters through the pitch histogram of the first group, which is
+    drawn directly from the multivariate hypergeometric distribution for all the permutations at once.
+    :param statistics: The statistics of the groups, see get_group_statistics.
+    :param first: The index of the first group in statistics["keys"].
+    :param second: The index of the second group in statistics["keys"].
+    :param number_of_permutations: The number of random permutations.
+    :param seed: The seed of the random generator.
+    :return: The two-sided p-value (with the observed permutation counted, so never 0).
+    """
+    rng = np.random.default_rng(seed)
+    n_first, n_second = statistics['n'][first], statistics['n'][second]
+    if n_first == 0 or n_second == 0:
+        return np.nan
+    pooled = statistics['histograms'][first] + statistics['histograms'][second]
+    total = pooled @ PITCHES
+    first_histograms = rng.multivariate_hypergeometric(pooled, n_first, size=number_of_permutations,
+                                                      method='marginals')
+    first_sums = first_histograms @ PITCHES
+    differences = first_sums / n_first - (total - first_sums) / n_second
+    observed = statistics['mean'][first] - statistics['mean'][second]
+    # A small tolerance so that permutations equal to the observed one are counted despite rounding
+    extreme = np.abs(differences) >= np.abs(observed) - 1e-12
+    return (extreme.sum() + 1) / (number_of_permutations + 1)
+
+
+def permutation_tests(statistics: dict, number_of_permutations: int = 1000, seed: int = None) -> np.ndarray:
+    """
+    Perform the permutation tests of all the pairs of groups.
+    :param statistics: The statistics of the groups, see get_group_statistics.
+    :param number_of_permutations: The number of random permutations of each pair.
+    :param seed: The seed of the random generator.
+    :return: The square matrix of the two-sided p-values, indexed like statistics["keys"] (nan on the diagonal).
+    """
+    rng = np.random.default_rng(seed)
+    number_of_groups = len(statistics['keys'])
+    p_value = np.full((number_of_groups, number_of_groups), np.nan)
+    for i in range(number_of_groups):
+        for j in range(i + 1, number_of_groups):
+            p_value[i, j] = p_value[j, i] = permutation_test(statistics, i, j, number_of_permutations, rng)
+    return p_value
+
+
+def correct_p_values(p_values: np.ndarray, method: str = 'holm') -> np.ndarray:
+    """
+    Correct p-values for multiple comparisons.
+    For a symmetric matrix of pairwise p-values, each pair is counted once (the upper triangle).
+    :param p_values: A 1D array of p-values or a square symmetric matrix of pairwise p-values (nan values are ignored).
+    :param method: 'bonferroni', 'holm' (family-wise error rate) or 'fdr_bh' (Benjamini-Hochberg false discovery rate).
+    :return: The corrected p-values, with the shape of p_values.
+    """
+    if method not in CORRECTION_METHODS:
+        raise ValueError(f"Unknown correction method '{method}', expected one of {CORRECTION_METHODS}")
+    p_values = np.asarray(p_values, dtype=np.float64)
+    if p_values.ndim == 2:
+        upper = np.triu_indices(len(p_values), k=1)
+        corrected = np.full(p_values.shape, np.nan)
+        corrected[upper] = correct_p_values(p_values[upper], method)
+        corrected.T[upper] = corrected[upper]
+        return corrected
+
+    corrected = np.full(p_values.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    m = len(valid)
+    if m == 0:
+        return corrected
+    order = valid[np.argsort(p_values[valid], kind='stable')]
+    sorted_p_values = p_values[order]
+    if method == 'bonferroni':
+        adjusted = sorted_p_values * m
+    elif method == 'holm':
+        adjusted = np.maximum.accumulate(sorted_p_values * (m - np.arange(m)))
+    else:
+        adjusted = np.minimum.accumulate((sorted_p_values * m / np.arange(1, m + 1))[::-1])[::-1]
+    corrected[order] = np.minimum(adjusted, 1)
+    return corrected
+
+
+def get_pairwise_results(statistics: dict, matrices: dict) -> dict:
+    """
+    Convert matrices of pairwise results to a dictionary keyed by pairs of groups, like perform_t_test.
+    :param statistics: The statistics of the groups, see get_group_statistics.
+    :param matrices: A dictionary of square matrices indexed like statistics["keys"].
+    :return: A dictionary with the pairs (key_i, key_j), i < j, as keys and dictionaries of results as values.
+    """
+    keys = statistics['keys']
+    return {(keys[i], keys[j]): {name: matrix[i, j] for name, matrix in matrices.items()}
+            for i in range(len(keys)) for j in range(i + 1, len(keys))}
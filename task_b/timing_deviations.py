@@ -0,0 +1,132 @@
+import numpy as np
+
+from task_a.annotation_cache import load_annotations
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.instrumentation import count, instrumented
+from task_a.meter_aggregation import get_all_beat_positions
+
+NUMBER_OF_PARTS = 4
+
+
+def get_position_label(position: int) -> str:
+    """
+    Get the label of a beat position in the bar ("db" for the downbeat, then "2b", "3b"...).
+    :param position: The position of the beat in the bar, from 0.
+    :return: The label of the position.
+    """
+    return "db" if position == 0 else f"{position + 1}b"
+
+
+def get_parts(length: int, number_of_parts: int = NUMBER_OF_PARTS) -> np.ndarray:
+    """
+    Split the beats of a performance into consecutive parts of the same size, the last part takes the remainder.
+    :param length: The number of beats.
+    :param number_of_parts: The number of parts.
+    :return: The index of the part of each beat.
+    """
+    return np.minimum(np.arange(length) // max(length // number_of_parts, 1), number_of_parts - 1)
+
+
+def compute_deviations(score_annotations: dict, performed_onsets, number_of_parts: int = NUMBER_OF_PARTS) -> dict:
+    """
+    Compute the deviation of the performed inter-onset interval of each beat from the one of the score.
+    The metrical position of each beat comes from the beat types and meters of the score annotations
+    (see meter_aggregation.get_all_beat_positions), the beats after the end of the shorter file are left out.
+    :param score_annotations: The parsed score annotation file (see annotation_cache.load_annotations).
+    :param performed_onsets: The performed onset of each beat.
+    :param number_of_parts: The number of parts the performance is split into (see get_parts).
+    :return: A dictionary of arrays with one value per beat but the last: the performed "onset", the "deviation"
+    (performed minus score duration, in seconds), the "meter" code (in score_annotations["meters"]), the "position"
+    in the bar, whether the beat is "kept" (in a bar of its meter) and the "part" of the performance.
+    """
+    score_onsets = np.asarray(score_annotations["beats"]["onset"])
+    performed_onsets = np.asarray(performed_onsets, dtype=np.float64)
+    length = max(min(len(score_onsets), len(performed_onsets)) - 1, 0)
+    meters, positions, kept = get_all_beat_positions(score_annotations)
+    return {
+        "onset": performed_onsets[:length],
+        "deviation": np.diff(performed_onsets[:length + 1]) - np.diff(score_onsets[:length + 1]),
+        "meter": meters[:length],
+        "position": positions[:length],
+        "kept": kept[:length],
+        "part": get_parts(length, number_of_parts),
+    }
+
+
+@instrumented("q1b.deviations")
+def get_composer_deviations(composer_path: str, number_of_parts: int = NUMBER_OF_PARTS) -> dict:
+    """
+    Compute the timing deviations of all the performances of a composer in one pass over the annotation files.
+    :param composer_path: The path to the folder of the composer (the pieces can be in sub folders).
+    :param number_of_parts: The number of parts each performance is split into (see get_parts).
+    :return: A dictionary of the concatenated arrays of compute_deviations, with the "meter" codes shared by all
+    the performances, the list of the "meters" and the "offsets" of the performances (the beats of the performance
+    i are between offsets[i] and offsets[i + 1]).
+    """
+    meters = []
+    meter_indices = {}
+    columns = {name: [np.zeros(0, dtype=dtype)] for name, dtype in
+               (("onset", np.float64), ("deviation", np.float64), ("meter", np.int16), ("position", np.int64),
+                ("kept", bool), ("part", np.int64))}
+    lengths = []
+    score_annotations = {}
+    for performance in get_performances(get_manifest(composer_path)):
+        score_path = performance["score_annotation_path"]
+        if score_path is None:
+            continue
+        if score_path not in score_annotations:
+            score_annotations[score_path] = load_annotations(score_path)
+        annotations = score_annotations[score_path]
+        performed_onsets = load_annotations(performance["annotation_path"])["beats"]["onset"]
+        deviations = compute_deviations(annotations, performed_onsets, number_of_parts)
+        # The meter codes of the file are mapped to the shared codes, -1 (anacrusis) is kept as the last entry
+        for meter in annotations["meters"]:
+            if meter not in meter_indices:
+                meter_indices[meter] = len(meters)
+                meters.append(meter)
+        lookup = np.array([meter_indices[meter] for meter in annotations["meters"]] + [-1], dtype=np.int16)
+        deviations["meter"] = lookup[deviations["meter"]]
+        for name, values in deviations.items():
+            columns[name].append(values)
+        lengths.append(len(deviations["deviation"]))
+    count("beats", sum(lengths))
+
+    result = {name: np.concatenate(values) for name, values in columns.items()}
+    result["meters"] = meters
+    result["offsets"] = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+    return result
+
+
+def get_most_common_meter(deviations: dict) -> str or None:
+    """
+    Get the meter with the most kept beats.
+    :param deviations: The deviations (see get_composer_deviations).
+    :return: The meter, None if no beat is kept.
+    """
+    codes = deviations["meter"][deviations["kept"]].astype(np.int64)
+    if len(codes) == 0:
+        return None
+    return deviations["meters"][int(np.bincount(codes).argmax())]
+
+
+def group_by_position(deviations: dict, meter: str, part: int = None) -> tuple:
+    """
+    Group the deviations of the kept beats of a meter by position in the bar.
+    :param deviations: The deviations (see get_composer_deviations).
+    :param meter: The meter, for example "3/4".
+    :param part: The index of the part of the performances to keep, all of them by default.
+    :return: The list of the labels of the positions (see get_position_label) and the list of the arrays of the
+    deviations at each position.
+    """
+    if meter not in deviations["meters"]:
+        return [], []
+    selected = deviations["kept"] & (deviations["meter"] == deviations["meters"].index(meter))
+    if part is not None:
+        selected &= deviations["part"] == part
+    positions = deviations["position"][selected]
+    if len(positions) == 0:
+        return [], []
+    order = np.argsort(positions, kind="stable")
+    unique_positions, starts = np.unique(positions[order], return_index=True)
+    groups = np.split(deviations["deviation"][selected][order], starts[1:])
+    return [get_position_label(position) for position in unique_positions.tolist()], groups
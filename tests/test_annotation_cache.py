@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+
+from task_a.annotation_cache import clear_cache, decode, forward_fill, get_cache_dir, load_annotations
+from task_a.instrumentation import disable, enable, get_report
+
+
+def _write_annotations(path, labels: list) -> str:
+    path.write_text("".join(f"{i * 0.5:.6f}\t{i * 0.5:.6f}\t{label}\n" for i, label in enumerate(labels)))
+    return str(path)
+
+
+def _baseline_labels(path: str) -> list:
+    """
+    The beat type, meter and key of each line as read by the baseline parsers (None when not given).
+    """
+    result = []
+    with open(path, "r") as f:
+        for line in f.readlines():
+            line_data = line.split()
+            fields = line_data[2].split(',')
+            result.append((float(line_data[0]), fields[0], fields[1] if len(fields) > 1 and fields[1] else None,
+                           fields[2] if len(fields) > 2 and fields[2] else None))
+    return result
+
+
+LABELS = ["b", "db,3/4,C", "b", "b", "db,6/8,a", "bR", "b", "db,,G", "b", "db"]
+
+
+def test_parsed_file_matches_baseline(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    path = _write_annotations(tmp_path / "annotations.txt", LABELS)
+    annotations = load_annotations(path, use_cache=False)
+    beats = annotations["beats"]
+    labels = list(zip(beats["onset"].tolist(), decode(beats["beat_type"], annotations["beat_types"]),
+                      decode(beats["meter"], annotations["meters"]), decode(beats["key"], annotations["keys"])))
+    assert labels == _baseline_labels(path)
+    assert decode(forward_fill(beats["meter"]), annotations["meters"]) == \
+           [None, "3/4", "3/4", "3/4", "6/8", "6/8", "6/8", "6/8", "6/8", "6/8"]
+
+
+def test_cache_hit_and_invalidation(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    path = _write_annotations(tmp_path / "annotations.txt", LABELS)
+    expected = load_annotations(path, use_cache=False)
+    enable()
+    try:
+        first = load_annotations(path)
+        second = load_annotations(path)
+        report = get_report()
+    finally:
+        disable()
+    counters = {name: value for stage in report["stages"].values() for name, value in stage["counters"].items()}
+    assert counters["cache_misses"] == 1 and counters["cache_hits"] == 1
+    assert get_cache_dir() == os.path.join(str(tmp_path / "cache"), "annotations")
+    assert isinstance(second["beats"], np.memmap)
+    for annotations in (first, second):
+        np.testing.assert_array_equal(annotations["beats"], expected["beats"])
+        assert annotations["meters"] == expected["meters"] and annotations["keys"] == expected["keys"]
+
+    # Editing the file invalidates its entry
+    _write_annotations(tmp_path / "annotations.txt", LABELS + ["b,2/4"])
+    edited = load_annotations(path)
+    assert len(edited["beats"]) == len(LABELS) + 1 and edited["meters"][-1] == "2/4"
+
+    clear_cache()
+    assert not [file for file in os.listdir(get_cache_dir()) if file.endswith((".npy", ".json"))]
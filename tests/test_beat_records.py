@@ -0,0 +1,79 @@
+import numpy as np
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.annotation_cache import decode
+from task_a.beat_records import concatenate_beat_records, load_beat_records, to_beat_dicts
+from task_a.corpus_manifest import get_manifest, get_performances
+
+
+def _baseline_performed_attributes(performed_path: str) -> dict:
+    """
+    timing_for_one_piece.get_performed_attributes before the beat records.
+    """
+    result_performed = {}
+    with open(performed_path, "r") as f:
+        current_key = None
+        current_meter = None
+        for current_beat, line in enumerate(f.readlines()):
+            line_data = line.split()
+            beat_key_meter = line_data[2].split(',')
+            if len(beat_key_meter) == 3:
+                current_meter = beat_key_meter[1]
+                current_key = beat_key_meter[2]
+            elif len(beat_key_meter) == 2:
+                current_meter = beat_key_meter[1]
+            result_performed[current_beat] = {"key": current_key, "meter": current_meter, "onset": line_data[0],
+                                              "beat_type": beat_key_meter[0]}
+    return result_performed
+
+
+def _write_annotations(path, labels: list) -> str:
+    path.write_text("".join(f"{i:.6f}\t{i:.6f}\t{label}\n" for i, label in enumerate(labels)))
+    return str(path)
+
+
+def _get_performances(tmp_path, monkeypatch) -> list:
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=2, performances_per_piece=2,
+                    beats_per_piece=80, meter_changes=2, musicxml=False, midi=False)
+    return get_performances(get_manifest(root))
+
+
+def test_beat_dicts_match_baseline(tmp_path, monkeypatch):
+    for performance in _get_performances(tmp_path, monkeypatch):
+        records = to_beat_dicts(load_beat_records(performance["score_annotation_path"],
+                                                  performance["annotation_path"]))
+        expected = _baseline_performed_attributes(performance["annotation_path"])
+        assert list(records) == list(expected)
+        for beat, attributes in expected.items():
+            performed = records[beat]["performed"]
+            assert (performed["key"], performed["meter"], performed["beat_type"]) == \
+                   (attributes["key"], attributes["meter"], attributes["beat_type"])
+            assert performed["onset"] == float(attributes["onset"])
+
+
+def test_records_do_not_share_vocabularies(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    first_path = _write_annotations(tmp_path / "first.txt", ["db,3/4,C", "b", "b", "db"])
+    second_path = _write_annotations(tmp_path / "second.txt", ["db,6/8,G", "b", "db,3/4", "b"])
+    first = load_beat_records(first_path, first_path)
+    second = load_beat_records(second_path, second_path)
+    assert first["meters"] == ["3/4"]
+    assert second["meters"] == ["6/8", "3/4"]
+    second["meters"].append("2/4")
+    assert load_beat_records(first_path, first_path)["meters"] == ["3/4"]
+
+
+def test_concatenation_merges_vocabularies(tmp_path, monkeypatch):
+    records = [load_beat_records(performance["score_annotation_path"], performance["annotation_path"])
+               for performance in _get_performances(tmp_path, monkeypatch)]
+    concatenated = concatenate_beat_records(records)
+    assert concatenated["offsets"][-1] == len(concatenated["beats"])
+    for i, record in enumerate(records):
+        beats = concatenated["beats"][concatenated["offsets"][i]:concatenated["offsets"][i + 1]]
+        np.testing.assert_array_equal(beats["performed_onset"], record["beats"]["performed_onset"])
+        for label, vocabulary in (("beat_type", "beat_types"), ("meter", "meters"), ("key", "keys")):
+            assert decode(beats[label], concatenated[vocabulary]) == decode(record["beats"][label], record[vocabulary])
+    # The merged vocabularies only depend on the order of the records
+    assert concatenate_beat_records(records)["meters"] == concatenated["meters"]
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.beat_store import aggregate_beats, connect, ingest_corpus, query_beats
+from task_a.corpus_manifest import get_manifest, get_performances
+from test_beat_records import _baseline_performed_attributes
+from test_timing_for_one_piece import _baseline_tempo_map, _baseline_times
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=2, performances_per_piece=3,
+                    beats_per_piece=60, meter_changes=1, musicxml=False, midi=False)
+    # A piece with a single performance, left out by min_performances
+    os.remove(os.path.join(root, "Composer01", "Piece001", "Performer01_annotations.txt"))
+    os.remove(os.path.join(root, "Composer01", "Piece001", "Performer02_annotations.txt"))
+    return root
+
+
+def test_stored_beats_match_baseline(corpus, tmp_path):
+    assert ingest_corpus(corpus, str(tmp_path / "beats.sqlite")) == 10
+    connection = connect(str(tmp_path / "beats.sqlite"))
+    for performance in get_performances(get_manifest(corpus)):
+        rows = query_beats(connection, piece=performance["piece"], performance=performance["performance"])
+        assert {row["composer"] for row in rows} == {performance["composer"]}
+        times = _baseline_times(performance["score_annotation_path"], performance["annotation_path"])
+        attributes = _baseline_performed_attributes(performance["annotation_path"])
+        assert [(row["beat"], row["beat_type"], row["meter"], row["key"]) for row in rows] == \
+               [(beat, values["beat_type"], values["meter"], values["key"]) for beat, values in attributes.items()]
+        np.testing.assert_allclose([row["performed_onset"] for row in rows],
+                                   [float(values["onset"]) for values in attributes.values()])
+        np.testing.assert_allclose([row["symbolic_onset"] for row in rows],
+                                   [float(times[beat]["symbolic"]["onset"]) for beat in times])
+        tempo_map = _baseline_tempo_map(times)
+        np.testing.assert_allclose([row["tempo_ratio"] for row in rows[:len(tempo_map)]], list(tempo_map.values()))
+        assert [row["tempo_ratio"] for row in rows[len(tempo_map):]] == [None, None]
+    connection.close()
+
+
+@pytest.mark.parametrize("by", [("meter", "position"), ("composer",), ()])
+def test_aggregates_match_pandas(corpus, tmp_path, by):
+    ingest_corpus(corpus, str(tmp_path / "beats.sqlite"))
+    connection = connect(str(tmp_path / "beats.sqlite"))
+    beats = pd.DataFrame(query_beats(connection))
+    for filters in ({}, {"composer": "Composer00"}, {"min_performances": 3}):
+        selected = beats
+        if "composer" in filters:
+            selected = selected[selected["composer"] == filters["composer"]]
+        if "min_performances" in filters:
+            counts = selected.groupby("piece")["performance"].nunique()
+            selected = selected[selected["piece"].isin(counts[counts >= 3].index)]
+        selected = selected.dropna(subset=["tempo_ratio"])
+        groups = selected.groupby(list(by)) if by else [((), selected)]
+        expected = [(key if isinstance(key, tuple) else (key,), len(group), group["tempo_ratio"].mean(),
+                     group["tempo_ratio"].std(ddof=0), group["tempo_ratio"].min(), group["tempo_ratio"].max())
+                    for key, group in groups]
+        result = aggregate_beats(connection, "tempo_ratio", by, **filters)
+        assert [tuple(row[column] for column in by) for row in result] == [key for key, *_ in expected]
+        assert [row["count"] for row in result] == [values[1] for values in expected]
+        np.testing.assert_allclose([[row[name] for name in ("mean", "std", "min", "max")] for row in result],
+                                   [values[2:] for values in expected], atol=1e-7)
+    connection.close()
+
+
+def test_ingest_only_loads_the_changed_performances(corpus, tmp_path):
+    database = str(tmp_path / "beats.sqlite")
+    assert ingest_corpus(corpus, database) == 10
+    assert ingest_corpus(corpus, database) == 0
+
+    # Editing the score annotation file reloads all the performances of its piece
+    piece = os.path.join(corpus, "Composer00", "Piece000")
+    with open(os.path.join(piece, "midi_score_annotations.txt"), "a") as f:
+        f.write("1000.000000\t1000.000000\tdb\n")
+    assert ingest_corpus(corpus, database) == 3
+
+    os.remove(os.path.join(piece, "Performer00_annotations.txt"))
+    assert ingest_corpus(corpus, database) == 0
+    connection = connect(database)
+    assert not query_beats(connection, piece=os.path.join("Composer00", "Piece000"), performance="Performer00")
+    assert len({(row["piece"], row["performance"]) for row in query_beats(connection)}) == 9
+    connection.close()
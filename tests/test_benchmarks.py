@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+from music21 import converter
+
+from benchmarks.run_benchmarks import compare_with_baseline, run_benchmarks
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.midi_notes import read_notes
+
+
+def _read_files(root: str) -> dict:
+    contents = {}
+    for dir_path, _, files in os.walk(root):
+        for file in files:
+            with open(os.path.join(dir_path, file), "rb") as f:
+                contents[os.path.relpath(os.path.join(dir_path, file), root)] = f.read()
+    return contents
+
+
+def test_same_seed_gives_the_same_corpus(tmp_path):
+    parameters = {"number_of_composers": 1, "pieces_per_composer": 2, "performances_per_piece": 2,
+                  "beats_per_piece": 40}
+    generate_corpus(str(tmp_path / "first"), **parameters)
+    generate_corpus(str(tmp_path / "second"), **parameters)
+    generate_corpus(str(tmp_path / "other"), seed=1, **parameters)
+    first = _read_files(str(tmp_path / "first"))
+    assert first == _read_files(str(tmp_path / "second"))
+    assert first != _read_files(str(tmp_path / "other"))
+
+
+def test_score_files_agree(tmp_path):
+    """
+    The MusicXML score, the unperformed MIDI file and the score annotations describe the same notes and bars.
+    """
+    folder = generate_corpus(str(tmp_path / "corpus"), number_of_composers=1, pieces_per_composer=1,
+                             performances_per_piece=1, beats_per_piece=60, meter_changes=2)[0]
+    score = converter.parse(os.path.join(folder, "xml_score.musicxml"))
+    notes = read_notes(os.path.join(folder, "midi_score.mid"))
+    assert [note.pitch.midi for note in score.recurse().notes] == notes["pitch"].tolist()
+    with open(os.path.join(folder, "midi_score_annotations.txt")) as f:
+        labels = [line.split()[2].split(",") for line in f]
+    measures = score.parts[0].getElementsByClass("Measure")
+    assert len(measures) == sum(fields[0] == "db" for fields in labels)
+    meters = [fields[1] for fields in labels if len(fields) > 1 and fields[1]]
+    assert [measure.timeSignature.ratioString for measure in measures if measure.timeSignature] == meters
+
+
+def test_run_benchmarks(monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", "/nonexistent/cache")
+    parameters = {"number_of_composers": 1, "pieces_per_composer": 2, "performances_per_piece": 1,
+                  "beats_per_piece": 40}
+    results = run_benchmarks(parameters, repeat=1, stages=["timing", "read_midi_notes"])
+    assert os.environ["DM_CACHE_DIR"] == "/nonexistent/cache"
+    assert sorted(results) == ["read_midi_notes", "timing"]
+    assert results["read_midi_notes"]["notes"] > 0 and "notes" not in results["timing"]
+    assert all(np.isfinite(measures["seconds"]) and measures["peak_bytes"] > 0 for measures in results.values())
+
+    slower = {stage: {**measures, "seconds": measures["seconds"] * 2} for stage, measures in results.items()}
+    assert compare_with_baseline(results, results) == []
+    regressions = compare_with_baseline(slower, results, tolerance=0.5)
+    assert sorted(message.split(":")[0] for message in regressions) == ["read_midi_notes", "timing"]
+    assert all(" seconds " in message for message in regressions)
+    assert compare_with_baseline(slower, results, tolerance=1.5) == []
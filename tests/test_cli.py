@@ -0,0 +1,78 @@
+import json
+import os
+import socketserver
+import threading
+
+import pytest
+
+import cli
+from benchmarks.synthetic_corpus import generate_corpus
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=1, pieces_per_composer=2, performances_per_piece=2,
+                    beats_per_piece=120, musicxml=False, midi=False)
+    return root
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    server = socketserver.UnixStreamServer(socket_path, cli._DaemonHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def test_daemon_gives_the_result_of_the_command(corpus, daemon):
+    argv = ["timing", corpus, "--statistics"]
+    expected = cli.run_command(argv)
+    assert "result" in expected
+    assert cli.send_command(daemon, argv) == json.loads(json.dumps(expected))
+    # The second request is answered from the memory of the daemon
+    assert cli.send_command(daemon, argv) == json.loads(json.dumps(expected))
+
+
+def test_daemon_rejects_serve(daemon):
+    assert "error" in cli.send_command(daemon, ["serve"])
+
+
+def test_main_sends_the_command_without_connect(corpus, daemon, capsys):
+    assert cli.main([f"--connect={daemon}", "timing", corpus]) == 0
+    assert json.loads(capsys.readouterr().out) == cli.run_command(["timing", corpus])["result"]
+
+
+def test_serve_with_connect_is_rejected(tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    with pytest.raises(SystemExit):
+        cli.main(["--connect", socket_path, "serve", "--socket", socket_path])
+    assert not os.path.exists(socket_path)
+
+
+def test_without_connect():
+    assert cli._without_connect(["--connect", "a.sock", "timing", "x"]) == ["timing", "x"]
+    assert cli._without_connect(["--connect=a.sock", "timing", "x"]) == ["timing", "x"]
+
+
+def test_pitch_backends_agree(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=1, performances_per_piece=1,
+                    beats_per_piece=60, midi=False)
+    paths = [os.path.join(root, composer) for composer in sorted(os.listdir(root))]
+    assert cli.get_parser().parse_args(["pitch-stats", *paths]).backend == "music21"
+    for command in ("pitch-stats", "t-test"):
+        expected = cli.run_command([command, *paths])
+        assert "result" in expected
+        assert cli.run_command([command, *paths, "--backend", "stream"]) == expected
+
+
+def test_default_socket_follows_the_cache_root(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path))
+    assert cli.get_default_socket() == os.path.join(str(tmp_path), "daemon.sock")
+    assert cli.get_parser().parse_args(["serve"]).socket is None
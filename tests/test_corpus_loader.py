@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_b.corpus_loader import list_musicxml_files, load_file, load_musicxml_files, map_musicxml_files
+from task_b.q2 import read_musicians_musicxml_and_normalize
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=3, performances_per_piece=1,
+                    beats_per_piece=40, midi=False)
+    (tmp_path / "corpus" / "Composer01" / "broken.musicxml").write_text("<score-partwise>")
+    return root
+
+
+@pytest.mark.parametrize("backend", ["music21", "stream"])
+def test_workers_give_the_serial_results(corpus, backend):
+    file_paths = list_musicxml_files(corpus)
+    serial = load_musicxml_files(file_paths, backend=backend)
+    parallel = load_musicxml_files(file_paths, workers=2, chunksize=1, backend=backend)
+    assert len(serial) == len(parallel) == len(file_paths)
+    for file_path, (features, error), (parallel_features, parallel_error) in zip(file_paths, serial, parallel):
+        if file_path.endswith("broken.musicxml"):
+            assert features is None and error is not None and parallel_error is not None
+            continue
+        assert error is None and parallel_error is None
+        for name in ("pitches", "times"):
+            np.testing.assert_array_equal(features[name], parallel_features[name])
+
+
+def test_map_keeps_the_order_of_the_files():
+    file_paths = [f"/folder/file_{i}.musicxml" for i in range(50)]
+    assert list(map_musicxml_files(os.path.basename, file_paths, workers=3)) == \
+           [os.path.basename(path) for path in file_paths]
+
+
+def test_normalized_music_data(corpus):
+    musician_paths = {composer: os.path.join(corpus, composer) for composer in sorted(os.listdir(corpus))}
+    musician_data = read_musicians_musicxml_and_normalize(musician_paths, workers=2)
+    for musician, path in musician_paths.items():
+        # The broken file is reported and skipped
+        assert sorted(musician_data[musician]) == sorted(os.path.relpath(file_path, path)
+                                                         for file_path in list_musicxml_files(path)
+                                                         if not file_path.endswith("broken.musicxml"))
+        for relative_path, data in musician_data[musician].items():
+            features, _ = load_file(os.path.join(path, relative_path))
+            assert data["pitches"] == features["pitches"].tolist()
+            np.testing.assert_allclose(data["times"], features["times"] / features["times"].max())
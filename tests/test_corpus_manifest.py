@@ -0,0 +1,46 @@
+import os
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.corpus_manifest import get_annotation_files, get_manifest, get_performances
+
+
+def _walk_annotation_files(root: str) -> list:
+    """
+    The listing of timing_function.get_annotations_files_from_folder before the manifest, in the order of os.walk.
+    """
+    return [os.path.join(dir_path, file) for dir_path, _, files in os.walk(root)
+            for file in files if file.endswith("annotations.txt")]
+
+
+def test_annotation_files_match_os_walk(tmp_path):
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=2, performances_per_piece=2,
+                    beats_per_piece=40, musicxml=False, midi=False)
+    manifest = get_manifest(root, str(tmp_path / "manifests"))
+    files = get_annotation_files(manifest)
+    # The manifest gives the same files, sorted by folder then name
+    assert sorted(files) == sorted(os.path.normpath(os.path.abspath(file)) for file in _walk_annotation_files(root))
+    assert files == sorted(files)
+    assert len(get_performances(manifest)) == 2 * 2 * 2
+    assert {performance["composer"] for performance in get_performances(manifest)} == {"Composer00", "Composer01"}
+
+
+def test_rescan_sees_files_edited_in_place(tmp_path):
+    root = str(tmp_path / "corpus")
+    manifest_dir = str(tmp_path / "manifests")
+    generate_corpus(root, number_of_composers=1, pieces_per_composer=1, performances_per_piece=1,
+                    beats_per_piece=40, musicxml=False, midi=False)
+    performance = get_performances(get_manifest(root, manifest_dir))[0]
+    folder = os.path.dirname(performance["annotation_path"])
+    folder_mtime_ns = os.stat(folder).st_mtime_ns
+
+    with open(performance["annotation_path"], "a") as f:
+        f.write("100.000000\t100.000000\tdb\n")
+    os.utime(folder, ns=(folder_mtime_ns, folder_mtime_ns))
+
+    edited = get_performances(get_manifest(root, manifest_dir))[0]
+    stat = os.stat(performance["annotation_path"])
+    assert edited["annotation_size"] == stat.st_size != performance["annotation_size"]
+    assert edited["annotation_mtime_ns"] == stat.st_mtime_ns
+    # The edit is persisted
+    assert get_performances(get_manifest(root, manifest_dir))[0] == edited
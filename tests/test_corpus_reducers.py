@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.stats import entropy
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_b.corpus_reducers import get_reducer_statistics, reduce_corpus
+from task_b.pitch_contours import get_contour
+from task_b.q2 import merge_music_data_by_era, read_musicxml_and_normalize
+
+
+def _baseline_merge_by_era(all_musician_paths: dict, era_musician_paths: dict) -> dict:
+    """
+    q2.merge_music_data_by_era before the streaming, reading the musicians of each era one after the other.
+    """
+    merged_music_data_by_era = {}
+    for era, musicians in era_musician_paths.items():
+        merged_pitches = []
+        merged_times = []
+        for musician in musicians:
+            if musician in all_musician_paths:
+                for data in read_musicxml_and_normalize(all_musician_paths[musician]).values():
+                    merged_pitches.extend(data['pitches'])
+                    merged_times.extend(data['times'])
+        merged_music_data_by_era[era] = {'pitches': merged_pitches, 'times': merged_times}
+    return merged_music_data_by_era
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=3, pieces_per_composer=3, performances_per_piece=1,
+                    beats_per_piece=60, midi=False)
+    musician_paths = {composer: os.path.join(root, composer) for composer in sorted(os.listdir(root))}
+    composers = list(musician_paths)
+    musician_eras = {"Baroque": composers[:2], "Romantic": [composers[2], "Nobody"], "Modern": ["Nobody"]}
+    return musician_paths, musician_eras
+
+
+def test_merged_eras_match_baseline(corpus):
+    musician_paths, musician_eras = corpus
+    expected = _baseline_merge_by_era(musician_paths, musician_eras)
+    assert merge_music_data_by_era(musician_paths, musician_eras, workers=2) == expected
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_reducers_match_numpy(corpus, workers):
+    musician_paths, musician_eras = corpus
+    reduced = reduce_corpus(musician_paths, musician_eras, workers=workers, resolution=200)
+    assert list(reduced['eras']) == ["Baroque", "Romantic"]
+    merged = _baseline_merge_by_era(musician_paths, musician_eras)
+    statistics = get_reducer_statistics(reduced['eras'])
+    for i, (era, reducer) in enumerate(reduced['eras'].items()):
+        pitches = np.array(merged[era]['pitches'])
+        np.testing.assert_array_equal(reducer['histogram'], np.bincount(pitches, minlength=128))
+        assert reducer['n'] == statistics['n'][i] == len(pitches)
+        np.testing.assert_allclose([reducer['mean'], statistics['mean'][i]], pitches.mean())
+        np.testing.assert_allclose([reducer['m2'] / (len(pitches) - 1), statistics['variance'][i]],
+                                   pitches.var(ddof=1))
+        # The contour of an era is the one of all the works of its composers
+        music_data = {(musician, work): data for musician in musician_eras[era] if musician in musician_paths
+                      for work, data in read_musicxml_and_normalize(musician_paths[musician]).items()}
+        contour = get_contour(music_data, resolution=200)
+        assert reducer['number_of_works'] == reducer['contour']['count'] == contour['count'] == len(music_data)
+        np.testing.assert_allclose(reducer['contour']['mean'], contour['mean'])
+        np.testing.assert_allclose(reducer['contour']['m2'], contour['m2'], atol=1e-6)
+
+
+def test_work_summaries_match_numpy(corpus):
+    musician_paths, musician_eras = corpus
+    reduced = reduce_corpus(musician_paths, musician_eras)
+    works = [(composer, relative_path, data) for composer, path in musician_paths.items()
+             for relative_path, data in read_musicxml_and_normalize(path).items()]
+    assert reduced['works'] == [os.path.join(composer, relative_path) for composer, relative_path, _ in works]
+    for summary, (composer, relative_path, data) in zip(reduced['summaries'], works):
+        pitches = np.array(data['pitches'])
+        assert summary['composer'] == list(musician_paths).index(composer)
+        assert summary['number_of_notes'] == len(pitches)
+        np.testing.assert_allclose([summary[name] for name in ('mean', 'std', 'lowest', 'highest', 'entropy')],
+                                   [pitches.mean(), pitches.std(), pitches.min(), pitches.max(),
+                                    entropy(np.bincount(pitches), base=2)])
+        assert summary['duration'] > 0
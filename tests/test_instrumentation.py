@@ -0,0 +1,66 @@
+import json
+import pstats
+
+import numpy as np
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.instrumentation import (NO_STAGE, count, disable, enable, get_report, instrumented, is_enabled, reset,
+                                    stage, write_report)
+from task_a.timing_function import get_timing_statistics
+
+
+@instrumented("outer")
+def _outer(size: int) -> float:
+    count("calls_of_outer")
+    with stage("inner"):
+        count("values", size)
+        values = np.arange(size, dtype=np.float64)
+    return float(values.sum())
+
+
+def test_stages_and_counters(tmp_path):
+    enable(profile=True, trace_memory=True)
+    try:
+        assert is_enabled()
+        assert [_outer(1000), _outer(100000)] == [499500.0, 4999950000.0]
+        count("orphan")
+        report = write_report(str(tmp_path / "report.json"))
+    finally:
+        disable()
+    assert sorted(report["stages"]) == sorted([NO_STAGE, "outer", "outer/inner"])
+    assert report["hottest_stage"] == "outer"
+    assert report["stages"]["outer"]["calls"] == report["stages"]["outer/inner"]["calls"] == 2
+    assert report["stages"]["outer"]["counters"] == {"calls_of_outer": 2}
+    assert report["stages"]["outer/inner"]["counters"] == {"values": 101000}
+    assert report["stages"][NO_STAGE]["counters"] == {"orphan": 1}
+    # The arrays of the inner stage are traced, and counted in the peak of the outer stage
+    assert report["stages"]["outer"]["peak_memory_bytes"] >= report["stages"]["outer/inner"]["peak_memory_bytes"] \
+           >= 100000 * 8
+    with open(tmp_path / "report.json") as f:
+        assert json.load(f)["stages"]["outer"]["calls"] == 2
+    assert report["profile_path"] == str(tmp_path / "report.prof")
+    assert any(function[2] == "_outer" for function in pstats.Stats(report["profile_path"]).stats)
+
+
+def test_disabled_instrumentation_records_nothing():
+    reset()
+    assert not is_enabled()
+    _outer(10)
+    assert get_report()["stages"] == {} and get_report()["hottest_stage"] is None
+
+
+def test_instrumented_results_are_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=1, pieces_per_composer=2, performances_per_piece=2,
+                    beats_per_piece=60, musicxml=False, midi=False)
+    expected = get_timing_statistics(root)
+    enable()
+    try:
+        result = get_timing_statistics(root)
+        report = get_report()
+    finally:
+        disable()
+    assert result == expected
+    assert report["stages"]["timing"]["calls"] == 1
+    assert {"timing/aggregation", "timing/statistics"} <= set(report["stages"])
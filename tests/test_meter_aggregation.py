@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.annotation_cache import load_annotations
+from task_a.corpus_manifest import get_annotation_files, get_manifest
+from task_a.meter_aggregation import aggregate_file, get_statistics, merge_aggregates
+
+
+def _baseline_sum_and_lengths(path: str) -> dict:
+    """
+    The line by line aggregation of timing_function.get_sum_and_lengths_timing_one_bar before the vectorization.
+    """
+    result = {}
+    with open(path, "r") as f:
+        symbolic_data = f.readlines()
+        current_beat = 0
+        current_meter = None
+        for i in range(len(symbolic_data) - 1):
+            line_data = symbolic_data[i].split()
+            next_line_data = symbolic_data[i + 1].split()
+            beat_type_meter_key = line_data[2].split(',')
+            meter = beat_type_meter_key[1] if len(beat_type_meter_key) > 1 else ""
+            if meter != current_meter and meter != "":
+                current_meter = meter
+                if current_meter not in result:
+                    result[current_meter] = {"sum_durations": [0], "number_of_beats": [0]}
+                current_beat = 0
+            elif current_meter is None:
+                continue
+            if beat_type_meter_key[0] == "db":
+                current_beat = 0
+            elif beat_type_meter_key[0] == "b":
+                current_beat += 1
+            elif beat_type_meter_key[0] == "bR":
+                continue
+            new_onset = float(next_line_data[0]) - float(line_data[0])
+            if len(result[current_meter]["sum_durations"]) <= current_beat:
+                result[current_meter]["sum_durations"].append(0)
+                result[current_meter]["number_of_beats"].append(0)
+            result[current_meter]["sum_durations"][current_beat] += new_onset
+            result[current_meter]["number_of_beats"][current_beat] += 1
+    return result
+
+
+def _write_annotations(path, labels: list) -> str:
+    """
+    Write an annotation file with one beat per second.
+    """
+    path.write_text("".join(f"{i:.6f}\t{i:.6f}\t{label}\n" for i, label in enumerate(labels)))
+    return str(path)
+
+
+def _assert_same_as_baseline(path: str) -> None:
+    expected = _baseline_sum_and_lengths(path)
+    result = aggregate_file(path)
+    assert list(result) == list(expected)
+    for meter, sums_and_lengths in expected.items():
+        np.testing.assert_array_equal(result[meter]["number_of_beats"], sums_and_lengths["number_of_beats"])
+        np.testing.assert_allclose(result[meter]["sum_durations"], sums_and_lengths["sum_durations"])
+
+
+ANNOTATIONS = {
+    "anacrusis_and_meter_change": ["b", "b", "db,3/4,G", "b", "b", "db", "b", "b", "db,2/4", "b", "db", "b", "db"],
+    "change_of_meter_on_a_beat": ["db,4/4,C", "b", "b,3/4", "b", "db", "b", "b", "db"],
+    "beats_out_of_the_meter": ["db,3/4,C", "b", "bR", "b", "db", "bR", "b", "b", "db"],
+    "empty_meter_field": ["db,3/4,C", "b", "b", "db,,G", "b", "b", "db,,D", "b", "b", "db"],
+    "same_meter_written_again": ["db,3/4,C", "b", "b", "db,3/4", "b", "b", "db"],
+}
+
+
+@pytest.mark.parametrize("name", ANNOTATIONS)
+def test_aggregate_file_matches_baseline(name, tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    _assert_same_as_baseline(_write_annotations(tmp_path / f"{name}.txt", ANNOTATIONS[name]))
+
+
+def test_only_beats_out_of_the_meter(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    path = _write_annotations(tmp_path / "bR.txt", ["bR,3/4,C", "bR", "bR", "bR"])
+    result = aggregate_file(path)
+    assert list(result) == ["3/4"]
+    np.testing.assert_array_equal(result["3/4"]["number_of_beats"], [0])
+    np.testing.assert_array_equal(result["3/4"]["sum_durations"], [0])
+    assert result["3/4"]["sum_durations"].dtype == np.float64
+    _assert_same_as_baseline(path)
+
+
+def test_meter_only_on_the_last_line(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    path = _write_annotations(tmp_path / "last.txt", ["b", "b", "b", "db,4/4,C"])
+    assert aggregate_file(path) == {}
+    _assert_same_as_baseline(path)
+
+
+def test_empty_meter_field_is_not_a_meter(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    annotations = load_annotations(_write_annotations(tmp_path / "empty.txt", ANNOTATIONS["empty_meter_field"]))
+    assert annotations["meters"] == ["3/4"]
+    assert annotations["keys"] == ["C", "G", "D"]
+    np.testing.assert_array_equal(annotations["beats"]["meter"], [0] + [-1] * 9)
+
+
+def test_synthetic_corpus_matches_baseline(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=2, performances_per_piece=2,
+                    beats_per_piece=200, meter_changes=2, musicxml=False, midi=False)
+    paths = get_annotation_files(get_manifest(root))
+    assert paths
+    for path in paths:
+        _assert_same_as_baseline(path)
+
+    merged = merge_aggregates([aggregate_file(path) for path in paths])
+    statistics = get_statistics(merged)
+    for meter, meter_aggregate in merged.items():
+        counts = meter_aggregate["number_of_beats"]
+        assert statistics[meter]["count"] == counts.tolist()
+        np.testing.assert_allclose(statistics[meter]["mean"],
+                                   np.where(counts > 0, meter_aggregate["sum_durations"] / np.maximum(counts, 1),
+                                            np.nan))
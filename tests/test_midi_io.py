@@ -0,0 +1,64 @@
+import numpy as np
+from music21 import note, stream, tempo
+
+from task_a.midi_io import get_tempo_map, read_midi, ticks_to_seconds, write_midi
+from task_a.midi_notes import get_notes, read_notes
+
+
+def _write_music21_midi(path) -> str:
+    """
+    Write with music21 eight quarter notes, the first four at 120 bpm and the other ones at 60 bpm.
+    """
+    part = stream.Part()
+    part.insert(0, tempo.MetronomeMark(number=120))
+    part.insert(4, tempo.MetronomeMark(number=60))
+    for i in range(8):
+        part.insert(i, note.Note(60 + i, quarterLength=1))
+    part.write("midi", fp=str(path))
+    return str(path)
+
+
+def _reference_seconds(tick: int, change_ticks: list, tempos: list, ticks_per_beat: int) -> float:
+    """
+    Convert a tick to seconds by walking through the tempo changes one at a time.
+    """
+    seconds = 0.0
+    for i, (start, microseconds) in enumerate(zip(change_ticks, tempos)):
+        end = change_ticks[i + 1] if i + 1 < len(change_ticks) else None
+        if tick < start:
+            break
+        seconds += (min(tick, end) - start if end is not None else tick - start) * microseconds / 1e6 / ticks_per_beat
+    return seconds
+
+
+def test_notes_of_a_music21_file(tmp_path):
+    notes = read_notes(_write_music21_midi(tmp_path / "tempo.mid"))
+    np.testing.assert_array_equal(notes["pitch"], np.arange(60, 68))
+    np.testing.assert_allclose(notes["onset"], [0, 0.5, 1, 1.5, 2, 3, 4, 5], atol=1e-9)
+    np.testing.assert_allclose(notes["duration"], [0.5] * 4 + [1] * 4, atol=1e-2)
+
+
+def test_ticks_to_seconds_matches_reference():
+    ticks_per_beat = 96
+    events = [bytes((0xFF, 0x51, 3)) + value.to_bytes(3, "big") for value in (500000, 250000, 1000000)]
+    midi = {"format": 1, "ticks_per_beat": ticks_per_beat,
+            "tracks": [{"ticks": np.array([0, 100, 250]), "events": events}]}
+    ticks = np.arange(0, 600, 7)
+    expected = [_reference_seconds(tick, [0, 100, 250], [500000, 250000, 1000000], ticks_per_beat)
+                for tick in ticks.tolist()]
+    np.testing.assert_allclose(ticks_to_seconds(ticks, get_tempo_map(midi)), expected)
+
+
+def test_read_and_write_are_inverse(tmp_path):
+    path = _write_music21_midi(tmp_path / "tempo.mid")
+    midi = read_midi(path)
+    write_midi(midi, str(tmp_path / "copy.mid"))
+    copy = read_midi(str(tmp_path / "copy.mid"))
+    assert copy["format"] == midi["format"] and copy["ticks_per_beat"] == midi["ticks_per_beat"]
+    for track, copied_track in zip(midi["tracks"], copy["tracks"]):
+        np.testing.assert_array_equal(track["ticks"], copied_track["ticks"])
+        assert track["events"] == copied_track["events"]
+    write_midi(copy, str(tmp_path / "second_copy.mid"))
+    assert (tmp_path / "second_copy.mid").read_bytes() == (tmp_path / "copy.mid").read_bytes()
+    for name, values in get_notes(midi).items():
+        np.testing.assert_array_equal(values, get_notes(copy)[name])
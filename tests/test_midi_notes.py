@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+from music21 import midi as music21_midi
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.midi_io import write_midi
+from task_a.midi_notes import aggregate_notes_per_position, get_performance_notes, link_notes_to_beats, read_notes
+from test_midi_io import _reference_seconds, _write_music21_midi
+
+
+def _music21_notes(path: str) -> dict:
+    """
+    Read the notes of a MIDI file with the MIDI parser of music21, ending each note-on at the first note-off of its
+    channel and pitch after it, one event at a time.
+    """
+    midi_file = music21_midi.MidiFile()
+    midi_file.open(path)
+    midi_file.read()
+    midi_file.close()
+    events = []
+    change_ticks, tempos = [0], [500000]
+    last_tick = 0
+    for track in midi_file.tracks:
+        tick = 0
+        for event in track.events:
+            if isinstance(event, music21_midi.DeltaTime):
+                tick += event.time
+                continue
+            last_tick = max(last_tick, tick)
+            if event.type.name == "SET_TEMPO":
+                if tick == change_ticks[-1]:
+                    tempos[-1] = int.from_bytes(event.data, "big")
+                else:
+                    change_ticks.append(tick)
+                    tempos.append(int.from_bytes(event.data, "big"))
+            elif event.type.name in ("NOTE_ON", "NOTE_OFF"):
+                is_on = event.type.name == "NOTE_ON" and event.velocity > 0
+                events.append((tick, is_on, event.channel - 1, event.pitch, event.velocity))
+    # Note offs before note ons at the same tick, the tracks in order
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    def seconds(tick: int) -> float:
+        return _reference_seconds(tick, change_ticks, tempos, midi_file.ticksPerQuarterNote)
+
+    notes = []
+    for i, (tick, is_on, channel, pitch, velocity) in enumerate(events):
+        if not is_on:
+            continue
+        end = next((other[0] for other in events[i + 1:] if not other[1] and other[2:4] == (channel, pitch)),
+                   last_tick)
+        notes.append((seconds(tick), seconds(end) - seconds(tick), pitch, velocity, channel))
+    return {name: np.array(values) for name, values in
+            zip(("onset", "duration", "pitch", "velocity", "channel"), zip(*notes))}
+
+
+def _write_edge_cases(path) -> str:
+    """
+    Write a two-track file with a tempo change, two channels, overlapping notes of the same pitch, a note-on with a
+    zero velocity, a stray note-off, a program change and a note without note-off.
+    """
+    tempo_track = {"ticks": np.array([0, 960]),
+                   "events": [bytes((0xFF, 0x51, 3)) + value.to_bytes(3, "big") for value in (500000, 250000)]}
+    notes = [(0, (0x90, 60, 80)), (0, (0x91, 60, 70)), (120, (0x90, 60, 90)), (240, (0x80, 60, 0)),
+             (240, (0x90, 64, 100)), (300, (0x90, 64, 0)), (400, (0x80, 67, 0)), (480, (0x81, 60, 0)),
+             (480, (0x90, 67, 50)), (960, (0xC0, 5)), (1000, (0x90, 72, 60)), (1440, (0x80, 67, 0))]
+    note_track = {"ticks": np.array([tick for tick, _ in notes]), "events": [bytes(event) for _, event in notes]}
+    write_midi({"format": 1, "ticks_per_beat": 480, "tracks": [tempo_track, note_track]}, str(path))
+    return str(path)
+
+
+def _assert_same_notes(notes: dict, expected: dict) -> None:
+    for name in ("pitch", "velocity", "channel"):
+        np.testing.assert_array_equal(notes[name], expected[name])
+    np.testing.assert_allclose(notes["onset"], expected["onset"], atol=1e-9)
+    np.testing.assert_allclose(notes["duration"], expected["duration"], atol=1e-9)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=1, pieces_per_composer=2, performances_per_piece=2,
+                    beats_per_piece=60, meter_changes=1, musicxml=False)
+    return root
+
+
+def test_notes_match_music21(tmp_path, corpus):
+    paths = [_write_edge_cases(tmp_path / "edge_cases.mid"), _write_music21_midi(tmp_path / "tempo.mid")]
+    paths += [performance["midi_path"] for performance in get_performances(get_manifest(corpus))]
+    for path in paths:
+        _assert_same_notes(read_notes(path), _music21_notes(path))
+    assert len(read_notes(paths[0])["onset"]) == 6
+
+
+def test_link_notes_to_beats_matches_brute_force():
+    rng = np.random.default_rng(0)
+    beat_onsets = np.cumsum(rng.uniform(0.3, 0.7, 50))
+    onsets = np.concatenate((rng.uniform(-1, beat_onsets[-1] + 1, 500), beat_onsets,
+                             (beat_onsets[1:] + beat_onsets[:-1]) / 2))
+    beats, offsets = link_notes_to_beats(onsets, beat_onsets)
+    distances = np.abs(onsets[:, None] - beat_onsets[None, :])
+    # The first nearest beat, so a note halfway between two beats goes to the earlier one
+    np.testing.assert_array_equal(beats, np.argmin(distances, axis=1))
+    np.testing.assert_allclose(offsets, onsets - beat_onsets[beats])
+    beats, offsets = link_notes_to_beats(onsets, [])
+    assert (beats == -1).all() and np.isnan(offsets).all()
+
+
+@pytest.mark.parametrize("score", [False, True])
+def test_aggregates_match_pandas(corpus, score):
+    notes = []
+    for performance in get_performances(get_manifest(corpus)):
+        performance_notes = get_performance_notes(performance, score)
+        in_bar = performance_notes["meter"] >= 0
+        notes.append(pd.DataFrame({
+            "meter": np.array(performance_notes["meters"], dtype=object)[performance_notes["meter"][in_bar]],
+            "position": performance_notes["position"][in_bar],
+            "velocity": performance_notes["velocity"][in_bar],
+            "offset": performance_notes["offset"][in_bar],
+        }))
+    if score:
+        # The score of each piece is read once
+        notes = notes[::2]
+    notes = pd.concat(notes, ignore_index=True)
+    result = aggregate_notes_per_position(corpus, score)
+    assert sorted(result) == sorted(set(notes["meter"]))
+    assert sum(int(values["number_of_notes"].sum()) for values in result.values()) == len(notes)
+    groups = notes.groupby(["meter", "position"])
+    for (meter, position), group in groups:
+        assert result[meter]["number_of_notes"][position] == len(group)
+        np.testing.assert_allclose(result[meter]["mean_velocity"][position], group["velocity"].mean())
+        np.testing.assert_allclose(result[meter]["mean_offset"][position], group["offset"].mean(), atol=1e-12)
@@ -0,0 +1,79 @@
+import zipfile
+
+import numpy as np
+import pytest
+from music21 import converter, corpus
+
+from task_b.musicxml_stream import extract_pitches_and_times
+from task_b.score_cache import extract_score_features
+
+# Scores of the music21 corpus with several voices per staff, <backup> and <forward>
+MULTI_VOICE_WORKS = [
+    'schubert/Lindenbaum',
+    'schumann_clara/opus17/movement3',
+    'bach/bwv66.6',
+    'beethoven/opus18no1/movement3',
+    'schumann_robert/opus41no1/movement3',
+]
+
+TWO_VOICES = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="3.1">
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1">
+    <measure number="1">
+      <attributes><divisions>2</divisions><time><beats>3</beats><beat-type>4</beat-type></time></attributes>
+      <note><pitch><step>E</step><octave>5</octave></pitch><duration>4</duration><voice>1</voice></note>
+      <note><pitch><step>D</step><octave>5</octave></pitch><duration>2</duration><voice>1</voice></note>
+      <backup><duration>6</duration></backup>
+      <forward><duration>2</duration><voice>2</voice></forward>
+      <note><pitch><step>C</step><alter>1</alter><octave>4</octave></pitch><duration>4</duration><voice>2</voice></note>
+    </measure>
+    <measure number="2">
+      <note><pitch><step>G</step><octave>4</octave></pitch><duration>6</duration><voice>1</voice></note>
+      <note><chord/><pitch><step>B</step><octave>4</octave></pitch><duration>6</duration><voice>1</voice></note>
+      <backup><duration>6</duration></backup>
+      <note><pitch><step>A</step><octave>3</octave></pitch><duration>3</duration><voice>2</voice></note>
+      <note><rest/><duration>3</duration><voice>2</voice></note>
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+
+def _get_musicxml_file(work: str, directory) -> str:
+    """
+    Get a plain MusicXML file of a work of the music21 corpus, extracted to a directory if it is compressed.
+    """
+    paths = corpus.getWork(work)
+    if isinstance(paths, list):
+        paths = [path for path in paths if str(path).endswith(('.xml', '.mxl', '.musicxml'))][0]
+    path = str(paths)
+    if not path.endswith('.mxl'):
+        return path
+    with zipfile.ZipFile(path) as archive:
+        name = [name for name in archive.namelist() if not name.startswith('META-INF') and name.endswith('xml')][0]
+        file_path = directory / (work.replace('/', '_') + '.musicxml')
+        file_path.write_bytes(archive.read(name))
+    return str(file_path)
+
+
+@pytest.mark.parametrize('work', MULTI_VOICE_WORKS)
+def test_multi_voice_scores_match_music21(work, tmp_path):
+    file_path = _get_musicxml_file(work, tmp_path)
+    expected = extract_score_features(converter.parse(file_path))
+    result = extract_pitches_and_times(file_path)
+    assert len(result['pitches']) == len(expected['pitches'])
+    np.testing.assert_array_equal(result['pitches'], expected['pitches'])
+    np.testing.assert_allclose(result['times'], expected['times'])
+
+
+def test_backup_and_forward(tmp_path):
+    file_path = tmp_path / 'two_voices.musicxml'
+    file_path.write_text(TWO_VOICES)
+    result = extract_pitches_and_times(str(file_path))
+    # The chord of the second measure is left out, as in extract_score_features
+    np.testing.assert_array_equal(result['pitches'], [76, 61, 74, 57])
+    np.testing.assert_allclose(result['times'], [0, 1, 2, 3])
+    expected = extract_score_features(converter.parse(str(file_path)))
+    np.testing.assert_array_equal(result['pitches'], expected['pitches'])
+    np.testing.assert_allclose(result['times'], expected['times'])
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.corpus_manifest import get_manifest
+from task_a.performance_matrix import build_onset_matrix, get_beat_statistics
+
+
+def _read_onsets(path: str) -> list:
+    with open(path, "r") as f:
+        return [float(line.split()[0]) for line in f]
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """
+    A synthetic corpus with a shorter performance and a performance with extra beats after the end of the score.
+    """
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = tmp_path / "corpus"
+    generate_corpus(str(root), number_of_composers=1, pieces_per_composer=3, performances_per_piece=4,
+                    beats_per_piece=50, musicxml=False, midi=False)
+    piece = sorted((root / "Composer00").iterdir())[1]
+    lines = (piece / "Performer00_annotations.txt").read_text().splitlines(keepends=True)
+    (piece / "Performer00_annotations.txt").write_text("".join(lines[:30]))
+    onset = float(lines[-1].split()[0])
+    lines += [f"{onset + i:.6f}\t{onset + i:.6f}\tb\n" for i in range(1, 6)]
+    (piece / "Performer01_annotations.txt").write_text("".join(lines))
+    return str(root)
+
+
+def _given_onsets(root: str) -> dict:
+    """
+    The performed onsets of every beat of every piece, read directly from the annotation files.
+    """
+    result = {}
+    for dir_path, _, files in sorted(os.walk(root)):
+        if "midi_score_annotations.txt" not in files:
+            continue
+        number_of_beats = len(_read_onsets(os.path.join(dir_path, "midi_score_annotations.txt")))
+        performances = [_read_onsets(os.path.join(dir_path, file)) for file in sorted(files)
+                        if file.endswith("annotations.txt") and file != "midi_score_annotations.txt"]
+        result[os.path.relpath(dir_path, root)] = [[onsets[beat] for onsets in performances if beat < len(onsets)]
+                                                   for beat in range(number_of_beats)]
+    return result
+
+
+def test_matrix_holds_the_given_onsets(corpus):
+    matrix = build_onset_matrix(get_manifest(corpus))
+    given_onsets = _given_onsets(corpus)
+    assert matrix["pieces"] == list(given_onsets)
+    for i, beats in enumerate(given_onsets.values()):
+        assert matrix["number_of_beats"][i] == len(beats)
+        for beat, onsets in enumerate(beats):
+            assert matrix["mask"][i, :, beat].sum() == len(onsets)
+            np.testing.assert_allclose(matrix["onsets"][i, matrix["mask"][i, :, beat], beat], onsets)
+        assert not matrix["mask"][i, :, len(beats):].any()
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_beat_statistics_match_scipy(corpus, dtype):
+    matrix = build_onset_matrix(get_manifest(corpus), dtype=dtype)
+    statistics = get_beat_statistics(matrix, proportion_to_cut=0.25)
+    tolerance = {"rtol": 1e-6 if dtype == np.float32 else 1e-12, "atol": 1e-3 if dtype == np.float32 else 1e-9}
+    for i, beats in enumerate(_given_onsets(corpus).values()):
+        for beat, onsets in enumerate(beats):
+            assert statistics["count"][i, beat] == len(onsets)
+            expected = [np.mean(onsets), np.median(onsets), stats.trim_mean(onsets, 0.25),
+                        np.std(onsets, ddof=1) if len(onsets) > 1 else np.nan, stats.iqr(onsets)]
+            np.testing.assert_allclose([statistics[name][i, beat] for name in
+                                        ("mean", "median", "trimmed_mean", "std", "iqr")], expected, **tolerance)
+
+
+def test_selected_pieces_and_statistics(corpus):
+    manifest = get_manifest(corpus)
+    pieces = list(_given_onsets(corpus))
+    matrix = build_onset_matrix(manifest, [pieces[2], pieces[0], "Composer00/Unknown"])
+    assert matrix["pieces"] == [pieces[2], pieces[0]]
+    assert sorted(get_beat_statistics(matrix, ("mean",))) == ["mean"]
+    with pytest.raises(ValueError):
+        get_beat_statistics(matrix, ("mode",))
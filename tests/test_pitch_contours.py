@@ -0,0 +1,72 @@
+import numpy as np
+from scipy import stats
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_b.pitch_contours import (create_contour, get_contour, get_contour_from_files, get_contour_statistics,
+                                   merge_contours)
+from task_b.q2 import read_musicxml_and_normalize
+
+
+def _music_data(number_of_works: int = 7, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    music_data = {}
+    for i in range(number_of_works):
+        times = np.sort(rng.uniform(0, 1, 50 + 10 * i))
+        music_data[f"work_{i}.musicxml"] = {'pitches': rng.integers(50, 80, len(times)).tolist(),
+                                            'times': (times / times.max()).tolist()}
+    return music_data
+
+
+def _baseline_contours(music_data: dict) -> tuple:
+    """
+    The common timeline and the interpolated pitches of every work of q2.plot_average_pitch_contours before the
+    running contours.
+    """
+    max_time_points = max(len(data['times']) for data in music_data.values())
+    common_time_line = np.linspace(0, 1, max_time_points)
+    pitch_values_at_common_times = np.zeros((len(music_data), max_time_points))
+    for i, data in enumerate(music_data.values()):
+        pitch_values_at_common_times[i] = np.interp(common_time_line, data['times'], data['pitches'])
+    return common_time_line, pitch_values_at_common_times
+
+
+def test_contour_matches_baseline():
+    music_data = _music_data()
+    common_time_line, values = _baseline_contours(music_data)
+    statistics = get_contour_statistics(get_contour(music_data, resolution=len(common_time_line)))
+    np.testing.assert_allclose(statistics['times'], common_time_line)
+    np.testing.assert_allclose(statistics['mean'], values.mean(axis=0))
+    np.testing.assert_allclose(statistics['std'], values.std(axis=0, ddof=1))
+    lower, upper = stats.t.interval(0.95, len(values) - 1, loc=values.mean(axis=0), scale=stats.sem(values, axis=0))
+    np.testing.assert_allclose(statistics['lower'], lower)
+    np.testing.assert_allclose(statistics['upper'], upper)
+
+    # float32 running statistics stay close to the float64 ones
+    single = get_contour_statistics(get_contour(music_data, resolution=len(common_time_line), dtype=np.float32))
+    np.testing.assert_allclose(single['mean'], statistics['mean'], rtol=1e-5)
+    np.testing.assert_allclose(single['std'], statistics['std'], rtol=1e-3, atol=1e-3)
+
+
+def test_merged_contours_match_a_single_pass():
+    music_data = _music_data()
+    works = list(music_data.items())
+    whole = get_contour(music_data, resolution=200)
+    merged = create_contour(200)
+    for start in range(0, len(works), 3):
+        merged = merge_contours(merged, get_contour(dict(works[start:start + 3]), resolution=200))
+    assert merged['count'] == whole['count'] == len(works)
+    np.testing.assert_allclose(merged['mean'], whole['mean'])
+    np.testing.assert_allclose(merged['m2'], whole['m2'])
+    assert np.isnan(get_contour_statistics(get_contour(dict(works[:1]), resolution=200))['std']).all()
+
+
+def test_contour_from_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=1, pieces_per_composer=4, performances_per_piece=1,
+                    beats_per_piece=60, midi=False)
+    contour = get_contour_from_files(root, resolution=300, workers=2)
+    expected = get_contour(read_musicxml_and_normalize(root), resolution=300)
+    assert contour['count'] == expected['count'] == 4
+    np.testing.assert_allclose(contour['mean'], expected['mean'])
+    np.testing.assert_allclose(contour['m2'], expected['m2'])
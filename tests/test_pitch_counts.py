@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.stats import entropy, ttest_ind
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_b.corpus_loader import list_musicxml_files, load_file
+from task_b.pitch_counts import build_pitch_count_matrix, compare_groups, get_cdf, get_group_counts
+from task_b.q2 import calculate_entropy
+
+
+def _baseline_cdf(pitches: list) -> tuple:
+    """
+    The cumulative distribution drawn by q2.plot_cdf before the pitch counts.
+    """
+    values, base = np.histogram(pitches, bins=range(min(pitches), max(pitches) + 1), density=True)
+    return base[:-1], np.cumsum(values)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=3, pieces_per_composer=2, performances_per_piece=1,
+                    beats_per_piece=60, midi=False)
+    musician_paths = {composer: os.path.join(root, composer) for composer in sorted(os.listdir(root))}
+    composers = list(musician_paths)
+    musician_eras = {"Baroque": composers[:2], "Romantic": composers[2:] + ["Nobody"]}
+    return musician_paths, musician_eras
+
+
+def _work_pitches(musician_paths: dict) -> dict:
+    return {(composer, file_path): load_file(file_path)[0]['pitches'].tolist()
+            for composer, path in musician_paths.items() for file_path in list_musicxml_files(path)}
+
+
+@pytest.mark.parametrize("backend", ["music21", "stream"])
+def test_count_matrix_matches_the_pitches(corpus, backend):
+    musician_paths, musician_eras = corpus
+    matrix = build_pitch_count_matrix(musician_paths, musician_eras, workers=2, backend=backend)
+    work_pitches = _work_pitches(musician_paths)
+    assert matrix['works'] == [os.path.join(composer, os.path.relpath(file_path, musician_paths[composer]))
+                               for composer, file_path in work_pitches]
+    for row, pitches in zip(matrix['counts'], work_pitches.values()):
+        np.testing.assert_array_equal(row, np.bincount(pitches, minlength=128))
+    assert [matrix['composers'][index] for index in matrix['work_composer']] == [key[0] for key in work_pitches]
+    assert [matrix['eras'][index] for index in matrix['work_era']] == \
+           ["Romantic" if composer in musician_eras["Romantic"] else "Baroque" for composer, _ in work_pitches]
+
+
+def test_group_statistics_match_baseline(corpus):
+    musician_paths, musician_eras = corpus
+    matrix = build_pitch_count_matrix(musician_paths, musician_eras)
+    work_pitches = _work_pitches(musician_paths)
+    era_pitches = {era: [pitch for (composer, _), pitches in work_pitches.items() if composer in musicians
+                         for pitch in pitches] for era, musicians in musician_eras.items()}
+
+    # Entropies of the works as in the baseline calculate_entropy
+    music_data = {work: {'pitches': pitches} for work, pitches in work_pitches.items()}
+    entropy_values, average_entropy = calculate_entropy(music_data)
+    expected = [entropy(np.bincount(pitches), base=2) for pitches in work_pitches.values()]
+    np.testing.assert_allclose(entropy_values, expected)
+    np.testing.assert_allclose(average_entropy, np.mean(expected))
+
+    # Era roll-ups
+    names, counts = get_group_counts(matrix, 'era')
+    assert names == list(musician_eras)
+    for era, row in zip(names, counts):
+        np.testing.assert_array_equal(row, np.bincount(era_pitches[era], minlength=128))
+    for (first, second), result in compare_groups(matrix, 'era').items():
+        t_statistic, p_value = ttest_ind(era_pitches[first], era_pitches[second], equal_var=False)
+        np.testing.assert_allclose([result['t-statistic'], result['p-value']], [t_statistic, p_value])
+
+    # The baseline histogram puts the two highest pitches in its last bin
+    all_pitches = [pitch for pitches in work_pitches.values() for pitch in pitches]
+    pitches, cdf = get_cdf(matrix['counts'])
+    base, cumulative = _baseline_cdf(all_pitches)
+    np.testing.assert_array_equal(pitches[:-1], base)
+    np.testing.assert_allclose(cdf[:-2], cumulative[:-1])
+    assert cdf[-1] == pytest.approx(1) and cumulative[-1] == pytest.approx(1)
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from music21 import converter, corpus, meter, note, stream
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_b.q1 import (extract_onset_in_measure, get_corpus_onset_histograms, get_onset_histograms,
+                       merge_onset_histograms, parse_file_to_dataframe, parse_score_to_dataframe)
+from task_b.score_cache import extract_score_features
+
+
+def _music21_onsets(score) -> list:
+    """
+    The time signature in force and the onset in the score of every note and rest, as given by music21 contexts.
+    """
+    rows = []
+    for part in score.parts:
+        for measure in part.getElementsByClass('Measure'):
+            for event in measure.notesAndRests:
+                time_signature = event.getContextByClass('TimeSignature')
+                rows.append((time_signature.ratioString if time_signature else "NoTimeSignature",
+                             float(event.getOffsetInHierarchy(part))))
+    return rows
+
+
+def _baseline_histograms(dataframe: pd.DataFrame, resolution: int) -> dict:
+    """
+    Count the onsets kept by extract_onset_in_measure per time signature, one row of the dataframe at a time.
+    """
+    result = {}
+    kept = dataframe.loc[extract_onset_in_measure(dataframe).index]
+    for time_signature, onset in zip(kept['time_signature'], kept['onset_in_measure']):
+        counts = result.setdefault(time_signature, {})
+        position = int(round(float(onset) * resolution))
+        counts[position] = counts.get(position, 0) + 1
+    return result
+
+
+def _assert_same_histograms(histograms: dict, expected: dict) -> None:
+    assert sorted(histograms) == sorted(expected)
+    for time_signature, counts in expected.items():
+        assert {position: int(value) for position, value in enumerate(histograms[time_signature]) if value} == counts
+
+
+def _meter_changes_score():
+    """
+    A part with a quarter note pickup, then bars of 3/4, 2/4 and 6/8.
+    """
+    part = stream.Part()
+    bars = [("3/4", [1]), ("3/4", [1, 1, 1]), ("3/4", [2, 1]), ("2/4", [1, 0.5, 0.5]), ("2/4", [2]),
+            ("6/8", [1.5, 0.5, 1]), ("6/8", [3])]
+    for number, (time_signature, durations) in enumerate(bars):
+        measure = stream.Measure(number=number)
+        if number == 0 or time_signature != bars[number - 1][0]:
+            measure.timeSignature = meter.TimeSignature(time_signature)
+        if number == 0:
+            measure.padAsAnacrusis = True
+        for i, duration in enumerate(durations):
+            measure.append(note.Rest(quarterLength=duration) if i == 2 else note.Note(60 + i, quarterLength=duration))
+        part.append(measure)
+    part.makeNotation(inPlace=True)
+    return stream.Score([part])
+
+
+@pytest.mark.parametrize("score", [corpus.parse('bach/bwv66.6'), _meter_changes_score()], ids=["bwv66.6", "meters"])
+def test_onsets_in_score_match_music21(score, tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    path = str(tmp_path / "score.musicxml")
+    score.write('musicxml', fp=path)
+    score = converter.parse(path)
+    for dataframe in (parse_score_to_dataframe(score), parse_file_to_dataframe(path)):
+        rows = list(zip(dataframe['time_signature'], dataframe['onset_in_score'].astype(float)))
+        assert rows == _music21_onsets(score)
+
+
+@pytest.mark.parametrize("resolution", [4, 12])
+def test_onset_histograms_match_baseline(resolution, tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    for score in (corpus.parse('bach/bwv66.6'), _meter_changes_score()):
+        _assert_same_histograms(get_onset_histograms(extract_score_features(score), resolution),
+                                _baseline_histograms(parse_score_to_dataframe(score), resolution))
+
+
+def test_corpus_onset_histograms(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=3, performances_per_piece=1,
+                    beats_per_piece=60, meter_changes=2, midi=False)
+    musician_paths = {composer: os.path.join(root, composer) for composer in sorted(os.listdir(root))}
+    histograms = get_corpus_onset_histograms(musician_paths, workers=2)
+    for musician, path in musician_paths.items():
+        dataframes = []
+        for dir_path, _, files in os.walk(path):
+            dataframes += [parse_file_to_dataframe(os.path.join(dir_path, file)) for file in files
+                           if file.endswith(".musicxml")]
+        _assert_same_histograms(histograms[musician],
+                                _baseline_histograms(pd.concat(dataframes, ignore_index=True), 12))
+    # Merging the musicians gives the histograms of the whole corpus
+    merged = merge_onset_histograms(list(histograms.values()))
+    kept = sorted(merged)[:2]
+    total = get_corpus_onset_histograms({"all": root}, time_signatures=kept + ["5/4"])["all"]
+    assert list(total) == kept
+    for time_signature, counts in total.items():
+        np.testing.assert_array_equal(np.trim_zeros(counts, "b"), np.trim_zeros(merged[time_signature], "b"))
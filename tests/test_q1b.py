@@ -0,0 +1,65 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from task_b import q1b
+from task_b.q1b import get_deviations, get_duration, get_rawdata
+from task_b.timing_deviations import group_by_position
+
+
+def _write_annotations(path, onsets, labels: list) -> str:
+    path.write_text("".join(f"{onset:.6f}\t{onset:.6f}\t{label}\n" for onset, label in zip(onsets, labels)))
+    return str(path)
+
+
+def _read_piece(tmp_path, number_of_bars: int = 8) -> tuple:
+    labels = (["db,3/4,C", "b", "b"] + ["db", "b", "b"] * (number_of_bars - 1)) + ["db"]
+    score_onsets = np.arange(len(labels), dtype=np.float64)
+    rng = np.random.default_rng(0)
+    performed_onsets = np.cumsum(np.concatenate(([0], 1 + rng.normal(0, 0.1, len(labels) - 1))))
+    scores = get_rawdata(_write_annotations(tmp_path / "performed.txt", performed_onsets, labels))
+    original_scores = get_rawdata(_write_annotations(tmp_path / "score.txt", score_onsets, labels))
+    return scores, original_scores
+
+
+def test_deviations_match_baseline(tmp_path):
+    scores, original_scores = _read_piece(tmp_path)
+    # The baseline grouped the differences of the durations three by three (db, 2b, 3b)
+    durations = np.array(get_duration(scores)) - np.array(get_duration(original_scores))
+    expected = [durations[position::3] for position in range(3)]
+    labels, groups = group_by_position(get_deviations(scores, original_scores), "3/4")
+    assert len(labels) == 3
+    for group, values in zip(groups, expected):
+        np.testing.assert_allclose(group, values)
+
+
+def _plot(monkeypatch, deviations: dict, meter: str = None) -> list:
+    """
+    Plot the violins of the deviations and get the figures instead of showing them.
+    """
+    figures = []
+    monkeypatch.setattr(q1b, "show_or_save", lambda output_path, to_show: figures.extend(to_show))
+    q1b.violin_plot_deviations(deviations, "Nobody", meter=meter)
+    return figures
+
+
+def test_violin_plot_without_beats_of_the_meter(tmp_path, monkeypatch):
+    scores, original_scores = _read_piece(tmp_path)
+    deviations = get_deviations(scores, original_scores)
+    whole_figure, parts_figure = _plot(monkeypatch, deviations, "3/4")
+    assert len(whole_figure.axes[0].collections) > 0
+    whole_figure, parts_figure = _plot(monkeypatch, deviations, "4/4")
+    assert not whole_figure.axes[0].collections
+    assert not any(ax.collections for ax in parts_figure.axes)
+    plt.close("all")
+
+
+def test_violin_plot_of_an_empty_performance(monkeypatch):
+    empty = pd.DataFrame({"start": [0.0], "end": [0.0], "b": ["db"], "meter": ["3/4"]})
+    whole_figure, _ = _plot(monkeypatch, get_deviations(empty, empty))
+    assert not whole_figure.axes[0].collections
+    plt.close("all")
@@ -0,0 +1,82 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from task_a.rendering import decimate, decimate_lttb, decimate_min_max, render_figures, show_or_save
+
+
+def _baseline_lttb(x: list, y: list, max_points: int) -> list:
+    """
+    The indices kept by the Largest-Triangle-Three-Buckets algorithm, one point at a time, on the same buckets.
+    """
+    edges = np.linspace(1, len(y) - 1, max_points - 1).astype(int).tolist()
+    kept = [0]
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        following = range(end, edges[i + 2] if i + 2 < len(edges) else len(y))
+        next_x = sum(x[j] for j in following) / len(following) if following else x[-1]
+        next_y = sum(y[j] for j in following) / len(following) if following else y[-1]
+        a = kept[-1]
+        areas = [abs((x[a] - next_x) * (y[j] - y[a]) - (x[a] - x[j]) * (next_y - y[a])) for j in range(start, end)]
+        kept.append(start + areas.index(max(areas)))
+    return kept + [len(y) - 1]
+
+
+def _curve(number_of_points: int = 10007, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    x = np.arange(number_of_points, dtype=np.float64)
+    return x, np.cumsum(rng.normal(0, 1, number_of_points))
+
+
+def test_min_max_keeps_the_envelope():
+    x, y = _curve()
+    kept_x, kept_y = decimate_min_max(x, y, max_points=500)
+    assert len(kept_x) <= 500 and kept_x[0] == x[0] and kept_x[-1] == x[-1]
+    assert (np.diff(kept_x) > 0).all()
+    # Every bucket of the decimated curve keeps its minimum and maximum
+    buckets = np.arange(len(y)) * (500 // 2 - 1) // len(y)
+    kept_buckets = buckets[kept_x.astype(int)]
+    for bucket in range(500 // 2 - 1):
+        values = kept_y[kept_buckets == bucket]
+        assert values.min() == y[buckets == bucket].min() and values.max() == y[buckets == bucket].max()
+
+
+def test_lttb_matches_baseline():
+    x, y = _curve()
+    kept_x, kept_y = decimate_lttb(x, y, max_points=300)
+    expected = _baseline_lttb(x.tolist(), y.tolist(), 300)
+    np.testing.assert_array_equal(kept_x, x[expected])
+    np.testing.assert_array_equal(kept_y, y[expected])
+
+
+def test_short_curves_are_kept():
+    x, y = _curve(100)
+    for method in ("min_max", "lttb"):
+        for max_points in (None, 100, 1000):
+            kept_x, kept_y = decimate(x, y, max_points, method)
+            np.testing.assert_array_equal(kept_x, x)
+            np.testing.assert_array_equal(kept_y, y)
+    with pytest.raises(ValueError):
+        decimate(x, y, method="every_other_point")
+
+
+def plot_curve(seed: int, output_path: str = None) -> None:
+    if seed < 0:
+        raise ValueError("negative seed")
+    plt.figure()
+    plt.plot(*decimate(*_curve(seed=seed), max_points=200))
+    show_or_save(output_path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_render_figures(tmp_path, workers):
+    jobs = [(plot_curve, (seed,), {"output_path": str(tmp_path / f"curve_{seed}.png")}) for seed in (0, -1, 2)]
+    results = list(render_figures(jobs, workers))
+    assert [path for path, _ in results] == [kwargs["output_path"] for _, _, kwargs in jobs]
+    assert [error for _, error in results] == [None, "ValueError: negative seed", None]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["curve_0.png", "curve_2.png"]
+    plt.close("all")
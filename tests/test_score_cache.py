@@ -0,0 +1,73 @@
+import shutil
+
+import music21
+import numpy as np
+import pytest
+from music21 import converter, corpus
+
+from task_a.instrumentation import disable, enable, get_report
+from task_b.q1 import parse_file_to_dataframe
+from task_b.score_cache import evict, extract_score_features, get_cache_dir, load_score_features
+
+
+def _baseline_events(score) -> list:
+    """
+    The rows of q1.parse_score_to_dataframe before the cache, without the onset in the score and the time signature
+    (see tests/test_q1.py).
+    """
+    rows = []
+    for part_index, part in enumerate(score.parts):
+        clefs = part.getElementsByClass('Clef')
+        clef_name = clefs[0].sign if clefs else f"Part_{part_index + 1}_NoClef"
+        for measure in part.getElementsByClass('Measure'):
+            for event in measure.notesAndRests:
+                rows.append((clef_name, measure.number,
+                             "sounded" if isinstance(event, music21.note.Note) else "unsounded",
+                             float(event.offset), float(event.duration.quarterLength),
+                             f"tie_{event.tie.type}" if event.tie else "no_tie"))
+    return rows
+
+
+@pytest.fixture
+def score_path(tmp_path):
+    path = tmp_path / "bwv66.6.musicxml"
+    corpus.parse('bach/bwv66.6').write('musicxml', fp=str(path))
+    return str(path)
+
+
+def test_events_match_baseline(score_path, tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    dataframe = parse_file_to_dataframe(score_path)
+    columns = ['staff', 'measure_number', 'event_type', 'onset_in_measure', 'duration', 'tie_info']
+    assert list(dataframe[columns].itertuples(index=False, name=None)) == _baseline_events(converter.parse(score_path))
+
+
+def test_cache_is_keyed_by_content(score_path, tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    expected = extract_score_features(converter.parse(score_path))
+    copy_path = str(tmp_path / "copy.musicxml")
+    shutil.copyfile(score_path, copy_path)
+    enable()
+    try:
+        results = [load_score_features(score_path), load_score_features(score_path), load_score_features(copy_path)]
+        report = get_report()
+    finally:
+        disable()
+    counters = {name: value for stage in report["stages"].values() for name, value in stage["counters"].items()}
+    assert counters["cache_misses"] == 1 and counters["cache_hits"] == 2
+    for features in results:
+        assert sorted(features) == sorted(expected)
+        for name, values in expected.items():
+            np.testing.assert_array_equal(features[name], values)
+
+
+def test_eviction_keeps_the_cache_bounded(score_path, tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    load_score_features(score_path)
+    other_path = str(tmp_path / "other.musicxml")
+    corpus.parse('bach/bwv66.6').transpose(2).write('musicxml', fp=other_path)
+    load_score_features(other_path)
+    entries = sorted((tmp_path / "cache" / "scores").iterdir(), key=lambda entry: entry.stat().st_mtime_ns)
+    assert len(entries) == 2
+    evict(get_cache_dir(), max_bytes=entries[-1].stat().st_size)
+    assert list((tmp_path / "cache" / "scores").iterdir()) == [entries[-1]]
@@ -0,0 +1,100 @@
+import warnings
+
+import numpy as np
+from scipy import stats
+
+from task_b.q2 import perform_t_test
+from task_b.significance import (bootstrap_tests, correct_p_values, get_group_statistics, permutation_test,
+                                 permutation_tests)
+
+
+def _music_data(seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {f"Composer{i}": {'pitches': rng.integers(40 + i, 80 + 2 * i, size=200 + 50 * i).tolist()}
+            for i in range(4)}
+
+
+def _baseline_correction(p_values: list, method: str) -> list:
+    """
+    The corrected p-values computed one rank at a time from their definitions.
+    """
+    m = len(p_values)
+    order = sorted(range(m), key=lambda i: p_values[i])
+    corrected = [0.0] * m
+    if method == 'holm':
+        running = 0.0
+        for rank, i in enumerate(order):
+            running = max(running, p_values[i] * (m - rank))
+            corrected[i] = min(running, 1.0)
+    else:
+        running = 1.0
+        for rank in range(m - 1, -1, -1):
+            running = min(running, p_values[order[rank]] * m / (rank + 1))
+            corrected[order[rank]] = running
+    return corrected
+
+
+def test_group_statistics_match_numpy():
+    music_data = _music_data()
+    statistics = get_group_statistics(music_data)
+    assert statistics['keys'] == list(music_data)
+    for i, data in enumerate(music_data.values()):
+        assert statistics['n'][i] == len(data['pitches'])
+        np.testing.assert_allclose(statistics['mean'][i], np.mean(data['pitches']))
+        np.testing.assert_allclose(statistics['variance'][i], np.var(data['pitches'], ddof=1))
+
+
+def test_t_tests_match_scipy():
+    music_data = _music_data()
+    music_data["Empty"] = {'pitches': []}
+    results = perform_t_test(music_data)
+    keys = list(music_data)
+    assert list(results) == [(keys[i], keys[j]) for i in range(len(keys)) for j in range(i + 1, len(keys))]
+    for (first, second), result in results.items():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            t_statistic, p_value = stats.ttest_ind(music_data[first]['pitches'], music_data[second]['pitches'],
+                                                   equal_var=False)
+        np.testing.assert_allclose(result['t-statistic'], t_statistic)
+        np.testing.assert_allclose(result['p-value'], p_value)
+
+
+def test_corrections_match_baseline():
+    p_values = np.random.default_rng(1).uniform(0, 0.2, size=15)
+    np.testing.assert_allclose(correct_p_values(p_values, 'bonferroni'), np.minimum(p_values * 15, 1))
+    np.testing.assert_allclose(correct_p_values(p_values, 'holm'), _baseline_correction(p_values.tolist(), 'holm'))
+    np.testing.assert_allclose(correct_p_values(p_values, 'fdr_bh'), stats.false_discovery_control(p_values))
+    np.testing.assert_allclose(correct_p_values(p_values, 'fdr_bh'), _baseline_correction(p_values.tolist(), 'fdr_bh'))
+
+    # A matrix of pairwise p-values is corrected once per pair
+    matrix = np.full((6, 6), np.nan)
+    upper = np.triu_indices(6, k=1)
+    matrix[upper] = p_values
+    matrix.T[upper] = p_values
+    corrected = correct_p_values(matrix, 'holm')
+    np.testing.assert_allclose(corrected[upper], correct_p_values(p_values, 'holm'))
+    np.testing.assert_array_equal(corrected, corrected.T)
+
+
+def test_permutation_test_matches_scipy():
+    music_data = {"First": {'pitches': [60, 62, 64, 65, 67, 62, 60]}, "Second": {'pitches': [61, 63, 66, 68, 70, 63]}}
+    statistics = get_group_statistics(music_data)
+    expected = stats.permutation_test([music_data["First"]['pitches'], music_data["Second"]['pitches']],
+                                      lambda first, second: np.mean(first) - np.mean(second),
+                                      permutation_type='independent', n_resamples=np.inf).pvalue
+    p_value = permutation_test(statistics, 0, 1, number_of_permutations=20000, seed=0)
+    assert abs(p_value - expected) < 0.01
+    p_values = permutation_tests(statistics, number_of_permutations=20000, seed=0)
+    assert np.isnan(p_values[0, 0]) and p_values[0, 1] == p_values[1, 0]
+    assert abs(p_values[0, 1] - expected) < 0.01
+
+
+def test_bootstrap_tests():
+    music_data = _music_data()
+    statistics = get_group_statistics(music_data)
+    results = bootstrap_tests(statistics, number_of_resamples=2000, seed=0)
+    np.testing.assert_allclose(results['difference'], statistics['mean'][:, None] - statistics['mean'][None, :])
+    assert (results['lower'] <= results['difference']).all() and (results['difference'] <= results['upper']).all()
+    # With a few hundred pitches per group the bootstrap p-values are close to the ones of the t-test
+    t_p_values = [result['p-value'] for result in perform_t_test(music_data).values()]
+    np.testing.assert_allclose(results['p-value'][np.triu_indices(len(music_data), k=1)], t_p_values, atol=0.02)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.timing_bootstrap import bootstrap_meter, bootstrap_tempo_ratios, get_performance_sums
+from task_a.timing_function import get_annotations_files_from_folder, timing
+from test_meter_aggregation import _baseline_sum_and_lengths
+from test_timing_function import _baseline_timing
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=3, performances_per_piece=4,
+                    beats_per_piece=80, meter_changes=0, musicxml=False, midi=False)
+    return root
+
+
+def test_performance_sums_match_baseline(corpus):
+    performance_sums = get_performance_sums(corpus)
+    performed_files = [file for file in get_annotations_files_from_folder(corpus)
+                       if "midi_score_annotations.txt" not in file]
+    for meter, sums in performance_sums.items():
+        rows = [_baseline_sum_and_lengths(file)[meter] for file in performed_files
+                if meter in _baseline_sum_and_lengths(file)]
+        np.testing.assert_allclose(sums["sums"], [row["sum_durations"] for row in rows])
+        np.testing.assert_allclose(sums["counts"], [row["number_of_beats"] for row in rows])
+
+
+def test_tempo_ratios_match_timing(corpus):
+    results = bootstrap_tempo_ratios(corpus, number_of_replicates=200, seed=0)
+    expected = _baseline_timing(corpus)
+    assert results and sorted(results) == sorted(expected) == sorted(timing(corpus))
+    for meter, result in results.items():
+        np.testing.assert_allclose(result["tempo_ratio"], expected[meter])
+        assert (np.array(result["lower"]) <= np.array(result["upper"])).all()
+
+
+def test_workers_give_the_same_replicates(corpus):
+    serial = bootstrap_tempo_ratios(corpus, number_of_replicates=500, seed=3)
+    assert bootstrap_tempo_ratios(corpus, number_of_replicates=500, seed=3, workers=2) == serial
+
+
+def test_intervals_match_a_naive_bootstrap(corpus):
+    performance_sums = next(iter(get_performance_sums(corpus).values()))
+    result = bootstrap_meter(performance_sums, number_of_replicates=20000, seed=0)
+
+    # Resample the performances one replicate at a time
+    rng = np.random.default_rng(1)
+    sums, counts = performance_sums["sums"], performance_sums["counts"]
+    ratios = []
+    for _ in range(20000):
+        chosen = rng.integers(0, len(sums), len(sums))
+        ratios.append(performance_sums["symbolic_mean"] * counts[chosen].sum(axis=0) / sums[chosen].sum(axis=0))
+    lower, upper = np.quantile(ratios, [0.025, 0.975], axis=0)
+    std = np.std(ratios, axis=0, ddof=1)
+    # The two bootstraps draw different replicates, their intervals agree up to the Monte Carlo error
+    np.testing.assert_allclose(result["std"], std, rtol=0.05)
+    np.testing.assert_allclose(result["lower"], lower, atol=0.1 * std.max())
+    np.testing.assert_allclose(result["upper"], upper, atol=0.1 * std.max())
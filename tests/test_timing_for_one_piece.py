@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.beat_records import load_beat_records, to_beat_dicts
+from task_a.corpus_manifest import get_manifest, get_performances
+from task_a.timing_for_one_piece import get_average_timing_one_piece, get_piece_tempo_map, get_tempo_map
+from test_beat_records import _baseline_performed_attributes
+
+
+def _baseline_times(symbolic_path: str, performed_path: str) -> dict:
+    """
+    timing_for_one_piece.get_piece_symbolic_to_performed_times before the beat records.
+    """
+    with open(symbolic_path, "r") as f:
+        symbolic_onsets = [line.split()[0] for line in f.readlines()]
+    return {beat: {"symbolic": {"onset": symbolic_onsets[beat]}, "performed": performed}
+            for beat, performed in _baseline_performed_attributes(performed_path).items()}
+
+
+def _baseline_tempo_map(symbolic_to_performed_times: dict) -> dict:
+    """
+    timing_for_one_piece.get_tempo_map before the vectorization.
+    """
+    result = {}
+    for i in range(len(symbolic_to_performed_times) - 2):
+        duration_performed = float(symbolic_to_performed_times[i + 1]["performed"]["onset"]) - \
+                             float(symbolic_to_performed_times[i]["performed"]["onset"])
+        duration_symbolic = float(symbolic_to_performed_times[i + 1]["symbolic"]["onset"]) - \
+                            float(symbolic_to_performed_times[i]["symbolic"]["onset"])
+        result[i] = (1 / duration_performed) / (1 / duration_symbolic)
+    return result
+
+
+def _baseline_average_onsets(folder_path: str) -> list:
+    """
+    The averaged performed onsets of timing_for_one_piece.get_average_timing_one_piece before the onset matrix.
+    """
+    files = sorted(file for file in os.listdir(folder_path)
+                   if file.endswith("annotations.txt") and file != "midi_score_annotations.txt")
+    performed_list = [_baseline_performed_attributes(os.path.join(folder_path, file)) for file in files]
+    return [sum(float(performed[i]["onset"]) for performed in performed_list if i in performed) / len(performed_list)
+            for i in range(len(performed_list[0]))]
+
+
+def _get_pieces(tmp_path, monkeypatch) -> dict:
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=1, pieces_per_composer=2, performances_per_piece=3,
+                    beats_per_piece=60, meter_changes=1, musicxml=False, midi=False)
+    pieces = {}
+    for performance in get_performances(get_manifest(root)):
+        pieces.setdefault(os.path.dirname(performance["annotation_path"]), []).append(performance)
+    return pieces
+
+
+def test_tempo_map_matches_baseline(tmp_path, monkeypatch):
+    for performances in _get_pieces(tmp_path, monkeypatch).values():
+        for performance in performances:
+            times = _baseline_times(performance["score_annotation_path"], performance["annotation_path"])
+            expected = _baseline_tempo_map(times)
+            records = load_beat_records(performance["score_annotation_path"], performance["annotation_path"])
+            for result in (get_tempo_map(times), get_tempo_map(records), get_tempo_map(to_beat_dicts(records))):
+                assert list(result) == list(expected)
+                np.testing.assert_allclose(list(result.values()), list(expected.values()))
+
+
+def test_piece_tempo_map_has_one_row_per_performance(tmp_path, monkeypatch):
+    for performances in _get_pieces(tmp_path, monkeypatch).values():
+        tempo_map = get_piece_tempo_map(performances[0]["score_annotation_path"],
+                                        [performance["annotation_path"] for performance in performances])
+        assert tempo_map["tempo_ratio"].shape[0] == len(performances)
+        for row, performance in enumerate(performances):
+            times = _baseline_times(performance["score_annotation_path"], performance["annotation_path"])
+            expected = list(_baseline_tempo_map(times).values())
+            np.testing.assert_allclose(tempo_map["tempo_ratio"][row], expected)
+            durations = [float(times[i + 1]["performed"]["onset"]) - float(times[i]["performed"]["onset"])
+                         for i in range(len(expected))]
+            np.testing.assert_allclose(tempo_map["local_tempo"][row], 60 / np.array(durations))
+
+
+def test_average_timing_matches_baseline(tmp_path, monkeypatch):
+    for folder_path, performances in _get_pieces(tmp_path, monkeypatch).items():
+        records = get_average_timing_one_piece(folder_path)
+        np.testing.assert_allclose(records["beats"]["performed_onset"], _baseline_average_onsets(folder_path))
+        with open(performances[0]["score_annotation_path"], "r") as f:
+            np.testing.assert_allclose(records["beats"]["symbolic_onset"], [float(line.split()[0]) for line in f])
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.timing_function import timing
+from test_meter_aggregation import _baseline_sum_and_lengths
+
+
+def _baseline_timing(folder_path: str) -> dict:
+    """
+    timing_function.timing before the vectorization, merging the files in the order of os.walk.
+    """
+    averages = {}
+    for symbolic in (True, False):
+        merged = {}
+        for dir_path, _, files in os.walk(folder_path):
+            for file in files:
+                if not file.endswith("annotations.txt") or (file == "midi_score_annotations.txt") != symbolic:
+                    continue
+                for meter, sums_and_lengths in _baseline_sum_and_lengths(os.path.join(dir_path, file)).items():
+                    if meter not in merged:
+                        merged[meter] = {name: np.zeros(len(values)) for name, values in sums_and_lengths.items()}
+                    assert len(merged[meter]["sum_durations"]) == len(sums_and_lengths["sum_durations"])
+                    for name, values in sums_and_lengths.items():
+                        merged[meter][name] += values
+        averages[symbolic] = {meter: merged[meter]["sum_durations"] / merged[meter]["number_of_beats"]
+                              for meter in merged}
+    return {meter: (averages[True][meter] / averages[False][meter]).tolist() for meter in averages[True]}
+
+
+def test_timing_matches_baseline(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=3, performances_per_piece=2,
+                    beats_per_piece=120, meter_changes=0, musicxml=False, midi=False)
+    expected = _baseline_timing(root)
+    result = timing(root)
+    assert sorted(result) == sorted(expected)
+    for meter in expected:
+        np.testing.assert_allclose(result[meter], expected[meter])
+
+
+def test_timing_warns_about_skipped_meters(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    piece = tmp_path / "corpus" / "Composer" / "Piece"
+    piece.mkdir(parents=True)
+    labels = ["db,3/4,C", "b", "b", "db,2/4", "b", "db"]
+    (piece / "midi_score_annotations.txt").write_text(
+        "".join(f"{i:.6f}\t{i:.6f}\t{label}\n" for i, label in enumerate(labels)))
+    # The third beat of the performed 3/4 bar is out of the meter
+    labels[2] = "bR"
+    (piece / "Performer_annotations.txt").write_text(
+        "".join(f"{i * 1.1:.6f}\t{i * 1.1:.6f}\t{label}\n" for i, label in enumerate(labels)))
+    with pytest.warns(UserWarning, match="3/4"):
+        result = timing(str(tmp_path / "corpus"))
+    assert list(result) == ["2/4"]
+    np.testing.assert_allclose(result["2/4"], [1 / 1.1, 1 / 1.1])
@@ -0,0 +1,50 @@
+import numpy as np
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.annotation_cache import load_annotations
+from task_a.timing_models import (MAX_POSITIONS, build_timing_dataset, fit_timing_models, get_cross_composer_errors,
+                                  get_design_matrix)
+
+
+def _write_annotations(path, labels: list) -> str:
+    path.write_text("".join(f"{i:.6f}\t{i:.6f}\t{label}\n" for i, label in enumerate(labels)))
+    return str(path)
+
+
+def test_pickup_beats_are_before_the_first_phrase(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    labels = ["b,3/4,C", "b", "db", "b", "b", "db", "b", "b", "db"]
+    annotations = load_annotations(_write_annotations(tmp_path / "pickup.txt", labels))
+    design, kept = get_design_matrix(annotations, len(labels), phrase_bars=2, arc_degree=1, ritardando_degree=1)
+    assert kept.all()
+    phrase = design[:, MAX_POSITIONS]
+    # The pickup is the end of a 3 beat bar before the phrase, the first bar keeps its 3 beats
+    np.testing.assert_allclose(phrase, np.array([-2, -1, 0, 1, 2, 3, 4, 5, 0]) / 3 / 2)
+    np.testing.assert_array_equal(design[:, :3].argmax(axis=1), [1, 2, 0, 1, 2, 0, 1, 2, 0])
+
+
+def test_batched_fit_matches_least_squares(tmp_path, monkeypatch):
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=3, pieces_per_composer=2, performances_per_piece=2,
+                    beats_per_piece=150, musicxml=False, midi=False)
+    dataset = build_timing_dataset(root)
+    fit = fit_timing_models(dataset)
+    x, y, index = dataset["x"], dataset["y"], dataset["performance_index"]
+    for i in range(len(dataset["performances"])):
+        rows = index == i
+        expected = np.linalg.lstsq(x[rows], y[rows], rcond=None)[0]
+        # The positions absent from a piece make its system singular (solved with a small ridge), so the fitted
+        # values are compared
+        np.testing.assert_allclose(x[rows] @ fit["coefficients"][i], x[rows] @ expected, atol=1e-4)
+        residual = y[rows] - x[rows] @ expected
+        np.testing.assert_allclose(fit["rmse"][i], np.sqrt(np.mean(residual ** 2)), atol=1e-4)
+
+    errors = get_cross_composer_errors(dataset, fit["normal_equations"])
+    assert sorted(errors) == dataset["composers"]
+    for composer, quality in errors.items():
+        rows = np.isin(index, [i for i, performance in enumerate(dataset["performances"])
+                               if performance["composer"] == composer])
+        others = np.linalg.lstsq(x[~rows], y[~rows], rcond=None)[0]
+        rmse = np.sqrt(np.mean((y[rows] - x[rows] @ others) ** 2))
+        np.testing.assert_allclose(quality["held_out"]["rmse"], rmse, rtol=1e-4)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_corpus import generate_corpus
+from task_a.timing_function import get_timing_statistics
+from task_a.timing_partials import (compute_partial, get_shard_files, load_partial, reduce_partials, save_partial,
+                                    timing_from_partial)
+from test_timing_function import _baseline_timing
+
+
+def _generate(tmp_path, monkeypatch, meter_changes: int) -> str:
+    monkeypatch.setenv("DM_CACHE_DIR", str(tmp_path / "cache"))
+    root = str(tmp_path / "corpus")
+    generate_corpus(root, number_of_composers=2, pieces_per_composer=3, performances_per_piece=2,
+                    beats_per_piece=80, meter_changes=meter_changes, musicxml=False, midi=False)
+    return root
+
+
+def _assert_same_statistics(result: dict, expected: dict) -> None:
+    assert list(result) == list(expected)
+    for meter, statistics in expected.items():
+        for name in ("tempo_ratio", "count", "mean", "variance"):
+            np.testing.assert_allclose(result[meter][name], statistics[name])
+
+
+@pytest.mark.parametrize("number_of_shards", [1, 3, 5])
+def test_merged_shards_give_a_single_run(tmp_path, monkeypatch, number_of_shards):
+    root = _generate(tmp_path, monkeypatch, meter_changes=2)
+    partials = [compute_partial(get_shard_files(root, shard_index, number_of_shards))
+                for shard_index in range(number_of_shards)]
+    # The merged result does not depend on the order of the partials nor on their round trip through files
+    paths = []
+    for index, partial in enumerate(reversed(partials)):
+        paths.append(str(tmp_path / f"partial_{index}.npz"))
+        save_partial(partial, paths[-1])
+    reduced = reduce_partials([load_partial(path) for path in paths])
+    _assert_same_statistics(timing_from_partial(reduced), get_timing_statistics(root))
+
+
+def test_partial_matches_baseline(tmp_path, monkeypatch):
+    root = _generate(tmp_path, monkeypatch, meter_changes=0)
+    result = timing_from_partial(reduce_partials([compute_partial(get_shard_files(root, 0, 1))]))
+    expected = _baseline_timing(root)
+    assert sorted(result) == sorted(expected)
+    for meter in expected:
+        np.testing.assert_allclose(result[meter]["tempo_ratio"], expected[meter])
+
+
+def test_shards_cover_the_corpus_once(tmp_path, monkeypatch):
+    root = _generate(tmp_path, monkeypatch, meter_changes=0)
+    shards = [get_shard_files(root, shard_index, 4) for shard_index in range(4)]
+    assert [indexed_file for shard in shards for indexed_file in shard] == list(enumerate(
+        file for _, file in get_shard_files(root, 0, 1)))